@@ -1,17 +1,53 @@
-from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory, Response
+from flask import Flask, render_template, request, jsonify, redirect, url_for, send_from_directory, Response, g, has_app_context, has_request_context
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session as FlaskSession
 from flask_login import LoginManager, UserMixin, login_user, logout_user, login_required, current_user
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
+from sqlalchemy import Select, Table, create_engine, event, inspect as sa_inspect
+from sqlalchemy.sql.dml import UpdateBase
+from sqlalchemy.engine import Engine
+from sqlalchemy.orm import make_transient_to_detached
+from PIL import Image, ImageOps
 from functools import wraps
+from bisect import bisect_left
+from concurrent.futures import ThreadPoolExecutor
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from datetime import datetime, date, timedelta
 import secrets
+import shutil
 import os
 import json
-from weasyprint import HTML
+import cProfile
+import csv
+import io
+import logging
+import hashlib
+import marshal
+import mimetypes
+import pstats
+import re
+import sys
+import tempfile
+import threading
+import time
+import zlib
+
+import migrate_db
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Not on Windows: PDF render slots are then counted per process
 
 app = Flask(__name__)
-app.config['SQLALCHEMY_DATABASE_URI'] = 'sqlite:///quotes.db'
+app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get('DATABASE_URL', 'sqlite:///quotes.db')
 app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
 app.config['SECRET_KEY'] = '2f0444c3f8e80c3e0cfe53307281c153da0dfc6c99735a59f30af94a2bdc1cee'  # For sessions
 
@@ -20,20 +56,147 @@ UPLOAD_FOLDER = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'upload
 ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 app.config['UPLOAD_FOLDER'] = UPLOAD_FOLDER
 app.config['MAX_CONTENT_LENGTH'] = 5 * 1024 * 1024  # 5MB max file size
+app.config['PROFILEPIC_AVATAR_SIZE'] = 160  # Longest side in px, for the UI
+app.config['PROFILEPIC_PRINT_SIZE'] = 600  # Longest side in px, for PDF logos
+app.config['PROFILEPIC_MAX_PIXELS'] = 40 * 1000 * 1000  # Reject decompression bombs
+app.config['PROFILEPIC_STALE_MINUTES'] = 5  # A picture still processing after this long is requeued
+Image.MAX_IMAGE_PIXELS = app.config['PROFILEPIC_MAX_PIXELS']  # Process-wide, so set once here
 
 # Create upload folder if it doesn't exist
 os.makedirs(UPLOAD_FOLDER, exist_ok=True)
-
-db = SQLAlchemy(app)
+os.makedirs(app.instance_path, exist_ok=True)
+
+# User loader cache: seconds a cached user record stays valid in this process
+app.config['USER_CACHE_TTL'] = 30
+
+# Bearer token that lets a Prometheus scraper read /metrics without an admin session
+app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+
+# PDF render admission control: WeasyPrint renders are CPU- and memory-heavy
+app.config['PDF_MAX_CONCURRENT'] = int(os.environ.get('PDF_MAX_CONCURRENT', 2))  # Renders at once, across all workers
+app.config['PDF_QUEUE_SIZE'] = int(os.environ.get('PDF_QUEUE_SIZE', 8))  # Waiting renders per worker
+app.config['PDF_QUEUE_TIMEOUT'] = float(os.environ.get('PDF_QUEUE_TIMEOUT', 30))  # Seconds a render may wait
+app.config['PDF_MAX_PER_USER'] = 2  # Running + waiting renders per user in one worker
+app.config['PDF_MIN_AVAILABLE_MB'] = int(os.environ.get('PDF_MIN_AVAILABLE_MB', 256))  # Hold renders below this free RAM
+app.config['PDF_RETRY_AFTER'] = 10  # Seconds suggested to clients that are turned away
+app.config['PDF_SLOT_DIR'] = os.path.join(app.instance_path, 'pdf_slots')
+app.config['PDF_CACHE_DIR'] = os.path.join(app.instance_path, 'pdf_cache')  # Rendered quote PDFs, reused by statements
+
+# Response compression for JSON/text responses
+app.config['COMPRESS_MIN_SIZE'] = 1024  # Bytes; smaller bodies are sent as-is
+app.config['COMPRESS_LEVEL'] = 6  # gzip level
+app.config['COMPRESS_BROTLI_QUALITY'] = 4  # Fast setting suited to dynamic responses
+
+# SQL profiler (opt-in): logs every statement, flags N+1 patterns and slow queries
+app.config['SQL_PROFILE'] = os.environ.get('SQL_PROFILE') == '1'
+app.config['SQL_SLOW_QUERY_MS'] = float(os.environ.get('SQL_SLOW_QUERY_MS', 100))
+app.config['SQL_REPEAT_THRESHOLD'] = 3  # Identical statements per request before flagging N+1
+
+# On-demand CPU profiling captures (enabled per user or per route from the admin page)
+app.config['PROFILE_CAPTURE_DIR'] = os.path.join(app.instance_path, 'profiles')  # Rules and captures, shared by all workers
+app.config['PROFILE_CAPTURE_LIMIT'] = 50  # Captures kept; the oldest are deleted first
+app.config['PROFILE_SAMPLE_INTERVAL'] = 0.005  # Seconds between stack samples
+
+# Quote revision history
+app.config['REVISION_SNAPSHOT_INTERVAL'] = 20  # Store a full copy every N revisions, deltas in between
+app.config['REVISION_RETENTION_DAYS'] = 180  # Older revisions are pruned...
+app.config['REVISION_KEEP_MIN'] = 20  # ...except the latest N of each quote
+
+# Optional per-tenant databases: each user's quotes and companies in their own SQLite file
+app.config['TENANT_SHARDING'] = os.environ.get('TENANT_SHARDING') == '1'
+app.config['TENANT_SHARD_DIR'] = os.path.join(app.instance_path, 'tenants')
+app.config['TENANT_ENGINE_CACHE'] = 128  # Open shard engines kept per process
+
+# Results of the last maintenance.py pass, shown on the admin page
+app.config['MAINTENANCE_REPORT_PATH'] = os.path.join(app.instance_path, 'maintenance.json')
+
+class TenantSession(FlaskSession):
+    """Sends statements on per-tenant tables to the current tenant's shard"""
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and app.config['TENANT_SHARDING'] and _touches_tenant_table(mapper, clause):
+            user_id = current_tenant_id()
+            if user_id is None:
+                raise RuntimeError('Per-tenant table used outside of a tenant (no user logged in)')
+            return tenant_engine(user_id)
+        return super().get_bind(mapper, clause=clause, bind=bind, **kwargs)
+
+db = SQLAlchemy(app, session_options={'class_': TenantSession})
 
 # Flask-Login setup
 login_manager = LoginManager()
 login_manager.init_app(app)
 login_manager.login_view = 'login'
 
+# Per-process cache of user records for the Flask-Login loader.
+# Entries hold plain column values (not ORM instances) so they outlive the
+# request session. Any invalidation touches a shared epoch file, which makes
+# every worker process drop its cached entries on the next request.
+USER_CACHE_EPOCH_FILE = os.path.join(app.instance_path, 'user_cache.epoch')
+_user_cache = {}
+_user_cache_lock = threading.Lock()
+_user_cache_stats = {'hits': 0, 'misses': 0, 'invalidations': 0}
+
+def _user_cache_epoch():
+    try:
+        return os.stat(USER_CACHE_EPOCH_FILE).st_mtime_ns
+    except OSError:
+        return 0
+
+def invalidate_user_cache(user_id=None):
+    """Drop cached user records (one user, or all) in every worker process"""
+    with _user_cache_lock:
+        if user_id is None:
+            _user_cache.clear()
+        else:
+            _user_cache.pop(user_id, None)
+        _user_cache_stats['invalidations'] += 1
+    with open(USER_CACHE_EPOCH_FILE, 'a'):
+        os.utime(USER_CACHE_EPOCH_FILE)
+
+def user_cache_stats():
+    with _user_cache_lock:
+        hits = _user_cache_stats['hits']
+        misses = _user_cache_stats['misses']
+        return {
+            'hits': hits,
+            'misses': misses,
+            'invalidations': _user_cache_stats['invalidations'],
+            'hit_rate': round(hits / (hits + misses), 4) if hits + misses else 0.0,
+            'size': len(_user_cache),
+            'ttl': app.config['USER_CACHE_TTL']
+        }
+
 @login_manager.user_loader
 def load_user(user_id):
-    return User.query.get(int(user_id))
+    user_id = int(user_id)
+    # Read the epoch before querying so a concurrent invalidation is never missed
+    epoch = _user_cache_epoch()
+    now = time.monotonic()
+
+    with _user_cache_lock:
+        entry = _user_cache.get(user_id)
+        if entry and entry[0] > now and entry[1] == epoch:
+            _user_cache_stats['hits'] += 1
+            values = entry[2]
+        else:
+            _user_cache_stats['misses'] += 1
+            values = None
+
+    if values is None:
+        user = User.query.get(user_id)
+        # Disabled accounts are logged out on their next request
+        if user is None or not user.is_active:
+            return None
+        values = {attr.key: getattr(user, attr.key) for attr in sa_inspect(User).column_attrs}
+        with _user_cache_lock:
+            _user_cache[user_id] = (now + app.config['USER_CACHE_TTL'], epoch, values)
+        return user
+
+    # Rebuild a persistent instance from the cached row without a SELECT
+    user = User(**values)
+    make_transient_to_detached(user)
+    return db.session.merge(user, load=False)
 
 # Admin required decorator
 def admin_required(f):
@@ -44,6 +207,763 @@ def admin_required(f):
         return f(*args, **kwargs)
     return decorated_function
 
+# Request metrics
+# Recorded in-process (a dict update and a bisect under one lock per request)
+# and exported in Prometheus text format on /metrics. Every few seconds a
+# thread in each worker writes its totals to METRICS_DIR; a scrape merges all
+# of them. Totals of workers that have exited (recycled by max_requests, or
+# killed) are folded into retired.json, so counters never go backwards.
+# A worker counts as exited once the flock it holds on its lock file is gone.
+# Without fcntl, exited workers' files are never folded in, so their last
+# gauge values keep being added.
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+SQL_COUNT_BUCKETS = (0, 1, 2, 5, 10, 25, 50, 100, 250)
+PDF_SIZE_BUCKETS = (50000, 100000, 250000, 500000, 1000000, 2500000, 5000000)
+METRICS_DIR = os.path.join(app.instance_path, 'metrics')
+METRICS_FLUSH_INTERVAL = 5  # Seconds between writes of a busy worker's totals to METRICS_DIR
+
+def _format_labels(pairs):
+    if not pairs:
+        return ''
+    return '{' + ','.join(f'{k}="{v}"' for k, v in pairs) + '}'
+
+class Histogram:
+    """Prometheus-style histogram keyed by a tuple of label values"""
+
+    def __init__(self, name, help_text, buckets, label_names=()):
+        self.name = name
+        self.help_text = help_text
+        self.buckets = buckets
+        self.label_names = label_names
+        self.series = {}
+
+    def observe(self, labels, value):
+        series = self.series.get(labels)
+        if series is None:
+            # One slot per bucket, one for +Inf, then the running sum
+            series = self.series[labels] = [0] * (len(self.buckets) + 1) + [0.0]
+        series[bisect_left(self.buckets, value)] += 1
+        series[-1] += value
+
+    def render(self, merged=None):
+        """Exposition lines for this histogram, or for merged series of the same shape"""
+        lines = [f'# HELP {self.name} {self.help_text}', f'# TYPE {self.name} histogram']
+        for labels, series in sorted((self.series if merged is None else merged).items()):
+            pairs = list(zip(self.label_names, labels))
+            cumulative = 0
+            for le, count in zip(self.buckets + ('+Inf',), series[:-1]):
+                cumulative += count
+                lines.append(f'{self.name}_bucket{_format_labels(pairs + [("le", le)])} {cumulative}')
+            lines.append(f'{self.name}_sum{_format_labels(pairs)} {series[-1]}')
+            lines.append(f'{self.name}_count{_format_labels(pairs)} {cumulative}')
+        return lines
+
+_metrics_lock = threading.Lock()
+_request_latency = Histogram('http_request_duration_seconds', 'Request latency by endpoint.',
+                             LATENCY_BUCKETS, ('endpoint',))
+_request_sql_queries = Histogram('http_request_sql_queries', 'SQL statements executed per request.',
+                                 SQL_COUNT_BUCKETS, ('endpoint',))
+_pdf_render_seconds = Histogram('pdf_render_duration_seconds', 'WeasyPrint render time.', LATENCY_BUCKETS)
+_pdf_render_bytes = Histogram('pdf_render_size_bytes', 'Rendered PDF size.', PDF_SIZE_BUCKETS)
+_pdf_queue_wait = Histogram('pdf_render_queue_wait_seconds', 'Time renders waited for a slot.', LATENCY_BUCKETS)
+_pdf_rejections = {}  # reason -> count
+_pdf_cache_results = {'hit': 0, 'miss': 0}
+_request_counts = {}  # (endpoint, method, status) -> count
+_request_sql_seconds = {}  # endpoint -> total seconds spent in SQL
+_histograms = (_request_latency, _request_sql_queries, _pdf_render_seconds, _pdf_render_bytes, _pdf_queue_wait)
+_metrics_file = {'pid': None, 'path': None, 'lock': None, 'dirty': False}  # This worker's file in METRICS_DIR
+_metrics_flush_lock = threading.Lock()
+
+COUNTERS = (
+    ('http_requests_total', 'Requests by endpoint, method and status.', ('endpoint', 'method', 'status')),
+    ('http_request_sql_seconds_total', 'Time spent in SQL by endpoint.', ('endpoint',)),
+    ('pdf_render_rejections_total', 'Renders turned away with 503, by reason.', ('reason',)),
+    ('pdf_cache_requests_total', 'Quote PDFs served from the render cache or rendered.', ('result',)),
+    ('user_cache_hits_total', 'User loader cache hits.', ()),
+    ('user_cache_misses_total', 'User loader cache misses.', ()),
+)
+GAUGES = (
+    ('pdf_render_queue_depth', 'Renders waiting for a slot, summed over workers.'),
+    ('pdf_renders_in_progress', 'Renders running, summed over workers.'),
+    ('user_cache_size', 'Cached user records, summed over worker processes.'),
+)
+
+@event.listens_for(Engine, 'before_cursor_execute')
+def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    if context is not None:
+        context._query_start = time.perf_counter()
+
+@event.listens_for(Engine, 'after_cursor_execute')
+def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+    start = getattr(context, '_query_start', None)
+    if start is None:
+        return
+    elapsed = time.perf_counter() - start
+    for collector in _query_collectors:
+        collector.append(statement)
+    if app.config['SQL_PROFILE']:
+        _profile_statement(statement, elapsed)
+    if not has_request_context():
+        return
+    g.sql_queries = g.get('sql_queries', 0) + 1
+    g.sql_time = g.get('sql_time', 0.0) + elapsed
+
+@app.before_request
+def _start_request_timer():
+    g.request_start = time.perf_counter()
+    g.sql_queries = 0
+    g.sql_time = 0.0
+
+@app.after_request
+def _record_request_metrics(response):
+    start = g.pop('request_start', None)
+    if start is None:
+        return response
+    elapsed = time.perf_counter() - start
+    endpoint = request.endpoint or 'unmatched'
+    key = (endpoint, request.method, response.status_code)
+    with _metrics_lock:
+        _request_counts[key] = _request_counts.get(key, 0) + 1
+        _request_latency.observe((endpoint,), elapsed)
+        _request_sql_queries.observe((endpoint,), g.sql_queries)
+        _request_sql_seconds[endpoint] = _request_sql_seconds.get(endpoint, 0.0) + g.sql_time
+    _metrics_file['dirty'] = True
+    if _metrics_file['pid'] != os.getpid():
+        flush_metrics()
+    return response
+
+def _metrics_snapshot():
+    """This worker's totals as JSON-friendly [labels, value] lists"""
+    with _metrics_lock:
+        counters = {
+            'http_requests_total': [[list(key), count] for key, count in _request_counts.items()],
+            'http_request_sql_seconds_total': [[[endpoint], seconds] for endpoint, seconds in _request_sql_seconds.items()],
+            'pdf_render_rejections_total': [[[reason], count] for reason, count in _pdf_rejections.items()],
+            'pdf_cache_requests_total': [[[result], count] for result, count in _pdf_cache_results.items()],
+        }
+        histograms = {h.name: [[list(labels), list(series)] for labels, series in h.series.items()] for h in _histograms}
+    cache = user_cache_stats()
+    counters['user_cache_hits_total'] = [[[], cache['hits']]]
+    counters['user_cache_misses_total'] = [[[], cache['misses']]]
+    queued, running = pdf_admission.stats()
+    gauges = {'pdf_render_queue_depth': queued, 'pdf_renders_in_progress': running, 'user_cache_size': cache['size']}
+    return {'counters': counters, 'histograms': histograms, 'gauges': gauges}
+
+def flush_metrics():
+    """Write this worker's totals to its file in METRICS_DIR"""
+    with _metrics_flush_lock:
+        if _metrics_file['pid'] != os.getpid():
+            # First write in this process; the name stays unique if the pid is reused later
+            os.makedirs(METRICS_DIR, exist_ok=True)
+            name = f'worker_{os.getpid()}_{secrets.token_hex(4)}'
+            lock = open(os.path.join(METRICS_DIR, f'{name}.lock'), 'a')
+            if fcntl is not None:
+                fcntl.flock(lock, fcntl.LOCK_EX)  # Held for the life of the process
+            _metrics_file.update(pid=os.getpid(), path=os.path.join(METRICS_DIR, f'{name}.json'), lock=lock)
+            threading.Thread(target=_metrics_writer, daemon=True).start()
+        _metrics_file['dirty'] = False
+        write_json_file(_metrics_file['path'], _metrics_snapshot())
+
+def _metrics_writer():
+    while True:
+        time.sleep(METRICS_FLUSH_INTERVAL)
+        if _metrics_file['dirty']:
+            flush_metrics()
+
+def _empty_metrics():
+    return {'counters': {}, 'histograms': {}, 'gauges': {}}
+
+def _merge_metrics(total, snapshot, gauges=True):
+    """Add a snapshot's [labels, value] lists into total's {labels: value} dicts"""
+    for name, series in snapshot['counters'].items():
+        merged = total['counters'].setdefault(name, {})
+        for labels, value in series:
+            merged[tuple(labels)] = merged.get(tuple(labels), 0) + value
+    for name, series in snapshot['histograms'].items():
+        merged = total['histograms'].setdefault(name, {})
+        for labels, values in series:
+            current = merged.get(tuple(labels))
+            merged[tuple(labels)] = values if current is None else [a + b for a, b in zip(current, values)]
+    if gauges:
+        for name, value in snapshot['gauges'].items():
+            total['gauges'][name] = total['gauges'].get(name, 0) + value
+
+def _as_snapshot(total):
+    """The reverse of _merge_metrics: {labels: value} dicts back to [labels, value] lists"""
+    snapshot = {'gauges': {}}
+    for kind in ('counters', 'histograms'):
+        snapshot[kind] = {name: [[list(labels), value] for labels, value in series.items()]
+                          for name, series in total[kind].items()}
+    return snapshot
+
+def _read_metrics_file(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+def _worker_exited(lock_path):
+    """True once no process holds the flock on a worker's lock file"""
+    if fcntl is None:
+        return False
+    with open(lock_path, 'a') as f:
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            return False
+    return True
+
+def collect_metrics():
+    """Totals of every worker, live and exited; gauges only from live ones"""
+    flush_metrics()
+    retired_path = os.path.join(METRICS_DIR, 'retired.json')
+    total, retired = _empty_metrics(), _empty_metrics()
+    with open(os.path.join(METRICS_DIR, 'retired.lock'), 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        _merge_metrics(retired, _read_metrics_file(retired_path) or _empty_metrics(), gauges=False)
+        exited = []
+        for name in sorted(os.listdir(METRICS_DIR)):
+            if not (name.startswith('worker_') and name.endswith('.json')):
+                continue
+            snapshot = _read_metrics_file(os.path.join(METRICS_DIR, name))
+            if snapshot is None:
+                continue
+            worker = name[:-len('.json')]
+            if _worker_exited(os.path.join(METRICS_DIR, f'{worker}.lock')):
+                _merge_metrics(retired, snapshot, gauges=False)
+                exited.append(worker)
+            else:
+                _merge_metrics(total, snapshot)
+        if exited:
+            write_json_file(retired_path, _as_snapshot(retired))
+            for worker in exited:
+                for ext in ('json', 'lock'):
+                    try:
+                        os.remove(os.path.join(METRICS_DIR, f'{worker}.{ext}'))
+                    except FileNotFoundError:
+                        pass
+    _merge_metrics(total, _as_snapshot(retired), gauges=False)
+    return total
+
+def render_metrics():
+    """Render the metrics of all workers in Prometheus text exposition format"""
+    total = collect_metrics()
+    lines = []
+    for name, help_text, label_names in COUNTERS:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} counter']
+        for labels, value in sorted(total['counters'].get(name, {}).items()):
+            lines.append(f'{name}{_format_labels(list(zip(label_names, labels)))} {value}')
+    for histogram in _histograms:
+        lines += histogram.render(total['histograms'].get(histogram.name, {}))
+    for name, help_text in GAUGES:
+        lines += [f'# HELP {name} {help_text}', f'# TYPE {name} gauge',
+                  f'{name} {total["gauges"].get(name, 0)}']
+    return '\n'.join(lines) + '\n'
+
+# PDF render admission control
+# At most PDF_MAX_CONCURRENT renders run on the host at once: each one holds an
+# flock on one of that many slot files, which every gunicorn worker shares and
+# the kernel releases if a worker dies. Without fcntl (Windows) the limit falls
+# back to a semaphore per process. Renders that can't start wait in a bounded
+# per-worker queue, where the next slot goes to the user with the fewest
+# renders running, then to the one served least recently. Full queues, users
+# over their share and waits that time out are rejected with 503 + Retry-After.
+
+SLOT_POLL_INTERVAL = 0.05  # Seconds between attempts to take a host-wide slot
+_process_slots = threading.BoundedSemaphore(app.config['PDF_MAX_CONCURRENT'])  # Used when fcntl is missing
+
+class PdfRenderBusy(Exception):
+    def __init__(self, reason):
+        super().__init__(reason)
+        self.reason = reason
+
+def _available_memory_mb():
+    """MemAvailable from /proc/meminfo, or None where that isn't available"""
+    try:
+        with open('/proc/meminfo') as f:
+            for line in f:
+                if line.startswith('MemAvailable:'):
+                    return int(line.split()[1]) // 1024
+    except OSError:
+        pass
+    return None
+
+def _acquire_host_slot():
+    """Lock a free slot file, or return None if all are taken or memory is short"""
+    available = _available_memory_mb()
+    if available is not None and available < app.config['PDF_MIN_AVAILABLE_MB']:
+        return None
+    if fcntl is None:
+        return _process_slots if _process_slots.acquire(blocking=False) else None
+    os.makedirs(app.config['PDF_SLOT_DIR'], exist_ok=True)
+    for slot in range(app.config['PDF_MAX_CONCURRENT']):
+        f = open(os.path.join(app.config['PDF_SLOT_DIR'], f'slot_{slot}.lock'), 'a')
+        try:
+            fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return f
+        except BlockingIOError:
+            f.close()
+    return None
+
+def _release_host_slot(f):
+    if f is _process_slots:
+        _process_slots.release()
+        return
+    fcntl.flock(f, fcntl.LOCK_UN)
+    f.close()
+
+class RenderAdmission:
+    """Bounded, per-user fair queue in front of the host-wide render slots"""
+
+    def __init__(self):
+        self._cond = threading.Condition()
+        self._waiting = []  # (sequence, user_id) in arrival order
+        self._running = {}  # user_id -> renders running in this worker
+        self._last_grant = {}  # user_id -> sequence of their latest slot, while they have work here
+        self._sequence = 0
+        self._grants = 0
+
+    def stats(self):
+        with self._cond:
+            return len(self._waiting), sum(self._running.values())
+
+    def _next_waiter(self):
+        return min(self._waiting, key=lambda ticket: (
+            self._running.get(ticket[1], 0), self._last_grant.get(ticket[1], 0), ticket[0]))
+
+    def _reject(self, reason):
+        with _metrics_lock:
+            _pdf_rejections[reason] = _pdf_rejections.get(reason, 0) + 1
+        return PdfRenderBusy(reason)
+
+    @contextmanager
+    def slot(self, user_id):
+        start = time.monotonic()
+        deadline = start + app.config['PDF_QUEUE_TIMEOUT']
+        with self._cond:
+            user_load = self._running.get(user_id, 0) + sum(1 for _, uid in self._waiting if uid == user_id)
+            if user_load >= app.config['PDF_MAX_PER_USER']:
+                raise self._reject('user_limit')
+            if len(self._waiting) >= app.config['PDF_QUEUE_SIZE']:
+                raise self._reject('queue_full')
+            self._sequence += 1
+            ticket = (self._sequence, user_id)
+            self._waiting.append(ticket)
+            try:
+                while True:
+                    if self._next_waiter() == ticket:
+                        host_slot = _acquire_host_slot()
+                        if host_slot is not None:
+                            break
+                    remaining = deadline - time.monotonic()
+                    if remaining <= 0:
+                        raise self._reject('timeout')
+                    # Slots freed by other workers aren't signalled, so poll
+                    self._cond.wait(min(remaining, SLOT_POLL_INTERVAL))
+            finally:
+                self._waiting.remove(ticket)
+                self._cond.notify_all()
+            self._running[user_id] = self._running.get(user_id, 0) + 1
+            self._grants += 1
+            self._last_grant[user_id] = self._grants
+
+        with _metrics_lock:
+            _pdf_queue_wait.observe((), time.monotonic() - start)
+        try:
+            yield
+        finally:
+            _release_host_slot(host_slot)
+            with self._cond:
+                self._running[user_id] -= 1
+                if not self._running[user_id]:
+                    del self._running[user_id]
+                    if not any(uid == user_id for _, uid in self._waiting):
+                        del self._last_grant[user_id]
+                self._cond.notify_all()
+
+pdf_admission = RenderAdmission()
+
+@app.errorhandler(PdfRenderBusy)
+def _pdf_render_busy(error):
+    response = jsonify({'error': 'PDF rendering is busy, please try again in a moment', 'reason': error.reason})
+    response.status_code = 503
+    response.headers['Retry-After'] = str(app.config['PDF_RETRY_AFTER'])
+    return response
+
+def render_pdf(html_content, base_url, user_id=None):
+    """Render HTML to PDF bytes with WeasyPrint, recording render time and size
+
+    Waits for a render slot first (see RenderAdmission); raises PdfRenderBusy,
+    which is answered with 503, if none frees up.
+    """
+    # Imported on first use: loading Pango/cairo and fontconfig is slow and
+    # most processes (CLI scripts, non-PDF requests) never need it
+    from weasyprint import HTML
+
+    if user_id is None and has_request_context() and current_user.is_authenticated:
+        user_id = current_user.id
+    with pdf_admission.slot(user_id):
+        start = time.perf_counter()
+        pdf = HTML(string=html_content, base_url=base_url).write_pdf()
+    with _metrics_lock:
+        _pdf_render_seconds.observe((), time.perf_counter() - start)
+        _pdf_render_bytes.observe((), len(pdf))
+    return pdf
+
+# SQL profiler
+# Enabled with SQL_PROFILE=1 or from the admin API. Each statement is logged
+# with its timing and the app.py function that issued it; statements repeated
+# within one request are reported as likely N+1 patterns. Settings changed
+# from the admin API are saved to a shared file that every worker checks at
+# the start of each request; the reports themselves are kept per worker.
+
+sql_logger = logging.getLogger('sql_profile')
+sql_logger.setLevel(logging.INFO)
+if not sql_logger.handlers:
+    sql_logger.addHandler(logging.StreamHandler())
+
+_sql_profile_lock = threading.Lock()
+_sql_profile_reports = deque(maxlen=200)  # Per-request summaries
+_slow_queries = deque(maxlen=200)
+_query_collectors = []  # Lists receiving every statement, see assert_max_queries
+SQL_PROFILE_SETTINGS_FILE = os.path.join(app.instance_path, 'sql_profile.json')
+_sql_profile_settings = {'version': None, 'cleared': 0}  # Last settings file applied by this worker
+
+def write_json_file(path, data):
+    """Replace a JSON file in one step, so readers in other workers never see half of it"""
+    tmp_path = f'{path}.{secrets.token_hex(4)}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(data, f)
+    os.replace(tmp_path, path)
+
+def read_sql_profile_settings():
+    try:
+        with open(SQL_PROFILE_SETTINGS_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+@app.before_request
+def _apply_sql_profile_settings():
+    """Pick up settings saved by any worker; a stat() per request when nothing changed"""
+    try:
+        st = os.stat(SQL_PROFILE_SETTINGS_FILE)
+    except OSError:
+        return
+    version = (st.st_mtime_ns, st.st_ino)
+    if version == _sql_profile_settings['version']:
+        return
+    settings = read_sql_profile_settings()
+    if settings is None:
+        return
+    app.config['SQL_PROFILE'] = settings['enabled']
+    app.config['SQL_SLOW_QUERY_MS'] = settings['slow_query_ms']
+    if settings['cleared'] != _sql_profile_settings['cleared']:
+        with _sql_profile_lock:
+            _sql_profile_reports.clear()
+            _slow_queries.clear()
+    _sql_profile_settings.update(version=version, cleared=settings['cleared'])
+
+def _sql_caller():
+    """Find the innermost app.py frame that is not part of the profiler itself"""
+    frame = sys._getframe(2)
+    while frame is not None:
+        code = frame.f_code
+        if code.co_filename == __file__ and not code.co_name.startswith('_'):
+            return f'{code.co_name}:{frame.f_lineno}'
+        frame = frame.f_back
+    return 'unknown'
+
+def _profile_statement(statement, elapsed):
+    statement = ' '.join(statement.split())
+    ms = elapsed * 1000
+    caller = _sql_caller()
+    sql_logger.info('%.2f ms [%s] %s', ms, caller, statement)
+
+    if ms >= app.config['SQL_SLOW_QUERY_MS']:
+        sql_logger.warning('Slow query (%.2f ms) [%s] %s', ms, caller, statement)
+        with _sql_profile_lock:
+            _slow_queries.append({
+                'statement': statement,
+                'ms': round(ms, 3),
+                'caller': caller,
+                'endpoint': request.endpoint if has_request_context() else None,
+                'at': datetime.utcnow().isoformat()
+            })
+
+    if has_request_context():
+        profile = g.setdefault('sql_profile', {})
+        entry = profile.get(statement)
+        if entry is None:
+            profile[statement] = [1, ms, caller]
+        else:
+            entry[0] += 1
+            entry[1] += ms
+
+@app.after_request
+def _report_sql_profile(response):
+    profile = g.pop('sql_profile', None)
+    if not profile:
+        return response
+
+    repeated = []
+    for statement, (count, total_ms, caller) in profile.items():
+        if count >= app.config['SQL_REPEAT_THRESHOLD']:
+            sql_logger.warning('Possible N+1 in %s: %dx [%s] %s', request.endpoint, count, caller, statement)
+            repeated.append({'statement': statement, 'count': count,
+                             'total_ms': round(total_ms, 3), 'caller': caller})
+
+    with _sql_profile_lock:
+        _sql_profile_reports.append({
+            'endpoint': request.endpoint,
+            'method': request.method,
+            'path': request.path,
+            'queries': sum(entry[0] for entry in profile.values()),
+            'total_ms': round(sum(entry[1] for entry in profile.values()), 3),
+            'n_plus_one': repeated,
+            'at': datetime.utcnow().isoformat()
+        })
+    return response
+
+@contextmanager
+def assert_max_queries(limit):
+    """Fail if the block executes more than `limit` SQL statements.
+
+    Usage in tests:
+        with assert_max_queries(5):
+            client.get('/api/quotes')
+    """
+    statements = []
+    _query_collectors.append(statements)
+    try:
+        yield statements
+    finally:
+        _query_collectors.remove(statements)
+    if len(statements) > limit:
+        listing = '\n'.join(f'  {i + 1}. {" ".join(s.split())}' for i, s in enumerate(statements))
+        raise AssertionError(f'Expected at most {limit} queries, got {len(statements)}:\n{listing}')
+
+# On-demand CPU profiling
+# Admins add capture rules targeting a user or a route. Matching requests run
+# under cProfile or a stack sampler. Rules live in a shared file under
+# PROFILE_CAPTURE_DIR, so every gunicorn worker follows them, and each capture
+# is written there as a metadata file plus its profile data, keeping the
+# newest PROFILE_CAPTURE_LIMIT. Rule changes and capture counts are made under
+# an flock (a per-process lock without fcntl). Workers cache the rules until
+# the file changes, so with no rules the per-request cost is one stat().
+
+PROFILE_RULES_FILE = os.path.join(app.config['PROFILE_CAPTURE_DIR'], 'rules.json')
+_capture_lock = threading.Lock()
+_capture_rules = {'version': None, 'rules': []}  # This worker's copy of the rules file
+
+def _read_profiling_state():
+    try:
+        with open(PROFILE_RULES_FILE) as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return None
+
+@contextmanager
+def profiling_state():
+    """The shared rules and id counters, locked across workers; saved when the block exits"""
+    os.makedirs(app.config['PROFILE_CAPTURE_DIR'], exist_ok=True)
+    with _capture_lock, open(os.path.join(app.config['PROFILE_CAPTURE_DIR'], 'rules.lock'), 'a') as lock:
+        if fcntl is not None:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+        state = _read_profiling_state() or {'rules': [], 'next_rule': 1, 'next_capture': 1}
+        yield state
+        write_json_file(PROFILE_RULES_FILE, state)
+
+def active_capture_rules():
+    """Current rules, re-read only when another worker (or this one) changed the file"""
+    try:
+        st = os.stat(PROFILE_RULES_FILE)
+    except OSError:
+        return []
+    version = (st.st_mtime_ns, st.st_ino)
+    if version != _capture_rules['version']:
+        state = _read_profiling_state()
+        _capture_rules.update(version=version, rules=state['rules'] if state else [])
+    return _capture_rules['rules']
+
+def _capture_path(capture_id, kind):
+    return os.path.join(app.config['PROFILE_CAPTURE_DIR'], f'capture_{int(capture_id)}.{kind}')
+
+def _capture_ids():
+    return sorted(int(name[len('capture_'):-len('.json')]) for name in os.listdir(app.config['PROFILE_CAPTURE_DIR'])
+                  if name.startswith('capture_') and name.endswith('.json'))
+
+def read_capture(capture_id, with_data=False):
+    """A stored capture's metadata (and profile bytes), or None if it's gone"""
+    try:
+        with open(_capture_path(capture_id, 'json')) as f:
+            capture = json.load(f)
+        if with_data:
+            with open(_capture_path(capture_id, 'data'), 'rb') as f:
+                capture['data'] = f.read()
+    except (OSError, ValueError):
+        return None
+    return capture
+
+def stored_captures():
+    """Metadata of the stored captures, newest first"""
+    if not os.path.isdir(app.config['PROFILE_CAPTURE_DIR']):
+        return []
+    captures = (read_capture(capture_id) for capture_id in reversed(_capture_ids()))
+    return [capture for capture in captures if capture is not None]
+
+def _save_capture(capture, data):
+    # Data first: a capture is listed once its metadata file exists
+    with open(_capture_path(capture['id'], 'data'), 'wb') as f:
+        f.write(data)
+    write_json_file(_capture_path(capture['id'], 'json'), capture)
+    for capture_id in _capture_ids()[:-app.config['PROFILE_CAPTURE_LIMIT']]:
+        for kind in ('json', 'data'):
+            try:
+                os.remove(_capture_path(capture_id, kind))
+            except FileNotFoundError:
+                pass  # Removed by another worker
+
+class StackSampler:
+    """Samples one thread's stack on a timer, producing folded (flamegraph) stacks"""
+
+    def __init__(self, thread_id, interval):
+        self.thread_id = thread_id
+        self.interval = interval
+        self.counts = {}
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            frame = sys._current_frames().get(self.thread_id)
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                frame = frame.f_back
+            if stack:
+                key = ';'.join(reversed(stack))
+                self.counts[key] = self.counts.get(key, 0) + 1
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def folded(self):
+        return '\n'.join(f'{stack} {count}' for stack, count in sorted(self.counts.items())) + '\n'
+
+def _claim_capture(matches, mode):
+    """Use up one capture of the first matching rule in this mode; returns (rule, capture id)"""
+    # Checked again under the lock: other workers may have used up the rule meanwhile
+    with profiling_state() as state:
+        rule = next((rule for rule in state['rules'] if matches(rule) and rule['mode'] == mode), None)
+        if rule is None:
+            return None, None
+        rule['remaining'] -= 1
+        if rule['remaining'] <= 0:
+            state['rules'].remove(rule)
+        capture_id = state['next_capture']
+        state['next_capture'] += 1
+    return rule, capture_id
+
+@app.before_request
+def _start_profile_capture():
+    rules = active_capture_rules()
+    if not rules:
+        return
+    user_id = current_user.id if current_user.is_authenticated else None
+
+    def matches(rule):
+        return ((rule['user_id'] is None or rule['user_id'] == user_id) and
+                (rule['endpoint'] is None or rule['endpoint'] == request.endpoint))
+
+    mode = next((rule['mode'] for rule in rules if matches(rule)), None)
+    if mode is None:
+        return
+
+    # Start the profiler before claiming, so a capture is only used up once it can be recorded
+    if mode == 'sampling':
+        profiler = StackSampler(threading.get_ident(), app.config['PROFILE_SAMPLE_INTERVAL'])
+        profiler.start()
+    else:
+        profiler = cProfile.Profile()
+        try:
+            profiler.enable()
+        except ValueError:
+            # Another profiler is already active in this interpreter
+            return
+
+    rule, capture_id = _claim_capture(matches, mode)
+    if rule is None:
+        if mode == 'sampling':
+            profiler.stop()
+        else:
+            profiler.disable()
+        return
+    g.profile_capture = {'id': capture_id, 'rule_id': rule['id'], 'mode': mode, 'user_id': user_id,
+                         'profiler': profiler, 'start': time.perf_counter()}
+
+def _finish_profile_capture(status):
+    capture = g.pop('profile_capture', None)
+    if capture is None:
+        return
+    profiler = capture.pop('profiler')
+    if capture['mode'] == 'sampling':
+        profiler.stop()
+        data = profiler.folded().encode()
+    else:
+        profiler.disable()
+        profiler.create_stats()
+        data = marshal.dumps(profiler.stats)
+
+    capture.update({
+        'endpoint': request.endpoint,
+        'method': request.method,
+        'path': request.path,
+        'status': status,
+        'duration_ms': round((time.perf_counter() - capture.pop('start')) * 1000, 3),
+        'at': datetime.utcnow().isoformat(),
+        'pid': os.getpid()
+    })
+    os.makedirs(app.config['PROFILE_CAPTURE_DIR'], exist_ok=True)
+    _save_capture(capture, data)
+
+@app.after_request
+def _stop_profile_capture(response):
+    _finish_profile_capture(response.status_code)
+    return response
+
+@app.teardown_request
+def _discard_profile_capture(exc):
+    # Only reached with a capture still running if after_request was skipped
+    if 'profile_capture' in g:
+        _finish_profile_capture(500)
+
+class _ProfStats:
+    """Adapter so pstats.Stats can load stats kept in memory instead of a file"""
+
+    def __init__(self, stats):
+        self.stats = stats
+
+    def create_stats(self):
+        pass
+
+def capture_report(capture, fmt):
+    """Render a stored capture as a pstats call tree, raw .prof or folded stacks"""
+    if capture['mode'] == 'sampling' or fmt == 'prof':
+        return capture['data']
+    stats = pstats.Stats(_ProfStats(marshal.loads(capture['data'])), stream=io.StringIO())
+    stats.sort_stats('cumulative').print_stats(80)
+    stats.print_callees(40)
+    return stats.stream.getvalue().encode()
+
 # Database Models
 
 class User(db.Model, UserMixin):
@@ -73,8 +993,10 @@ class User(db.Model, UserMixin):
     bank_account_number = db.Column(db.String(50))
     bank_iban = db.Column(db.String(50))
 
-    # Profile picture (path to uploaded file)
+    # Profile picture (URL of the avatar variant; legacy rows point at the original upload)
     profilepic = db.Column(db.String(500))
+    profilepic_print = db.Column(db.String(200))  # Filename of the print-resolution variant for PDFs
+    profilepic_status = db.Column(db.String(20))  # 'processing', 'ready' or 'failed'
 
     quotes = db.relationship('Quote', backref='owner', lazy=True)
 
@@ -111,10 +1033,11 @@ class User(db.Model, UserMixin):
             'bank_account_number': self.bank_account_number,
             'bank_iban': self.bank_iban,
             'profilepic': self.profilepic,
+            'profilepic_status': self.profilepic_status,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
-    def to_admin_dict(self):
+    def to_admin_dict(self, quote_count=0):
         """For admin user list - includes quote count"""
         return {
             'id': self.id,
@@ -123,7 +1046,7 @@ class User(db.Model, UserMixin):
             'role': self.role,
             'is_active': self.is_active,
             'business_name': self.business_name,
-            'quote_count': len(self.quotes),
+            'quote_count': quote_count,
             'created_at': self.created_at.isoformat() if self.created_at else None
         }
 
@@ -142,11 +1065,37 @@ class ClientCompany(db.Model):
     poc_phone = db.Column(db.String(50))
     poc_email = db.Column(db.String(200))
     venue = db.Column(db.String(300))
+    last_used_at = db.Column(db.DateTime)  # Last quote saved for this company (autocomplete ranking)
+
+    # Aggregates over this company's quotes, kept in step by update_company_aggregates()
+    quote_count = db.Column(db.Integer, default=0)  # doc_type QUOTE, including trashed
+    invoice_count = db.Column(db.Integer, default=0)  # doc_type INVOICE, including trashed
+    total_billed = db.Column(db.Float, default=0)  # Sum of totals of invoices not in the recycle bin
+    last_invoice_number = db.Column(db.String(50))  # Set by the latest invoice created; kept if that invoice is deleted
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
 
     user = db.relationship('User', backref=db.backref('client_companies', lazy=True))
 
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'address': self.address or '',
+            'poc': self.poc or '',
+            'poc_phone': self.poc_phone or '',
+            'poc_email': self.poc_email or '',
+            'venue': self.venue or '',
+            'quote_count': self.quote_count or 0,
+            'invoice_count': self.invoice_count or 0,
+            'total_billed': self.total_billed or 0,
+            'last_invoice_number': self.last_invoice_number,
+            'last_used_at': self.last_used_at.isoformat() if self.last_used_at else None
+        }
+
+# Case-insensitive prefix lookups for company autocomplete
+db.Index('ix_client_company_user_lower_name', ClientCompany.user_id, db.func.lower(ClientCompany.name))
+
 class Quote(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
@@ -183,8 +1132,9 @@ class Quote(db.Model):
     # Equipment items (stored as JSON)
     equipments_enabled = db.Column(db.Boolean, default=False)
     hide_labor = db.Column(db.Boolean, default=False)  # Hide labor section for equipment-only quotes
-    equipment_headers = db.Column(db.Text)  # JSON string
-    equipment_items = db.Column(db.Text)  # JSON string
+    equipment_header1 = db.Column(db.String(100))  # Column labels of the equipment table
+    equipment_header2 = db.Column(db.String(100))
+    equipment_header3 = db.Column(db.String(100))
 
     # Editable bank details (per quote)
     bank_account_holder = db.Column(db.String(200))
@@ -199,6 +1149,14 @@ class Quote(db.Model):
     updated_at = db.Column(db.DateTime, default=datetime.utcnow, onupdate=datetime.utcnow)
     deleted_at = db.Column(db.DateTime, nullable=True)  # Soft delete - when moved to recycle bin
     line_items = db.relationship('LineItem', backref='quote', lazy=True, cascade='all, delete-orphan')
+    equipment_items = db.relationship('EquipmentItem', backref='quote', lazy=True, cascade='all, delete-orphan',
+                                      order_by='EquipmentItem.position')
+    revisions = db.relationship('QuoteRevision', backref='quote', lazy='dynamic', cascade='all, delete-orphan')
+
+    __table_args__ = (
+        db.Index('ix_quote_user_company', 'user_id', 'client_company'),
+        db.Index('ix_quote_user_deleted_date', 'user_id', 'deleted_at', 'date'),
+    )
 
     def to_dict(self):
         return {
@@ -236,12 +1194,33 @@ class Quote(db.Model):
             'total': self.total,
             'equipments_enabled': self.equipments_enabled,
             'hide_labor': self.hide_labor,
-            'equipment_headers': json.loads(self.equipment_headers) if self.equipment_headers else None,
-            'equipment_items': json.loads(self.equipment_items) if self.equipment_items else [],
+            'equipment_headers': self.equipment_headers,
+            'equipment_items': [item.to_dict() for item in self.equipment_items],
             'created_at': self.created_at.isoformat() if self.created_at else None,
             'line_items': [item.to_dict() for item in self.line_items]
         }
 
+    @property
+    def equipment_headers(self):
+        if not (self.equipment_header1 or self.equipment_header2 or self.equipment_header3):
+            return None
+        return {'header1': self.equipment_header1, 'header2': self.equipment_header2,
+                'header3': self.equipment_header3}
+
+    def set_equipment(self, headers, items):
+        """Replace equipment headers and rows from the editor's JSON payload"""
+        headers = headers or {}
+        self.equipment_header1 = headers.get('header1')
+        self.equipment_header2 = headers.get('header2')
+        self.equipment_header3 = headers.get('header3')
+        self.equipment_items = [EquipmentItem(
+            position=position,
+            description=item.get('description'),
+            qty=str(item['qty']) if item.get('qty') not in (None, '') else None,
+            price=item.get('price') or 0,
+            total=item.get('total') or 0
+        ) for position, item in enumerate(items or [])]
+
 class LineItem(db.Model):
     id = db.Column(db.Integer, primary_key=True)
     quote_id = db.Column(db.Integer, db.ForeignKey('quote.id'), nullable=False)
@@ -275,10 +1254,428 @@ class LineItem(db.Model):
             'ot_hourly_rate': self.ot_hourly_rate
         }
 
+class EquipmentItem(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    quote_id = db.Column(db.Integer, db.ForeignKey('quote.id'), nullable=False, index=True)
+    position = db.Column(db.Integer, nullable=False, default=0)  # Row order in the editor
+    description = db.Column(db.String(300))
+    qty = db.Column(db.String(50))  # Free text, e.g. "2", "260m" or "set"
+    price = db.Column(db.Float, default=0)
+    total = db.Column(db.Float, default=0)
+
+    def to_dict(self):
+        return {
+            'description': self.description,
+            'qty': self.qty,
+            'price': self.price,
+            'total': self.total
+        }
+
+# Sum of equipment rows, computed by SQL. Deferred so it only runs when read
+# (quote.equipment_total) or selected explicitly in a report query.
+Quote.equipment_total = db.column_property(
+    db.select(db.func.coalesce(db.func.sum(EquipmentItem.total), 0))
+    .where(EquipmentItem.quote_id == Quote.id)
+    .correlate_except(EquipmentItem)
+    .scalar_subquery(),
+    deferred=True
+)
+
+class QuoteRevision(db.Model):
+    id = db.Column(db.Integer, primary_key=True)
+    quote_id = db.Column(db.Integer, db.ForeignKey('quote.id'), nullable=False)
+    user_id = db.Column(db.Integer, db.ForeignKey('user.id'), nullable=False)
+    revision = db.Column(db.Integer, nullable=False)  # 1, 2, ... per quote
+    is_snapshot = db.Column(db.Boolean, default=False)  # Full state, otherwise a delta against revision - 1
+    data = db.Column(db.LargeBinary, nullable=False)  # zlib-compressed JSON
+    changed_fields = db.Column(db.String(500))  # Comma-separated, so listing needs no decompression
+    created_at = db.Column(db.DateTime, default=datetime.utcnow)
+
+    __table_args__ = (
+        db.UniqueConstraint('quote_id', 'revision', name='uq_quote_revision'),
+    )
+
+    def to_dict(self):
+        return {
+            'revision': self.revision,
+            'is_snapshot': self.is_snapshot,
+            'changed_fields': self.changed_fields.split(',') if self.changed_fields else [],
+            'size': len(self.data),
+            'created_at': self.created_at.isoformat() if self.created_at else None
+        }
+
+# Per-tenant database shards
+# With TENANT_SHARDING=1, the tables in TENANT_TABLES live in one file per user
+# (instance/tenants/user_<id>.db) and everything else, including users and
+# logins, stays in the central database. TenantSession routes each statement
+# by the table it touches, so a long write by one tenant only locks that
+# tenant's file. The tenant is the logged-in user unless use_tenant() says
+# otherwise. Run split_tenants.py to move existing data into shards.
+
+TENANT_TABLES = {'quote', 'line_item', 'client_company', 'equipment_item', 'quote_revision'}
+_tenant_engines = OrderedDict()  # user_id -> Engine, least recently used first
+_tenant_engines_lock = threading.Lock()
+
+def _touches_tenant_table(mapper, clause):
+    if mapper is not None:
+        return sa_inspect(mapper).local_table.name in TENANT_TABLES
+    if isinstance(clause, Table):
+        return clause.name in TENANT_TABLES
+    if isinstance(clause, UpdateBase):
+        return getattr(clause.table, 'name', None) in TENANT_TABLES
+    if isinstance(clause, Select):
+        return any(getattr(table, 'name', None) in TENANT_TABLES for table in clause.get_final_froms())
+    return False
+
+def current_tenant_id():
+    if has_app_context() and g.get('tenant_id') is not None:
+        return g.tenant_id
+    if has_request_context() and current_user.is_authenticated:
+        return current_user.id
+    return None
+
+def tenant_db_path(user_id):
+    return os.path.join(app.config['TENANT_SHARD_DIR'], f'user_{int(user_id)}.db')
+
+def tenant_engine(user_id):
+    """Engine for a tenant's shard; the file and its tables are created on first use"""
+    with _tenant_engines_lock:
+        engine = _tenant_engines.get(user_id)
+        if engine is not None:
+            _tenant_engines.move_to_end(user_id)
+            return engine
+        os.makedirs(app.config['TENANT_SHARD_DIR'], exist_ok=True)
+        engine = create_engine(f'sqlite:///{tenant_db_path(user_id)}')
+        with engine.connect() as conn:
+            # Only takes effect while the file is still empty, i.e. for new shards
+            conn.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        tables = [db.metadata.tables[name] for name in TENANT_TABLES]
+        db.metadata.create_all(engine, tables=tables)
+        # create_all skips existing tables, so add indexes introduced since the shard was made.
+        # Checked by name: reflection doesn't report expression indexes, so checkfirst can't be used
+        with engine.begin() as conn:
+            existing = {name for (name,) in conn.exec_driver_sql(
+                "SELECT name FROM sqlite_master WHERE type = 'index'")}
+            for index in (index for table in tables for index in table.indexes):
+                if index.name not in existing:
+                    index.create(conn)
+        _tenant_engines[user_id] = engine
+        while len(_tenant_engines) > app.config['TENANT_ENGINE_CACHE']:
+            _, evicted = _tenant_engines.popitem(last=False)
+            evicted.dispose()
+        return engine
+
+def tenant_ids():
+    """Ids of users that have a shard file"""
+    shard_dir = app.config['TENANT_SHARD_DIR']
+    if not os.path.isdir(shard_dir):
+        return []
+    matches = (re.fullmatch(r'user_(\d+)\.db', name) for name in os.listdir(shard_dir))
+    return sorted(int(m.group(1)) for m in matches if m)
+
+def drop_tenant_shard(user_id):
+    with _tenant_engines_lock:
+        engine = _tenant_engines.pop(user_id, None)
+    if engine is not None:
+        engine.dispose()
+    path = tenant_db_path(user_id)
+    for suffix in ('', '-journal', '-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+
+@contextmanager
+def use_tenant(user_id):
+    """Route per-tenant tables to user_id's shard inside the block (admin tasks)"""
+    previous = g.get('tenant_id')
+    g.tenant_id = user_id
+    try:
+        yield
+    finally:
+        # Identity keys don't include the shard, so rows of different tenants
+        # with the same id must not share the session
+        db.session.expunge_all()
+        g.tenant_id = previous
+
+def map_tenants(func):
+    """Run func(connection) against every shard in parallel; returns {user_id: result}"""
+    def run(user_id):
+        with tenant_engine(user_id).connect() as conn:
+            return user_id, func(conn)
+
+    ids = tenant_ids()
+    if not ids:
+        return {}
+    with ThreadPoolExecutor(max_workers=min(8, len(ids))) as pool:
+        return dict(pool.map(run, ids))
+
+def quote_counts_by_user():
+    """Number of quotes (including trashed) per user id"""
+    if app.config['TENANT_SHARDING']:
+        return map_tenants(lambda conn: conn.execute(
+            db.select(db.func.count()).select_from(Quote.__table__)).scalar())
+    return dict(db.session.query(Quote.user_id, db.func.count(Quote.id)).group_by(Quote.user_id).all())
+
+# Database maintenance
+# maintenance.py does the work (ANALYZE, incremental vacuum, quick_check);
+# the admin page shows live sizes next to its last report.
+
+AUTO_VACUUM_MODES = ('none', 'full', 'incremental')
+
+def sqlite_file_stats(conn):
+    """Size and free pages of a SQLite database, given a sqlite3 connection"""
+    page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+    page_count = conn.execute('PRAGMA page_count').fetchone()[0]
+    free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+    return {
+        'size_bytes': page_size * page_count,
+        'page_count': page_count,
+        'free_pages': free_pages,
+        'free_percent': round(100 * free_pages / page_count, 1) if page_count else 0,
+        'auto_vacuum': AUTO_VACUUM_MODES[conn.execute('PRAGMA auto_vacuum').fetchone()[0]],
+    }
+
+def maintenance_databases():
+    """(name, file path) of the central database and every tenant shard"""
+    databases = [('central', db.engine.url.database)]
+    databases += [(f'user_{user_id}', tenant_db_path(user_id)) for user_id in tenant_ids()]
+    return databases
+
+# Client company aggregates
+
+def sync_company_details(quote):
+    """Copy the quote's contact details onto its saved company, if there is one"""
+    if not quote.client_company:
+        return
+    company = ClientCompany.query.filter_by(
+        user_id=quote.user_id,
+        name=quote.client_company
+    ).first()
+    if company:
+        company.address = quote.client_address or company.address
+        company.poc = quote.poc or company.poc
+        company.poc_phone = quote.poc_phone or company.poc_phone
+        company.poc_email = quote.poc_email or company.poc_email
+        company.venue = quote.venue or company.venue
+        company.last_used_at = datetime.utcnow()
+
+def company_aggregate_state(quote):
+    """The fields of a quote the company aggregates depend on; take it before and after a write"""
+    return (quote.client_company, quote.doc_type == 'INVOICE', quote.deleted_at is None,
+            quote.total or 0, quote.invoice_number)
+
+def update_company_aggregates(user_id, changes):
+    """Apply quote writes to the aggregates of their saved companies.
+
+    changes holds (before, after) company_aggregate_state() pairs, with None
+    for a quote that is new or deleted. Counts and totals are adjusted by the
+    difference, as increments in the caller's transaction, so a write never
+    scans the company's other quotes.
+    """
+    deltas = {}  # company name -> [quotes, invoices, billed]
+
+    def add(state, sign):
+        if state is None or not state[0]:
+            return
+        name, is_invoice, active, total, _ = state
+        delta = deltas.setdefault(name, [0, 0, 0.0])
+        delta[1 if is_invoice else 0] += sign
+        if is_invoice and active:
+            delta[2] += sign * total
+
+    last_numbers = []
+    for before, after in changes:
+        add(before, -1)
+        add(after, 1)
+        if after is None or not (after[0] and after[1] and after[4]):
+            continue
+        if before is None or not before[1]:
+            # A new invoice (or a quote turned into one) is the company's latest
+            last_numbers.append((after[0], after[4], None))
+        elif before[0] == after[0] and before[4] != after[4]:
+            # Renumbered: only matters if it was the latest
+            last_numbers.append((after[0], after[4], before[4]))
+
+    for name, (quotes, invoices, billed) in deltas.items():
+        if not (quotes or invoices or billed):
+            continue
+        ClientCompany.query.filter_by(user_id=user_id, name=name).update({
+            ClientCompany.quote_count: db.func.coalesce(ClientCompany.quote_count, 0) + quotes,
+            ClientCompany.invoice_count: db.func.coalesce(ClientCompany.invoice_count, 0) + invoices,
+            ClientCompany.total_billed: db.func.coalesce(ClientCompany.total_billed, 0) + billed
+        }, synchronize_session=False)
+    for name, number, previous in last_numbers:
+        query = ClientCompany.query.filter_by(user_id=user_id, name=name)
+        if previous is not None:
+            query = query.filter(ClientCompany.last_invoice_number == previous)
+        query.update({ClientCompany.last_invoice_number: number}, synchronize_session=False)
+
+def recompute_company_aggregates(company):
+    """Aggregates of a newly saved company from the quotes already filed under its name"""
+    is_invoice = Quote.doc_type == 'INVOICE'
+    quote_count, invoice_count, total_billed = db.session.query(
+        db.func.sum(db.case((is_invoice, 0), else_=1)),
+        db.func.sum(db.case((is_invoice, 1), else_=0)),
+        db.func.sum(db.case((db.and_(is_invoice, Quote.deleted_at.is_(None)), Quote.total), else_=0))
+    ).filter(Quote.user_id == company.user_id, Quote.client_company == company.name).one()
+    company.quote_count = quote_count or 0
+    company.invoice_count = invoice_count or 0
+    company.total_billed = total_billed or 0
+    last_invoice = db.session.query(Quote.invoice_number).filter(
+        Quote.user_id == company.user_id,
+        Quote.client_company == company.name,
+        is_invoice
+    ).order_by(Quote.created_at.desc(), Quote.id.desc()).first()
+    company.last_invoice_number = last_invoice[0] if last_invoice else None
+
+# Quote revisions
+# Each save appends a revision holding only the fields that changed since the
+# previous one; list fields (line and equipment items) store just the changed
+# rows and the new length. Every REVISION_SNAPSHOT_INTERVAL revisions a full
+# snapshot is stored instead, so rebuilding any version reads one snapshot and
+# at most that many deltas.
+
+REVISION_EXCLUDED_FIELDS = {'id', 'user_id', 'created_at'}
+
+def _revision_state(quote):
+    state = {k: v for k, v in quote.to_dict().items() if k not in REVISION_EXCLUDED_FIELDS}
+    # Line items are recreated on every save, so their ids carry no meaning
+    state['line_items'] = [{k: v for k, v in item.items() if k != 'id'} for item in state['line_items']]
+    return state
+
+def _pack_revision(value):
+    return zlib.compress(json.dumps(value, separators=(',', ':'), sort_keys=True).encode('utf-8'), 9)
+
+def _unpack_revision(data):
+    return json.loads(zlib.decompress(data))
+
+def _diff_revision_states(old, new):
+    delta = {'fields': {}, 'lists': {}, 'removed': [key for key in old if key not in new]}
+    for key, value in new.items():
+        before = old.get(key)
+        if isinstance(value, list) and isinstance(before, list):
+            rows = {str(i): row for i, row in enumerate(value) if i >= len(before) or before[i] != row}
+            if rows or len(value) != len(before):
+                delta['lists'][key] = {'len': len(value), 'rows': rows}
+        elif key not in old or before != value:
+            delta['fields'][key] = value
+    return {k: v for k, v in delta.items() if v}
+
+def _apply_revision_delta(state, delta):
+    state.update(delta.get('fields', {}))
+    for key, change in delta.get('lists', {}).items():
+        rows = (state.get(key) or [])[:change['len']]
+        rows += [None] * (change['len'] - len(rows))
+        for index, row in change['rows'].items():
+            rows[int(index)] = row
+        state[key] = rows
+    for key in delta.get('removed', []):
+        state.pop(key, None)
+    return state
+
+def reconstruct_revision(quote_id, revision):
+    """Rebuild a quote's state at a revision from the nearest snapshot and the deltas after it"""
+    base = db.session.query(db.func.max(QuoteRevision.revision)).filter(
+        QuoteRevision.quote_id == quote_id,
+        QuoteRevision.is_snapshot.is_(True),
+        QuoteRevision.revision <= revision
+    ).scalar()
+    if base is None:
+        return None
+    rows = QuoteRevision.query.filter(
+        QuoteRevision.quote_id == quote_id,
+        QuoteRevision.revision.between(base, revision)
+    ).order_by(QuoteRevision.revision).all()
+    if rows[-1].revision != revision:
+        return None
+
+    state = _unpack_revision(rows[0].data)
+    for row in rows[1:]:
+        state = _apply_revision_delta(state, _unpack_revision(row.data))
+    return state
+
+def record_revision(quote, previous_state, previous_time=None):
+    """Append the quote's current state to its revision log, before the commit.
+
+    previous_state is the quote as it was before this change. It is stored as
+    revision 1 for quotes that have no history yet (created before revisions
+    existed, or never edited since being created or cloned).
+    """
+    db.session.flush()
+    db.session.expire(quote, ['line_items', 'equipment_items'])
+    state = _revision_state(quote)
+
+    latest = quote.revisions.order_by(QuoteRevision.revision.desc()).first()
+    if latest is None:
+        latest = QuoteRevision(quote_id=quote.id, user_id=quote.user_id, revision=1, is_snapshot=True,
+                               data=_pack_revision(previous_state), created_at=previous_time or datetime.utcnow())
+        db.session.add(latest)
+        previous, last_snapshot = previous_state, 1
+    else:
+        previous = reconstruct_revision(quote.id, latest.revision)
+        last_snapshot = db.session.query(db.func.max(QuoteRevision.revision)).filter(
+            QuoteRevision.quote_id == quote.id,
+            QuoteRevision.is_snapshot.is_(True)
+        ).scalar()
+
+    delta = _diff_revision_states(previous, state)
+    if not delta:
+        return None
+    changed = sorted(set(delta.get('fields', {})) | set(delta.get('lists', {})) | set(delta.get('removed', [])))
+
+    number = latest.revision + 1
+    is_snapshot = number - last_snapshot >= app.config['REVISION_SNAPSHOT_INTERVAL']
+    revision = QuoteRevision(quote_id=quote.id, user_id=quote.user_id, revision=number, is_snapshot=is_snapshot,
+                             data=_pack_revision(state if is_snapshot else delta),
+                             changed_fields=','.join(changed)[:500])
+    db.session.add(revision)
+    if is_snapshot:
+        prune_revisions(quote.id)
+    return revision
+
+def prune_revisions(quote_id):
+    """Delete revisions older than REVISION_RETENTION_DAYS, keeping at least the
+    latest REVISION_KEEP_MIN. The oldest kept revision is rewritten as a full
+    snapshot so the remaining history still reconstructs. Returns rows deleted.
+    """
+    keep_from = db.session.query(QuoteRevision.revision).filter_by(quote_id=quote_id).order_by(
+        QuoteRevision.revision.desc()).offset(app.config['REVISION_KEEP_MIN'] - 1).limit(1).scalar()
+    if keep_from is None:
+        return 0
+    cutoff = datetime.utcnow() - timedelta(days=app.config['REVISION_RETENTION_DAYS'])
+    oldest_recent = db.session.query(db.func.min(QuoteRevision.revision)).filter(
+        QuoteRevision.quote_id == quote_id,
+        QuoteRevision.created_at >= cutoff
+    ).scalar()
+    if oldest_recent is not None:
+        keep_from = min(keep_from, oldest_recent)
+
+    first = QuoteRevision.query.filter_by(quote_id=quote_id, revision=keep_from).one()
+    if not first.is_snapshot:
+        first.data = _pack_revision(reconstruct_revision(quote_id, keep_from))
+        first.is_snapshot = True
+    return QuoteRevision.query.filter(
+        QuoteRevision.quote_id == quote_id,
+        QuoteRevision.revision < keep_from
+    ).delete(synchronize_session=False)
+
 # Initialize database
 def init_db():
     with app.app_context():
-        db.create_all()
+        new_database = db.engine.dialect.name == 'sqlite' and not sa_inspect(db.engine).get_table_names()
+        if new_database:
+            # Let maintenance.py hand free pages back with incremental vacuum
+            with db.engine.connect() as conn:
+                conn.exec_driver_sql('PRAGMA auto_vacuum = INCREMENTAL')
+        if app.config['TENANT_SHARDING']:
+            # Per-tenant tables are created in each shard by tenant_engine()
+            db.metadata.create_all(db.engine, tables=[
+                table for table in db.metadata.sorted_tables if table.name not in TENANT_TABLES])
+        else:
+            db.create_all()
+        if new_database:
+            # Created with the current schema, so migrate_db.py has nothing to apply
+            with db.engine.connect() as conn:
+                migrate_db.stamp(conn.connection.driver_connection)
         # Create default admin if no users exist
         if User.query.count() == 0:
             admin = User(
@@ -301,6 +1698,109 @@ def init_db():
             print("  (You will be required to change this on first login)")
             print("=" * 50)
 
+# Response compression
+# Compresses JSON and text responses above COMPRESS_MIN_SIZE with brotli or
+# gzip, whichever the client accepts. The body is compressed in chunks while
+# it is sent, so a large payload is never held in memory a second time.
+
+COMPRESSIBLE_MIMETYPES = {'application/json', 'application/javascript', 'application/xml', 'image/svg+xml'}
+COMPRESS_CHUNK_SIZE = 64 * 1024
+
+def _negotiate_encoding():
+    accept = request.accept_encodings
+    if brotli is not None and accept['br']:
+        return 'br'
+    if accept['gzip']:
+        return 'gzip'
+    return None
+
+def _compress_chunks(chunks, encoding, level):
+    if encoding == 'br':
+        compressor = brotli.Compressor(quality=level)
+        compress, flush = compressor.process, compressor.finish
+    else:
+        compressor = zlib.compressobj(level, zlib.DEFLATED, 31)  # 31 = gzip container
+        compress, flush = compressor.compress, compressor.flush
+    for chunk in chunks:
+        for start in range(0, len(chunk), COMPRESS_CHUNK_SIZE):
+            data = compress(chunk[start:start + COMPRESS_CHUNK_SIZE])
+            if data:
+                yield data
+    yield flush()
+
+@app.after_request
+def _compress_response(response):
+    if (response.direct_passthrough or 'Content-Encoding' in response.headers
+            or request.method == 'HEAD' or response.status_code < 200
+            or response.status_code in (204, 304)):
+        return response
+    mimetype = response.mimetype or ''
+    if not (mimetype.startswith('text/') or mimetype in COMPRESSIBLE_MIMETYPES):
+        return response
+    # Streamed responses have no length yet and are always worth compressing
+    length = response.content_length
+    if length is not None and length < app.config['COMPRESS_MIN_SIZE']:
+        return response
+
+    response.vary.add('Accept-Encoding')
+    encoding = _negotiate_encoding()
+    if encoding is None:
+        return response
+
+    level = app.config['COMPRESS_BROTLI_QUALITY'] if encoding == 'br' else app.config['COMPRESS_LEVEL']
+    response.response = _compress_chunks(response.iter_encoded(), encoding, level)
+    response.headers['Content-Encoding'] = encoding
+    response.headers.pop('Content-Length', None)
+    return response
+
+# Static asset pipeline
+# build_assets.py writes minified, content-hashed and precompressed JS/CSS to
+# static/dist/ plus a manifest. Templates link them through asset_url(), which
+# falls back to the plain static file when no build exists.
+
+ASSET_DIR = os.path.join(app.static_folder, 'dist')
+ASSET_MANIFEST = os.path.join(ASSET_DIR, 'manifest.json')
+_asset_manifest = {'mtime': None, 'entries': {}}
+
+def _load_asset_manifest():
+    try:
+        mtime = os.stat(ASSET_MANIFEST).st_mtime_ns
+    except OSError:
+        return {}
+    if mtime != _asset_manifest['mtime']:
+        with open(ASSET_MANIFEST) as f:
+            _asset_manifest['entries'] = json.load(f)
+        _asset_manifest['mtime'] = mtime
+    return _asset_manifest['entries']
+
+@app.template_global()
+def asset_url(path):
+    """URL of the built asset for a static/ path, or the source file if not built"""
+    # The debug server always serves sources so edits show up without a rebuild
+    built = None if app.debug else _load_asset_manifest().get(path)
+    if built:
+        return url_for('serve_asset', filename=built)
+    return url_for('static', filename=path)
+
+@app.route('/assets/<path:filename>')
+def serve_asset(filename):
+    """Serve a fingerprinted asset, preferring a precompressed variant"""
+    mimetype = mimetypes.guess_type(filename)[0] or 'application/octet-stream'
+    encoding = None
+    for candidate, ext in (('br', '.br'), ('gzip', '.gz')):
+        if request.accept_encodings[candidate] and os.path.exists(os.path.join(ASSET_DIR, filename + ext)):
+            encoding = candidate
+            filename += ext
+            break
+
+    response = send_from_directory(ASSET_DIR, filename, mimetype=mimetype, max_age=31536000)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    response.headers['Vary'] = 'Accept-Encoding'
+    # Names change with content, so the files can be cached forever
+    response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+    return response
+
 # Authentication Routes
 
 @app.route('/login', methods=['GET', 'POST'])
@@ -350,6 +1850,7 @@ def change_password():
         current_user.password_hash = generate_password_hash(new_password)
         current_user.must_change_password = False
         db.session.commit()
+        invalidate_user_cache(current_user.id)
         return redirect(url_for('index'))
 
     return render_template('change_password.html')
@@ -394,6 +1895,9 @@ def history():
 @app.route('/api/profile', methods=['GET'])
 @login_required
 def get_profile():
+    # Polled while a picture is processing, which is when a lost job shows up
+    if current_user.profilepic_status == 'processing':
+        recover_profile_picture(current_user.id)
     return jsonify(current_user.to_dict())
 
 @app.route('/api/profile', methods=['PUT'])
@@ -426,11 +1930,149 @@ def update_profile():
         current_user.bank_iban = data['bank_iban']
 
     db.session.commit()
+    invalidate_user_cache(current_user.id)
     return jsonify(current_user.to_dict())
 
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
+# Profile picture processing
+# Uploads are streamed to an incoming/ folder and answered immediately. A
+# background worker decodes and validates the image and writes two variants
+# named by their content hash, which makes them safe to cache forever. The
+# upload is only removed once the result is saved, so a job lost with its
+# gunicorn worker is requeued from it by recover_profile_picture().
+
+PROFILEPIC_INCOMING = os.path.join(UPLOAD_FOLDER, 'incoming')
+VARIANT_FILENAME = re.compile(r'^[0-9a-f]{24}_(avatar|print)\.(png|jpg)$')
+_image_executor = None
+_image_executor_lock = threading.Lock()
+
+def _submit_image_job(fn, *args):
+    # Created on first use so gunicorn workers each start their own thread after fork
+    global _image_executor
+    with _image_executor_lock:
+        if _image_executor is None:
+            _image_executor = ThreadPoolExecutor(max_workers=1, thread_name_prefix='profilepic')
+    return _image_executor.submit(fn, *args)
+
+def _write_variant(image, max_size, kind):
+    """Resize a copy of `image` and save it under a content-addressed name"""
+    variant = image.copy()
+    variant.thumbnail((max_size, max_size), Image.LANCZOS)
+    buffer = io.BytesIO()
+    if variant.mode == 'RGBA':
+        variant.save(buffer, 'PNG', optimize=True)
+        ext = 'png'
+    else:
+        variant.convert('RGB').save(buffer, 'JPEG', quality=88, optimize=True, progressive=True)
+        ext = 'jpg'
+    data = buffer.getvalue()
+
+    filename = f"{hashlib.sha256(data).hexdigest()[:24]}_{kind}.{ext}"
+    path = os.path.join(UPLOAD_FOLDER, filename)
+    if not os.path.exists(path):
+        tmp_path = f'{path}.{secrets.token_hex(4)}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(data)
+        os.replace(tmp_path, path)
+    return filename
+
+def _remove_unreferenced_pictures(*filenames):
+    """Delete old picture files no user points at any more (variants can be shared)"""
+    for filename in filenames:
+        if not filename:
+            continue
+        url = f"/uploads/profilepics/{filename}"
+        in_use = User.query.filter(db.or_(User.profilepic == url, User.profilepic_print == filename)).first()
+        path = os.path.join(UPLOAD_FOLDER, filename)
+        if in_use is None and os.path.exists(path):
+            os.remove(path)
+
+def process_profile_picture(user_id, incoming_path):
+    """Background job: validate an uploaded image and build its avatar and print variants"""
+    with app.app_context():
+        user = User.query.get(user_id)
+        try:
+            max_pixels = app.config['PROFILEPIC_MAX_PIXELS']
+            with Image.open(incoming_path) as probe:
+                if probe.width * probe.height > max_pixels:
+                    raise ValueError(f'image too large ({probe.width}x{probe.height})')
+                probe.verify()  # Structural check without decoding pixel data
+            with Image.open(incoming_path) as image:
+                image = ImageOps.exif_transpose(image)
+                has_alpha = image.mode in ('RGBA', 'LA', 'PA') or 'transparency' in image.info
+                image = image.convert('RGBA' if has_alpha else 'RGB')
+                avatar = _write_variant(image, app.config['PROFILEPIC_AVATAR_SIZE'], 'avatar')
+                logo = _write_variant(image, app.config['PROFILEPIC_PRINT_SIZE'], 'print')
+        except Exception as e:
+            app.logger.warning('Profile picture for user %s rejected: %s', user_id, e)
+            if user:
+                user.profilepic_status = 'failed'
+                db.session.commit()
+                invalidate_user_cache(user_id)
+            _remove_incoming(incoming_path)
+            return
+
+        if user is None:
+            _remove_incoming(incoming_path)
+            return
+        old_files = (os.path.basename(user.profilepic) if user.profilepic else None, user.profilepic_print)
+        user.profilepic = f"/uploads/profilepics/{avatar}"
+        user.profilepic_print = logo
+        user.profilepic_status = 'ready'
+        db.session.commit()
+        invalidate_user_cache(user_id)
+        _remove_incoming(incoming_path)
+        _remove_unreferenced_pictures(*old_files)
+
+def _remove_incoming(path):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def recover_profile_picture(user_id):
+    """Requeue a picture whose job was lost with its worker (recycled, killed or restarted)
+
+    An upload still in incoming/ after PROFILEPIC_STALE_MINUTES has nobody
+    working on it; renaming it first makes sure only one worker requeues it.
+    With no upload left there is nothing to redo, so the status is reset.
+    """
+    prefix = f'user_{int(user_id)}_'
+    uploads = []
+    if os.path.isdir(PROFILEPIC_INCOMING):
+        for name in os.listdir(PROFILEPIC_INCOMING):
+            path = os.path.join(PROFILEPIC_INCOMING, name)
+            try:
+                if name.startswith(prefix):
+                    uploads.append((os.path.getmtime(path), path))
+            except FileNotFoundError:
+                pass  # Finished meanwhile
+    if not uploads:
+        User.query.filter_by(id=user_id, profilepic_status='processing').update({'profilepic_status': 'failed'})
+        db.session.commit()
+        invalidate_user_cache(user_id)
+        return
+
+    cutoff = time.time() - app.config['PROFILEPIC_STALE_MINUTES'] * 60
+    uploads.sort()
+    modified, newest = uploads[-1]
+    if modified > cutoff:
+        return
+    # Earlier uploads were replaced by the newest one; drop those that are stale too
+    for modified, path in uploads[:-1]:
+        if modified <= cutoff:
+            _remove_incoming(path)
+    claimed = os.path.join(PROFILEPIC_INCOMING, f'{prefix}{secrets.token_hex(8)}.{newest.rsplit(".", 1)[1]}')
+    try:
+        os.rename(newest, claimed)
+    except FileNotFoundError:
+        return  # Claimed by another worker
+    os.utime(claimed)
+    app.logger.warning('Requeuing profile picture for user %s after a lost job', user_id)
+    _submit_image_job(process_profile_picture, user_id, claimed)
+
 @app.route('/api/profile/picture', methods=['POST'])
 @login_required
 def upload_profile_picture():
@@ -442,33 +2084,32 @@ def upload_profile_picture():
         return jsonify({'error': 'No file selected'}), 400
 
     if file and allowed_file(file.filename):
-        # Create unique filename with user id
+        # Stream the upload to disk; decoding and resizing happen in the background
+        os.makedirs(PROFILEPIC_INCOMING, exist_ok=True)
         ext = file.filename.rsplit('.', 1)[1].lower()
-        filename = f"user_{current_user.id}_{secrets.token_hex(8)}.{ext}"
-        filepath = os.path.join(app.config['UPLOAD_FOLDER'], filename)
+        incoming_path = os.path.join(PROFILEPIC_INCOMING, f"user_{current_user.id}_{secrets.token_hex(8)}.{ext}")
+        file.save(incoming_path)
 
-        # Delete old profile pic if exists
-        if current_user.profilepic:
-            old_path = os.path.join(app.config['UPLOAD_FOLDER'], os.path.basename(current_user.profilepic))
-            if os.path.exists(old_path):
-                os.remove(old_path)
-
-        # Save new file
-        file.save(filepath)
-
-        # Update user record with relative path
-        current_user.profilepic = f"/uploads/profilepics/{filename}"
+        current_user.profilepic_status = 'processing'
         db.session.commit()
+        invalidate_user_cache(current_user.id)
+        _submit_image_job(process_profile_picture, current_user.id, incoming_path)
 
         return jsonify({
             'success': True,
+            'status': 'processing',
             'profilepic': current_user.profilepic
-        })
+        }), 202
 
     return jsonify({'error': 'Invalid file type. Allowed: png, jpg, jpeg, gif'}), 400
 
 @app.route('/uploads/profilepics/<filename>')
 def serve_profile_pic(filename):
+    if VARIANT_FILENAME.match(filename):
+        # Content-addressed: a new picture always gets a new name
+        response = send_from_directory(app.config['UPLOAD_FOLDER'], filename, max_age=31536000)
+        response.headers['Cache-Control'] = 'public, max-age=31536000, immutable'
+        return response
     return send_from_directory(app.config['UPLOAD_FOLDER'], filename)
 
 @app.route('/api/profile/password', methods=['PUT'])
@@ -486,6 +2127,7 @@ def change_password_api():
 
     current_user.password_hash = generate_password_hash(new_password)
     db.session.commit()
+    invalidate_user_cache(current_user.id)
     return jsonify({'success': True})
 
 # Admin API
@@ -495,7 +2137,8 @@ def change_password_api():
 @admin_required
 def get_all_users():
     users = User.query.order_by(User.created_at.desc()).all()
-    return jsonify([u.to_admin_dict() for u in users])
+    quote_counts = quote_counts_by_user()
+    return jsonify([u.to_admin_dict(quote_counts.get(u.id, 0)) for u in users])
 
 @app.route('/api/admin/users', methods=['POST'])
 @login_required
@@ -546,6 +2189,7 @@ def update_user_role(user_id):
     if data.get('role') in ['user', 'admin']:
         user.role = data['role']
         db.session.commit()
+        invalidate_user_cache(user_id)
 
     return jsonify(user.to_admin_dict())
 
@@ -559,6 +2203,7 @@ def toggle_user_status(user_id):
     user = User.query.get_or_404(user_id)
     user.is_active = not user.is_active
     db.session.commit()
+    invalidate_user_cache(user_id)
 
     return jsonify(user.to_admin_dict())
 
@@ -573,6 +2218,7 @@ def reset_user_password(user_id):
     user.password_hash = generate_password_hash(temp_password)
     user.must_change_password = True
     db.session.commit()
+    invalidate_user_cache(user_id)
 
     return jsonify({
         'success': True,
@@ -589,41 +2235,182 @@ def delete_user(user_id):
 
     user = User.query.get_or_404(user_id)
 
-    # Delete all quotes belonging to this user
-    Quote.query.filter_by(user_id=user_id).delete()
+    # Delete all quotes and companies belonging to this user (with sharding, the whole shard after commit)
+    if not app.config['TENANT_SHARDING']:
+        # Bulk deletes skip the ORM cascades, so remove the quotes' children first
+        quote_ids = db.select(Quote.id).where(Quote.user_id == user_id)
+        LineItem.query.filter(LineItem.quote_id.in_(quote_ids)).delete(synchronize_session=False)
+        EquipmentItem.query.filter(EquipmentItem.quote_id.in_(quote_ids)).delete(synchronize_session=False)
+        QuoteRevision.query.filter_by(user_id=user_id).delete()
+        Quote.query.filter_by(user_id=user_id).delete()
+        ClientCompany.query.filter_by(user_id=user_id).delete()
 
     # Delete the user
     db.session.delete(user)
     db.session.commit()
+    invalidate_user_cache(user_id)
+    shutil.rmtree(_pdf_cache_dir(user_id), ignore_errors=True)
+    if app.config['TENANT_SHARDING']:
+        drop_tenant_shard(user_id)
 
     return jsonify({'success': True})
 
-# Quote API endpoints (with user isolation)
+@app.route('/api/admin/user-cache', methods=['GET'])
+@login_required
+@admin_required
+def get_user_cache_stats():
+    """Hit rate and size of the user loader cache in this worker"""
+    return jsonify(user_cache_stats())
 
-@app.route('/api/quotes', methods=['GET'])
+@app.route('/api/admin/maintenance', methods=['GET'])
 @login_required
-def get_quotes():
-    # Start with base query
-    query = Quote.query.filter_by(user_id=current_user.id)
+@admin_required
+def get_maintenance_report():
+    """Current size and free pages of each database, with maintenance.py's last results"""
+    report = {}
+    if os.path.exists(app.config['MAINTENANCE_REPORT_PATH']):
+        with open(app.config['MAINTENANCE_REPORT_PATH']) as f:
+            report = json.load(f)
+    last_results = report.get('databases', {})
+
+    with db.engine.connect() as conn:
+        live = {'central': sqlite_file_stats(conn.connection.driver_connection)}
+    live.update({f'user_{user_id}': stats for user_id, stats in map_tenants(
+        lambda conn: sqlite_file_stats(conn.connection.driver_connection)).items()})
+    return jsonify({
+        'last_run': report.get('last_run'),
+        'databases': [dict(last_results.get(name, {}), name=name, **stats) for name, stats in live.items()]
+    })
 
-    # Check if we want trashed items or active items
-    show_trash = request.args.get('trash', 'false').lower() == 'true'
-    if show_trash:
-        query = query.filter(Quote.deleted_at.isnot(None))
+@app.route('/metrics')
+def metrics():
+    """Prometheus metrics of all workers (admin session or METRICS_TOKEN bearer)"""
+    token = app.config.get('METRICS_TOKEN')
+    has_token = bool(token) and secrets.compare_digest(
+        request.headers.get('Authorization', ''), f'Bearer {token}')
+    if not has_token and not (current_user.is_authenticated and current_user.role == 'admin'):
+        return jsonify({'error': 'Admin access required'}), 403
+    return Response(render_metrics(), mimetype='text/plain; version=0.0.4')
+
+@app.route('/api/admin/sql-profile', methods=['GET'])
+@login_required
+@admin_required
+def get_sql_profile():
+    """Profiler settings, with the recent per-request SQL profiles and slow queries of this worker"""
+    with _sql_profile_lock:
+        return jsonify({
+            'pid': os.getpid(),
+            'enabled': app.config['SQL_PROFILE'],
+            'slow_query_ms': app.config['SQL_SLOW_QUERY_MS'],
+            'requests': list(_sql_profile_reports),
+            'slow_queries': list(_slow_queries)
+        })
+
+@app.route('/api/admin/sql-profile', methods=['PUT'])
+@login_required
+@admin_required
+def update_sql_profile():
+    """Turn SQL profiling on or off and adjust the slow-query threshold, in every worker"""
+    data = request.json
+    try:
+        slow_query_ms = float(data.get('slow_query_ms', app.config['SQL_SLOW_QUERY_MS']))
+    except (TypeError, ValueError):
+        return jsonify({'error': 'slow_query_ms must be a number'}), 400
+    settings = read_sql_profile_settings() or {'cleared': 0}
+    settings.update(
+        enabled=bool(data.get('enabled', app.config['SQL_PROFILE'])),
+        slow_query_ms=slow_query_ms,
+        cleared=settings['cleared'] + 1 if data.get('clear') else settings['cleared']
+    )
+    write_json_file(SQL_PROFILE_SETTINGS_FILE, settings)
+    _apply_sql_profile_settings()
+    return get_sql_profile()
+
+@app.route('/api/admin/profiling', methods=['GET'])
+@login_required
+@admin_required
+def get_profiling():
+    """Active capture rules and stored captures, from all workers"""
+    return jsonify({
+        'rules': active_capture_rules(),
+        'captures': [{k: v for k, v in c.items() if k != 'rule_id'} for c in stored_captures()],
+        'endpoints': sorted(e for e in app.view_functions if e != 'static')
+    })
+
+@app.route('/api/admin/profiling/rules', methods=['POST'])
+@login_required
+@admin_required
+def create_profiling_rule():
+    """Capture the next N requests from a user and/or to a route"""
+    data = request.json
+    user_id = data.get('user_id') or None
+    endpoint = data.get('endpoint') or None
+    mode = data.get('mode', 'cprofile')
+
+    if user_id is None and endpoint is None:
+        return jsonify({'error': 'Choose a user or a route to capture'}), 400
+    if endpoint is not None and endpoint not in app.view_functions:
+        return jsonify({'error': f'Unknown route: {endpoint}'}), 400
+    if mode not in ['cprofile', 'sampling']:
+        return jsonify({'error': 'Mode must be cprofile or sampling'}), 400
+
+    with profiling_state() as state:
+        rule = {
+            'id': state['next_rule'],
+            'user_id': int(user_id) if user_id is not None else None,
+            'endpoint': endpoint,
+            'mode': mode,
+            'remaining': max(1, min(int(data.get('count', 5)), 100))
+        }
+        state['next_rule'] += 1
+        state['rules'].append(rule)
+    return jsonify(rule), 201
+
+@app.route('/api/admin/profiling/rules/<int:rule_id>', methods=['DELETE'])
+@login_required
+@admin_required
+def delete_profiling_rule(rule_id):
+    with profiling_state() as state:
+        state['rules'] = [r for r in state['rules'] if r['id'] != rule_id]
+    return jsonify({'success': True})
+
+@app.route('/api/admin/profiling/captures/<int:capture_id>')
+@login_required
+@admin_required
+def download_profile_capture(capture_id):
+    """Download a capture: ?format=tree (pstats text), prof (cProfile dump) or folded"""
+    capture = read_capture(capture_id, with_data=True)
+    if capture is None:
+        return jsonify({'error': 'Capture not found'}), 404
+
+    fmt = request.args.get('format', 'tree')
+    if capture['mode'] == 'sampling':
+        filename, mimetype = f'capture_{capture_id}.folded', 'text/plain'
+    elif fmt == 'prof':
+        filename, mimetype = f'capture_{capture_id}.prof', 'application/octet-stream'
     else:
-        query = query.filter(Quote.deleted_at.is_(None))
+        filename, mimetype = f'capture_{capture_id}.txt', 'text/plain'
+
+    return Response(
+        capture_report(capture, fmt),
+        mimetype=mimetype,
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
+# Quote API endpoints (with user isolation)
 
-    # Apply filters from query parameters
+def apply_quote_filters(query, skip=()):
+    """Apply the history filters from the query string, except those named in skip"""
     company = request.args.get('company')
-    if company:
+    if company and 'company' not in skip:
         query = query.filter(Quote.client_company == company)
 
     doc_type = request.args.get('doc_type')
-    if doc_type and doc_type in ['QUOTE', 'INVOICE']:
+    if doc_type and doc_type in ['QUOTE', 'INVOICE'] and 'doc_type' not in skip:
         query = query.filter(Quote.doc_type == doc_type)
 
     date_from = request.args.get('date_from')
-    if date_from:
+    if date_from and 'date' not in skip:
         try:
             from_date = datetime.strptime(date_from, '%Y-%m-%d').date()
             query = query.filter(Quote.date >= from_date)
@@ -631,13 +2418,30 @@ def get_quotes():
             pass
 
     date_to = request.args.get('date_to')
-    if date_to:
+    if date_to and 'date' not in skip:
         try:
             to_date = datetime.strptime(date_to, '%Y-%m-%d').date()
             query = query.filter(Quote.date <= to_date)
         except ValueError:
             pass
 
+    return query
+
+@app.route('/api/quotes', methods=['GET'])
+@login_required
+def get_quotes():
+    # Start with base query
+    query = Quote.query.filter_by(user_id=current_user.id)
+
+    # Check if we want trashed items or active items
+    show_trash = request.args.get('trash', 'false').lower() == 'true'
+    if show_trash:
+        query = query.filter(Quote.deleted_at.isnot(None))
+    else:
+        query = query.filter(Quote.deleted_at.is_(None))
+
+    query = apply_quote_filters(query)
+
     # Apply sorting
     sort = request.args.get('sort', 'date_desc')
     if sort == 'date_asc':
@@ -663,21 +2467,79 @@ def get_quotes():
         'created_at': q.created_at.isoformat() if q.created_at else None
     } for q in quotes])
 
+@app.route('/api/quotes/counts')
+@login_required
+def get_quote_counts():
+    """Active/trash totals and per doc_type, company and month facets, without loading the quotes
+
+    Each facet applies the other filters from the query string (same parameters
+    as /api/quotes) but not its own, so it shows what selecting a value would give.
+    """
+    trashed = Quote.deleted_at.isnot(None)
+    totals = dict(db.session.query(trashed, db.func.count(Quote.id)).filter(
+        Quote.user_id == current_user.id
+    ).group_by(trashed).all())
+
+    def facet(key, skip):
+        query = db.session.query(key, db.func.count(Quote.id), db.func.coalesce(db.func.sum(Quote.total), 0)).filter(
+            Quote.user_id == current_user.id,
+            Quote.deleted_at.is_(None)
+        )
+        rows = apply_quote_filters(query, skip).group_by(key).order_by(key).all()
+        return [{'value': value, 'count': count, 'total': round(total, 2)} for value, count, total in rows]
+
+    return jsonify({
+        'active': totals.get(False, 0),
+        'trash': totals.get(True, 0),
+        'doc_types': facet(Quote.doc_type, ('doc_type',)),
+        'companies': facet(Quote.client_company, ('company',)),
+        'months': facet(db.func.strftime('%Y-%m', Quote.date), ('date',)),
+    })
+
 # Client Companies API
 @app.route('/api/companies')
 @login_required
 def get_companies():
     """Get all saved companies for current user with contact details"""
     companies = ClientCompany.query.filter_by(user_id=current_user.id).order_by(ClientCompany.name).all()
-    return jsonify([{
-        'id': c.id,
-        'name': c.name,
-        'address': c.address or '',
-        'poc': c.poc or '',
-        'poc_phone': c.poc_phone or '',
-        'poc_email': c.poc_email or '',
-        'venue': c.venue or ''
-    } for c in companies])
+    return jsonify([c.to_dict() for c in companies])
+
+@app.route('/api/companies/autocomplete')
+@login_required
+def autocomplete_companies():
+    """Companies whose name starts with ?q= (case-insensitive), most recently used first"""
+    # Match SQLite's lower(), which only folds ASCII letters
+    prefix = ''.join(ch.lower() if ch.isascii() else ch for ch in request.args.get('q', '').strip())
+    limit = min(max(request.args.get('limit', 10, type=int), 1), 50)
+
+    query = db.session.query(ClientCompany.id, ClientCompany.name).filter(
+        ClientCompany.user_id == current_user.id
+    )
+    if prefix:
+        # Range scan on the (user_id, lower(name)) index instead of LIKE
+        lowered = db.func.lower(ClientCompany.name)
+        last = ord(prefix[-1])
+        if last < 0x10FFFF:
+            # Skip over the surrogates, which can't appear in stored UTF-8 text
+            upper_bound = prefix[:-1] + chr(0xE000 if 0xD7FF <= last < 0xE000 else last + 1)
+            query = query.filter(lowered >= prefix, lowered < upper_bound)
+        else:
+            # Nothing sorts after U+10FFFF, so compare the leading characters instead
+            query = query.filter(lowered >= prefix, db.func.substr(lowered, 1, len(prefix)) == prefix)
+
+    companies = query.order_by(
+        ClientCompany.last_used_at.is_(None),
+        ClientCompany.last_used_at.desc(),
+        ClientCompany.name
+    ).limit(limit).all()
+    return jsonify([{'id': c.id, 'name': c.name} for c in companies])
+
+@app.route('/api/companies/<int:company_id>')
+@login_required
+def get_company(company_id):
+    """Full contact details for one saved company"""
+    company = ClientCompany.query.filter_by(id=company_id, user_id=current_user.id).first_or_404()
+    return jsonify(company.to_dict())
 
 @app.route('/api/companies', methods=['POST'])
 @login_required
@@ -701,6 +2563,8 @@ def add_company():
         address=address
     )
     db.session.add(company)
+    # Pick up quotes already saved under this name
+    recompute_company_aggregates(company)
     db.session.commit()
 
     return jsonify({
@@ -713,11 +2577,15 @@ def add_company():
 @login_required
 def get_next_sequence(company_name):
     """Get the next invoice sequence number for a company"""
-    # Count existing quotes for this company
-    count = Quote.query.filter_by(
-        user_id=current_user.id,
-        client_company=company_name
-    ).count()
+    company = ClientCompany.query.filter_by(user_id=current_user.id, name=company_name).first()
+    if company:
+        count = (company.quote_count or 0) + (company.invoice_count or 0)
+    else:
+        # Free-text company that was never saved: count its quotes directly
+        count = Quote.query.filter_by(
+            user_id=current_user.id,
+            client_company=company_name
+        ).count()
     return jsonify({'next_sequence': count + 1})
 
 @app.route('/api/quotes', methods=['POST'])
@@ -775,10 +2643,9 @@ def create_quote():
         subtotal=data.get('subtotal', 0),
         total=data.get('total', 0),
         equipments_enabled=data.get('equipments_enabled', False),
-        hide_labor=data.get('hide_labor', False),
-        equipment_headers=json.dumps(data.get('equipment_headers')) if data.get('equipment_headers') else None,
-        equipment_items=json.dumps(data.get('equipment_items')) if data.get('equipment_items') else None
+        hide_labor=data.get('hide_labor', False)
     )
+    quote.set_equipment(data.get('equipment_headers'), data.get('equipment_items'))
 
     for item_data in data.get('line_items', []):
         line_item = LineItem(
@@ -798,21 +2665,11 @@ def create_quote():
         quote.line_items.append(line_item)
 
     db.session.add(quote)
-    db.session.commit()
 
-    # Update company contact details if company exists
-    if quote.client_company:
-        company = ClientCompany.query.filter_by(
-            user_id=current_user.id,
-            name=quote.client_company
-        ).first()
-        if company:
-            company.address = quote.client_address or company.address
-            company.poc = quote.poc or company.poc
-            company.poc_phone = quote.poc_phone or company.poc_phone
-            company.poc_email = quote.poc_email or company.poc_email
-            company.venue = quote.venue or company.venue
-            db.session.commit()
+    # Update company contact details and aggregates in the same transaction
+    sync_company_details(quote)
+    update_company_aggregates(current_user.id, [(None, company_aggregate_state(quote))])
+    db.session.commit()
 
     return jsonify(quote.to_dict()), 201
 
@@ -846,6 +2703,8 @@ def update_quote(quote_id):
                 'error': f'{doc_type} #{invoice_number} already exists for {client_company}'
             }), 400
 
+    previous_aggregates = company_aggregate_state(quote)
+    previous_state, previous_time = _revision_state(quote), quote.updated_at
     quote.doc_type = data.get('doc_type', quote.doc_type)
     if data.get('date'):
         quote.date = datetime.strptime(data['date'], '%Y-%m-%d').date()
@@ -883,10 +2742,10 @@ def update_quote(quote_id):
     # Update equipment data
     quote.equipments_enabled = data.get('equipments_enabled', quote.equipments_enabled)
     quote.hide_labor = data.get('hide_labor', quote.hide_labor)
-    if 'equipment_headers' in data:
-        quote.equipment_headers = json.dumps(data['equipment_headers']) if data['equipment_headers'] else None
-    if 'equipment_items' in data:
-        quote.equipment_items = json.dumps(data['equipment_items']) if data['equipment_items'] else None
+    if 'equipment_headers' in data or 'equipment_items' in data:
+        quote.set_equipment(data.get('equipment_headers', quote.equipment_headers),
+                            data['equipment_items'] if 'equipment_items' in data else
+                            [item.to_dict() for item in quote.equipment_items])
 
     # Update line items
     if 'line_items' in data:
@@ -909,40 +2768,431 @@ def update_quote(quote_id):
             )
             db.session.add(line_item)
 
-    db.session.commit()
+    record_revision(quote, previous_state, previous_time)
 
-    # Update company contact details if company exists
-    if quote.client_company:
-        company = ClientCompany.query.filter_by(
-            user_id=current_user.id,
-            name=quote.client_company
-        ).first()
-        if company:
-            company.address = quote.client_address or company.address
-            company.poc = quote.poc or company.poc
-            company.poc_phone = quote.poc_phone or company.poc_phone
-            company.poc_email = quote.poc_email or company.poc_email
-            company.venue = quote.venue or company.venue
-            db.session.commit()
+    # Update company contact details and aggregates (old and new company) in the same transaction
+    sync_company_details(quote)
+    update_company_aggregates(current_user.id, [(previous_aggregates, company_aggregate_state(quote))])
+    db.session.commit()
 
     return jsonify(quote.to_dict())
 
+# Quote cloning
+
+MONTH_ABBREV = ['JAN', 'FEB', 'MAR', 'APR', 'MAY', 'JUN', 'JUL', 'AUG', 'SEP', 'OCT', 'NOV', 'DEC']
+MAX_CLONE_RANGES = 52
+MAX_CLONE_DAYS = 366
+
+def generate_invoice_number(company_name, doc_date, sequence):
+    """Same format as generateInvoiceNumber in app.js: ###-XXXX-MMM-DD"""
+    company = re.sub(r'[^a-zA-Z]', '', company_name or '')[:4].upper().ljust(4, 'X')
+    return f"{sequence:03d}-{company}-{MONTH_ABBREV[doc_date.month - 1]}-{doc_date.day:02d}"
+
+def _time_to_minutes(value):
+    if not value:
+        return 0
+    hours, _, minutes = value.partition(':')
+    return int(hours) * 60 + int(minutes or 0)
+
+def calculate_line_item(quote, time_in, time_out):
+    """Server-side port of calculateLineItem in app.js for one day"""
+    total_minutes = _time_to_minutes(time_out) - _time_to_minutes(time_in)
+    if total_minutes < 0:
+        total_minutes += 24 * 60  # Overnight shift
+    total_hours = total_minutes / 60
+    regular_call_hours = quote.regular_call_hours or 8
+    regular_hours = min(total_hours, regular_call_hours)
+    overtime_hours = max(0, total_hours - regular_call_hours)
+
+    rate = quote.hourly_rate or 200
+    overtime_rate = rate * (1 + (quote.overtime_percentage or 10) / 100)
+    daily_rate = quote.daily_rate or 1600
+    ot_hourly_rate = quote.ot_hourly_rate or 220
+
+    if quote.billing_type == 'daily':
+        line_total = daily_rate + overtime_hours * ot_hourly_rate
+    else:
+        line_total = regular_hours * rate + overtime_hours * overtime_rate
+        if total_hours > 16:
+            line_total += regular_call_hours * rate  # Additional day charge
+
+    return {
+        'total_hours': total_hours,
+        'regular_hours': regular_hours,
+        'overtime_hours': overtime_hours,
+        'rate': rate,
+        'overtime_rate': overtime_rate,
+        'line_total': line_total,
+        'daily_rate': daily_rate,
+        'ot_hourly_rate': ot_hourly_rate
+    }
+
+def _equipment_total(quote):
+    return quote.equipment_total if quote.equipments_enabled else 0
+
+def recalculate_quote_totals(quote, equipment_total):
+    """Set subtotal and total from the quote's line items, per diem and equipment"""
+    per_diem = (quote.per_diem_rate or 0) if quote.outside_dubai else 0
+    labor_total = sum((item.line_total or 0) + per_diem for item in quote.line_items)
+    quote.subtotal = (0 if quote.hide_labor else labor_total) + equipment_total
+    quote.total = quote.subtotal * (1 + (quote.tax_rate or 0) / 100)
+
+@app.route('/api/quotes/<int:quote_id>/clone', methods=['POST'])
+@login_required
+def clone_quote(quote_id):
+    """Clone a quote into one new quote per date range, in a single transaction.
+
+    Body: {"ranges": [{"date_from": "2025-01-03", "date_to": "2025-01-05", "date": optional}],
+           "doc_type": optional}
+    Each day of a range reuses the time in/out (and job description) of the
+    source day at the same offset, wrapping around when the range is longer.
+    """
+    source = Quote.query.filter_by(id=quote_id, user_id=current_user.id).first_or_404()
+    data = request.json or {}
+    ranges = data.get('ranges') or []
+    doc_type = data.get('doc_type', source.doc_type)
+
+    if not ranges:
+        return jsonify({'error': 'At least one date range is required'}), 400
+    if len(ranges) > MAX_CLONE_RANGES:
+        return jsonify({'error': f'At most {MAX_CLONE_RANGES} date ranges per request'}), 400
+    if doc_type not in ['QUOTE', 'INVOICE']:
+        return jsonify({'error': 'doc_type must be QUOTE or INVOICE'}), 400
+
+    parsed = []
+    for i, r in enumerate(ranges):
+        try:
+            date_from = datetime.strptime(r['date_from'], '%Y-%m-%d').date()
+            date_to = datetime.strptime(r['date_to'], '%Y-%m-%d').date()
+            doc_date = datetime.strptime(r['date'], '%Y-%m-%d').date() if r.get('date') else date_from
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': f'Range {i + 1}: date_from and date_to must be YYYY-MM-DD'}), 400
+        if date_to < date_from or (date_to - date_from).days >= MAX_CLONE_DAYS:
+            return jsonify({'error': f'Range {i + 1}: invalid date range'}), 400
+        parsed.append((date_from, date_to, doc_date))
+
+    pattern = sorted(source.line_items, key=lambda item: (item.date or date.min, item.id))
+    if not pattern:
+        return jsonify({'error': 'Source quote has no line items to repeat'}), 400
+
+    # Allocate sequence numbers the same way the editor does, skipping any taken
+    company = ClientCompany.query.filter_by(user_id=current_user.id, name=source.client_company).first()
+    if company:
+        sequence = (company.quote_count or 0) + (company.invoice_count or 0)
+    else:
+        sequence = Quote.query.filter_by(user_id=current_user.id, client_company=source.client_company).count()
+    taken = {number for (number,) in db.session.query(Quote.invoice_number).filter_by(
+        user_id=current_user.id, client_company=source.client_company, doc_type=doc_type)}
+
+    skip = {'id', 'invoice_number', 'doc_type', 'date', 'date_from', 'date_to',
+            'subtotal', 'total', 'equipment_total', 'created_at', 'updated_at', 'deleted_at'}
+    copied = {c.key: getattr(source, c.key) for c in sa_inspect(Quote).column_attrs if c.key not in skip}
+    equipment_total = _equipment_total(source)
+
+    clones = []
+    for date_from, date_to, doc_date in parsed:
+        sequence += 1
+        invoice_number = generate_invoice_number(source.client_company, doc_date, sequence)
+        while invoice_number in taken:
+            sequence += 1
+            invoice_number = generate_invoice_number(source.client_company, doc_date, sequence)
+        taken.add(invoice_number)
+
+        clone = Quote(**copied, doc_type=doc_type, date=doc_date, invoice_number=invoice_number,
+                      date_from=date_from, date_to=date_to)
+        clone.set_equipment(source.equipment_headers, [item.to_dict() for item in source.equipment_items])
+        for offset in range((date_to - date_from).days + 1):
+            template = pattern[offset % len(pattern)]
+            calc = calculate_line_item(clone, template.time_in, template.time_out)
+            clone.line_items.append(LineItem(
+                date=date_from + timedelta(days=offset),
+                time_in=template.time_in,
+                time_out=template.time_out,
+                job_description=template.job_description,
+                **calc
+            ))
+
+        recalculate_quote_totals(clone, equipment_total)
+        clones.append((clone, len(clone.line_items)))
+
+    db.session.add_all(clone for clone, _ in clones)
+    update_company_aggregates(current_user.id, [(None, company_aggregate_state(clone)) for clone, _ in clones])
+    db.session.commit()
+
+    return jsonify([{
+        'id': q.id,
+        'doc_type': q.doc_type,
+        'date': q.date.isoformat(),
+        'invoice_number': q.invoice_number,
+        'date_from': q.date_from.isoformat(),
+        'date_to': q.date_to.isoformat(),
+        'line_item_count': line_item_count,
+        'total': q.total
+    } for q, line_item_count in clones]), 201
+
+# Timesheet import
+# Clock-in/clock-out exports are read row by row straight from the upload and
+# folded into one span (first clock-in to last clock-out) per day, so only
+# the per-day totals are held in memory.
+
+MAX_TIMESHEET_REJECTIONS = 100  # Rejected rows listed in the response
+TIMESHEET_COLUMNS = {
+    'date': ('date', 'day', 'work_date'),
+    'time_in': ('time_in', 'in', 'clock_in', 'start', 'start_time'),
+    'time_out': ('time_out', 'out', 'clock_out', 'end', 'end_time'),
+    'timestamp': ('timestamp', 'punch', 'datetime', 'time'),
+    'type': ('type', 'direction', 'punch_type', 'event'),
+    'job_description': ('job_description', 'job', 'role'),
+}
+TIMESHEET_DATE_FORMATS = ('%Y-%m-%d', '%d/%m/%Y', '%d-%m-%Y', '%d.%m.%Y')
+TIMESHEET_TIME_FORMATS = ('%H:%M', '%H:%M:%S', '%I:%M %p', '%I:%M:%S %p', '%I:%M%p')
+
+class TimesheetRowError(ValueError):
+    pass
+
+def _parse_timesheet_date(value):
+    for fmt in TIMESHEET_DATE_FORMATS:
+        try:
+            return datetime.strptime(value, fmt).date()
+        except ValueError:
+            pass
+    raise TimesheetRowError(f'Unrecognised date "{value}"')
+
+def _parse_punch(value, day):
+    """A punch as a datetime, and whether the value carried its own date"""
+    value = (value or '').strip()
+    if not value:
+        raise TimesheetRowError('Missing time')
+    dated = re.fullmatch(r'(\d{1,4}[-/.]\d{1,2}[-/.]\d{1,4})[T\s]+(.+)', value)
+    if dated:
+        day, time_part = _parse_timesheet_date(dated.group(1)), dated.group(2)
+    elif day is None:
+        raise TimesheetRowError(f'No date for "{value}"')
+    else:
+        time_part = value
+    for fmt in TIMESHEET_TIME_FORMATS:
+        try:
+            return datetime.combine(day, datetime.strptime(time_part.upper(), fmt).time()), bool(dated)
+        except ValueError:
+            pass
+    raise TimesheetRowError(f'Unrecognised time "{value}"')
+
+def _timesheet_columns(fieldnames):
+    """Map our column names to the file's headers (case and spacing don't matter)"""
+    normalized = {re.sub(r'[\s-]+', '_', (name or '').strip().lower()): name for name in fieldnames or []}
+    columns = {}
+    for column, aliases in TIMESHEET_COLUMNS.items():
+        found = next((normalized[alias] for alias in aliases if alias in normalized), None)
+        if found is not None:
+            columns[column] = found
+    return columns
+
+def read_timesheet(lines):
+    """Fold a CSV of shifts or punches into {day: [start, end, job]}
+
+    Returns (days, rows read, rows rejected, details of the first MAX_TIMESHEET_REJECTIONS rejections).
+
+    Two layouts are accepted:
+      - shifts: date, time_in, time_out (a time_out earlier than time_in is an overnight shift)
+      - punches: timestamp (or date + time) and optionally type in/out, in time order
+    A shift belongs to the day it started on.
+    """
+    reader = csv.DictReader(lines)
+    columns = _timesheet_columns(reader.fieldnames)
+    if not ('time_in' in columns and 'time_out' in columns) and 'timestamp' not in columns:
+        raise ValueError('CSV needs date, time_in and time_out columns, or timestamp (and type) columns')
+
+    days, rejected, counts = {}, [], {'rows': 0, 'rejected': 0}
+    open_punch = None  # (datetime, line) of a clock-in waiting for its clock-out
+
+    def add_shift(start, end, job):
+        if end <= start:
+            raise TimesheetRowError('Clock-out is not after clock-in')
+        span = days.get(start.date())
+        if span is None and len(days) >= MAX_CLONE_DAYS:
+            raise TimesheetRowError(f'More than {MAX_CLONE_DAYS} days')
+        if span is not None:
+            start, end, job = min(span[0], start), max(span[1], end), span[2] or job
+        if end - start >= timedelta(hours=24):
+            raise TimesheetRowError('Day spans 24 hours or more')
+        days[start.date()] = [start, end, job]
+
+    def reject(line, error):
+        counts['rejected'] += 1
+        if len(rejected) < MAX_TIMESHEET_REJECTIONS:
+            rejected.append({'line': line, 'error': str(error)})
+
+    for row in reader:
+        counts['rows'] += 1
+        line = reader.line_num
+
+        def field(column):
+            return (row.get(columns[column]) or '').strip() if column in columns else ''
+
+        try:
+            day = _parse_timesheet_date(field('date')) if field('date') else None
+            job = field('job_description') or None
+            if 'time_in' in columns and 'time_out' in columns:
+                start, _ = _parse_punch(field('time_in'), day)
+                end, end_dated = _parse_punch(field('time_out'), start.date())
+                if not end_dated and end < start:
+                    end += timedelta(days=1)  # Overnight shift
+                add_shift(start, end, job)
+                continue
+
+            punch, _ = _parse_punch(field('timestamp'), day)
+            kind = field('type').lower()
+            is_in = kind in ('in', 'i', 'clock_in', 'clock in', 'check in', 'start') if kind else open_punch is None
+            if is_in:
+                if open_punch is not None:
+                    reject(open_punch[1], 'Clock-in without a clock-out')
+                open_punch = (punch, line, job)
+            elif open_punch is None:
+                raise TimesheetRowError('Clock-out without a clock-in')
+            else:
+                start, _, start_job = open_punch
+                open_punch = None
+                if punch - start >= timedelta(hours=24):
+                    raise TimesheetRowError('Shift of 24 hours or more')
+                add_shift(start, punch, job or start_job)
+        except TimesheetRowError as e:
+            reject(line, e)
+    if open_punch is not None:
+        reject(open_punch[1], 'Clock-in without a clock-out')
+    return days, counts['rows'], counts['rejected'], rejected
+
+@app.route('/api/quotes/<int:quote_id>/timesheet', methods=['POST'])
+@login_required
+def import_timesheet(quote_id):
+    """Build the quote's days from a CSV of clock-in/clock-out times
+
+    Upload the CSV as the `file` form field (or as the request body). Days in
+    the file replace the times of existing days and missing days are added;
+    with mode=replace, days not in the file are removed. Everything is saved
+    in one transaction, and rejected rows are reported with their line number.
+    """
+    quote = Quote.query.filter_by(id=quote_id, user_id=current_user.id).first_or_404()
+    mode = request.values.get('mode', 'merge')
+    if mode not in ('merge', 'replace'):
+        return jsonify({'error': 'mode must be merge or replace'}), 400
+    upload = request.files.get('file')
+    stream = upload.stream if upload else request.stream
+
+    try:
+        days, rows, rejected_count, rejected = read_timesheet(io.TextIOWrapper(stream, encoding='utf-8-sig', newline=''))
+    except (ValueError, csv.Error) as e:
+        # UnicodeDecodeError is a ValueError too
+        return jsonify({'error': f'Could not read the timesheet: {e}'}), 400
+    if not days:
+        return jsonify({'error': 'No valid shifts found in the timesheet', 'rows': rows,
+                        'rejected_count': rejected_count, 'rejected': rejected}), 400
+
+    previous_aggregates = company_aggregate_state(quote)
+    previous_state, previous_time = _revision_state(quote), quote.updated_at
+    # One line item per day: days in the file keep their first item and lose any duplicates
+    existing = {}
+    created = updated = removed = 0
+    for item in list(quote.line_items):
+        if (item.date in days and item.date in existing) or (mode == 'replace' and item.date not in days):
+            quote.line_items.remove(item)
+            removed += 1
+        else:
+            existing.setdefault(item.date, item)
+
+    for day, (start, end, job) in sorted(days.items()):
+        time_in, time_out = start.strftime('%H:%M'), end.strftime('%H:%M')
+        calc = calculate_line_item(quote, time_in, time_out)
+        item = existing.get(day)
+        if item is None:
+            quote.line_items.append(LineItem(date=day, time_in=time_in, time_out=time_out,
+                                             job_description=job, **calc))
+            created += 1
+        else:
+            item.time_in, item.time_out = time_in, time_out
+            item.job_description = job or item.job_description
+            for key, value in calc.items():
+                setattr(item, key, value)
+            updated += 1
+
+    item_dates = [item.date for item in quote.line_items if item.date]
+    quote.date_from, quote.date_to = min(item_dates), max(item_dates)
+    recalculate_quote_totals(quote, _equipment_total(quote))
+    record_revision(quote, previous_state, previous_time)
+    update_company_aggregates(current_user.id, [(previous_aggregates, company_aggregate_state(quote))])
+    db.session.commit()
+
+    return jsonify({
+        'rows': rows,
+        'days': len(days),
+        'created': created,
+        'updated': updated,
+        'removed': removed,
+        'rejected_count': rejected_count,
+        'rejected': rejected,
+        'total': quote.total
+    })
+
 @app.route('/api/quotes/<int:quote_id>', methods=['DELETE'])
 @login_required
 def delete_quote(quote_id):
     quote = Quote.query.filter_by(id=quote_id, user_id=current_user.id).first_or_404()
     db.session.delete(quote)
+    update_company_aggregates(current_user.id, [(company_aggregate_state(quote), None)])
     db.session.commit()
+    drop_cached_pdfs(current_user.id, [quote_id])
     return jsonify({'message': 'Quote deleted successfully'})
 
 
+# Quote revision history
+
+@app.route('/api/quotes/<int:quote_id>/revisions', methods=['GET'])
+@login_required
+def get_quote_revisions(quote_id):
+    quote = Quote.query.filter_by(id=quote_id, user_id=current_user.id).first_or_404()
+    revisions = quote.revisions.order_by(QuoteRevision.revision.desc()).all()
+    return jsonify([r.to_dict() for r in revisions])
+
+@app.route('/api/quotes/<int:quote_id>/revisions/<int:revision>', methods=['GET'])
+@login_required
+def get_quote_revision(quote_id, revision):
+    """The full quote as it was at the given revision"""
+    quote = Quote.query.filter_by(id=quote_id, user_id=current_user.id).first_or_404()
+    state = reconstruct_revision(quote.id, revision)
+    if state is None:
+        return jsonify({'error': 'Revision not found'}), 404
+    return jsonify(dict(state, id=quote.id, revision=revision))
+
+@app.route('/api/admin/revisions/prune', methods=['POST'])
+@login_required
+@admin_required
+def prune_all_revisions():
+    """Apply the retention policy to every quote with revisions past the cutoff"""
+    if app.config['TENANT_SHARDING']:
+        results = []
+        for user_id in tenant_ids():
+            with use_tenant(user_id):
+                results.append(_prune_expired_revisions())
+    else:
+        results = [_prune_expired_revisions()]
+    return jsonify({'quotes': sum(r[0] for r in results), 'deleted': sum(r[1] for r in results)})
+
+def _prune_expired_revisions():
+    cutoff = datetime.utcnow() - timedelta(days=app.config['REVISION_RETENTION_DAYS'])
+    quote_ids = [quote_id for (quote_id,) in db.session.query(QuoteRevision.quote_id).filter(
+        QuoteRevision.created_at < cutoff).distinct()]
+    deleted = sum(prune_revisions(quote_id) for quote_id in quote_ids)
+    db.session.commit()
+    return len(quote_ids), deleted
+
 # Recycle Bin API Endpoints
 @app.route('/api/quotes/<int:quote_id>/trash', methods=['POST'])
 @login_required
 def trash_quote(quote_id):
     """Move a quote to the recycle bin (soft delete)"""
     quote = Quote.query.filter_by(id=quote_id, user_id=current_user.id).first_or_404()
+    previous_aggregates = company_aggregate_state(quote)
     quote.deleted_at = datetime.utcnow()
+    update_company_aggregates(current_user.id, [(previous_aggregates, company_aggregate_state(quote))])
     db.session.commit()
     return jsonify({'message': 'Quote moved to recycle bin', 'id': quote.id})
 
@@ -951,7 +3201,9 @@ def trash_quote(quote_id):
 def restore_quote(quote_id):
     """Restore a quote from the recycle bin"""
     quote = Quote.query.filter_by(id=quote_id, user_id=current_user.id).first_or_404()
+    previous_aggregates = company_aggregate_state(quote)
     quote.deleted_at = None
+    update_company_aggregates(current_user.id, [(previous_aggregates, company_aggregate_state(quote))])
     db.session.commit()
     return jsonify({'message': 'Quote restored successfully', 'id': quote.id})
 
@@ -971,7 +3223,11 @@ def update_invoice_number(quote_id):
     if not new_number.isdigit() or len(new_number) > 3:
         return jsonify({'error': 'Invoice number must be 1-3 digits'}), 400
     
+    previous_aggregates = company_aggregate_state(quote)
+    previous_state, previous_time = _revision_state(quote), quote.updated_at
     quote.invoice_number = new_number
+    record_revision(quote, previous_state, previous_time)
+    update_company_aggregates(current_user.id, [(previous_aggregates, company_aggregate_state(quote))])
     db.session.commit()
     return jsonify({'message': 'Invoice number updated', 'id': quote.id, 'invoice_number': new_number})
 
@@ -981,66 +3237,117 @@ def clear_trash():
     """Permanently delete all quotes in the recycle bin"""
     trashed_quotes = Quote.query.filter_by(user_id=current_user.id).filter(Quote.deleted_at.isnot(None)).all()
     count = len(trashed_quotes)
+    trashed_ids = [quote.id for quote in trashed_quotes]
     for quote in trashed_quotes:
         db.session.delete(quote)
+    update_company_aggregates(current_user.id, [(company_aggregate_state(q), None) for q in trashed_quotes])
     db.session.commit()
+    drop_cached_pdfs(current_user.id, trashed_ids)
     return jsonify({'message': f'{count} quote(s) permanently deleted', 'count': count})
 
-@app.route('/api/quotes/<int:quote_id>/pdf')
-@login_required
-def generate_pdf(quote_id):
-    """Generate PDF for a quote using WeasyPrint"""
-    quote = Quote.query.filter_by(id=quote_id, user_id=current_user.id).first_or_404()
+# Quote PDFs
+# Each rendered quote PDF is cached on disk under a hash of the HTML it came
+# from, so a quote is only sent through WeasyPrint again after it (or the
+# profile, template or background) changes. Only the latest render of each
+# quote is kept. Statements are assembled from the same cached files.
+
+MAX_STATEMENT_QUOTES = 200
+MAX_STATEMENT_RENDERS = 10  # Uncached quote PDFs rendered per statement request; the rest on retry
 
+def quote_pdf_html(quote, user, bg='none', is_dark_background=False):
+    """The invoice_pdf.html render for a quote"""
     # Get absolute path for profile picture (WeasyPrint needs file:// URLs)
     profile_pic_path = None
-    if current_user.profilepic:
-        # Convert relative URL to absolute file path
-        pic_filename = os.path.basename(current_user.profilepic)
+    if user.profilepic:
+        # Prefer the print-resolution variant; older uploads only have the original
+        pic_filename = user.profilepic_print or os.path.basename(user.profilepic)
         pic_path = os.path.join(app.config['UPLOAD_FOLDER'], pic_filename)
         if os.path.exists(pic_path):
             profile_pic_path = 'file://' + pic_path
 
     # Get background image path if specified
     background_path = None
-    bg = request.args.get('bg', 'none')
-    is_dark_background = request.args.get('isDark', 'false').lower() == 'true'
     if bg != 'none':
         bg_file = os.path.join(os.path.dirname(__file__), 'static', 'images', 'backgrounds', f'{bg}.jpg')
         if os.path.exists(bg_file):
             background_path = 'file://' + bg_file
 
-    # Parse equipment data
-    equipment_items = []
-    equipment_headers = {'header1': 'Work/Item Description', 'header2': 'Qty/Days', 'header3': 'Price'}
-    equipment_total = 0
-
-    if quote.equipments_enabled and quote.equipment_items:
-        try:
-            equipment_items = json.loads(quote.equipment_items)
-            equipment_total = sum(item.get('total', 0) for item in equipment_items)
-        except:
-            pass
-
-    if quote.equipment_headers:
-        try:
-            equipment_headers = json.loads(quote.equipment_headers)
-        except:
-            pass
-
-    # Render HTML template
-    html_content = render_template('invoice_pdf.html',
-                                   quote=quote,
-                                   user=current_user,
-                                   profile_pic_path=profile_pic_path,
-                                   background_path=background_path,
-                                   is_dark_background=is_dark_background,
-                                   equipment_items=equipment_items,
-                                   equipment_headers=equipment_headers,
-                                   equipment_total=equipment_total)
+    # Equipment rows and their SQL-computed total
+    equipment_items = quote.equipment_items if quote.equipments_enabled else []
+    equipment_headers = quote.equipment_headers or {
+        'header1': 'Work/Item Description', 'header2': 'Qty/Days', 'header3': 'Price'}
+    equipment_total = _equipment_total(quote)
+
+    return render_template('invoice_pdf.html',
+                           quote=quote,
+                           user=user,
+                           profile_pic_path=profile_pic_path,
+                           background_path=background_path,
+                           is_dark_background=is_dark_background,
+                           equipment_items=equipment_items,
+                           equipment_headers=equipment_headers,
+                           equipment_total=equipment_total)
+
+def _pdf_cache_dir(user_id):
+    return os.path.join(app.config['PDF_CACHE_DIR'], f'user_{int(user_id)}')
+
+def cached_quote_pdf(quote, user, bg='none', is_dark_background=False, render=True):
+    """PDF bytes for a quote, rendered only if its HTML changed since the cached copy
+
+    With render=False a missing cached copy returns None instead of rendering.
+    """
+    html_content = quote_pdf_html(quote, user, bg, is_dark_background)
+    digest = hashlib.sha256((request.url_root + html_content).encode()).hexdigest()[:32]
+    cache_dir = _pdf_cache_dir(user.id)
+    filename = f'quote_{quote.id}_{digest}.pdf'
+    path = os.path.join(cache_dir, filename)
+    try:
+        with open(path, 'rb') as f:
+            pdf = f.read()
+        with _metrics_lock:
+            _pdf_cache_results['hit'] += 1
+        return pdf
+    except FileNotFoundError:
+        if not render:
+            return None
+
+    pdf = render_pdf(html_content, request.url_root, user_id=user.id)
+    with _metrics_lock:
+        _pdf_cache_results['miss'] += 1
+    os.makedirs(cache_dir, exist_ok=True)
+    # A temporary file per writer, so concurrent renders of the same quote never share one
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as f:
+            f.write(pdf)
+        os.replace(tmp_path, path)
+    except OSError:
+        os.remove(tmp_path)
+        raise
+    drop_cached_pdfs(user.id, [quote.id], keep=filename)
+    return pdf
+
+def drop_cached_pdfs(user_id, quote_ids, keep=None):
+    """Remove cached renders of the given quotes (except the file named keep)"""
+    cache_dir = _pdf_cache_dir(user_id)
+    if not os.path.isdir(cache_dir):
+        return
+    prefixes = tuple(f'quote_{quote_id}_' for quote_id in quote_ids)
+    for name in os.listdir(cache_dir):
+        if name.startswith(prefixes) and name != keep:
+            try:
+                os.remove(os.path.join(cache_dir, name))
+            except FileNotFoundError:
+                pass  # Removed by another worker
 
-    # Generate PDF
-    pdf = HTML(string=html_content, base_url=request.url_root).write_pdf()
+@app.route('/api/quotes/<int:quote_id>/pdf')
+@login_required
+def generate_pdf(quote_id):
+    """Generate PDF for a quote using WeasyPrint"""
+    quote = Quote.query.filter_by(id=quote_id, user_id=current_user.id).first_or_404()
+    pdf = cached_quote_pdf(quote, current_user,
+                           bg=request.args.get('bg', 'none'),
+                           is_dark_background=request.args.get('isDark', 'false').lower() == 'true')
 
     # Create filename
     filename = f"{quote.doc_type}_{quote.invoice_number or quote_id}.pdf"
@@ -1051,6 +3358,94 @@ def generate_pdf(quote_id):
         headers={'Content-Disposition': f'attachment; filename="{filename}"'}
     )
 
+@app.route('/api/statements/pdf')
+@login_required
+def generate_statement_pdf():
+    """One PDF for a client: a cover/summary page followed by each invoice in the period
+
+    Query: company (required), date_from, date_to (YYYY-MM-DD), doc_type (default INVOICE), bg, isDark.
+    Only the cover is rendered every time; invoice pages come from the quote PDF cache.
+    At most MAX_STATEMENT_RENDERS missing invoices are rendered per request; while
+    more are missing it answers 202 with the number still pending, to be retried.
+    """
+    # Imported on first use, like WeasyPrint
+    from pypdf import PdfReader, PdfWriter
+
+    company_name = request.args.get('company', '').strip()
+    doc_type = request.args.get('doc_type', 'INVOICE')
+    if not company_name:
+        return jsonify({'error': 'company is required'}), 400
+    if doc_type not in ['QUOTE', 'INVOICE']:
+        return jsonify({'error': 'doc_type must be QUOTE or INVOICE'}), 400
+    try:
+        date_from = datetime.strptime(request.args['date_from'], '%Y-%m-%d').date() if request.args.get('date_from') else None
+        date_to = datetime.strptime(request.args['date_to'], '%Y-%m-%d').date() if request.args.get('date_to') else None
+    except ValueError:
+        return jsonify({'error': 'date_from and date_to must be YYYY-MM-DD'}), 400
+
+    query = Quote.query.filter(
+        Quote.user_id == current_user.id,
+        Quote.client_company == company_name,
+        Quote.doc_type == doc_type,
+        Quote.deleted_at.is_(None)
+    )
+    if date_from:
+        query = query.filter(Quote.date >= date_from)
+    if date_to:
+        query = query.filter(Quote.date <= date_to)
+    quotes = query.order_by(Quote.date, Quote.id).limit(MAX_STATEMENT_QUOTES + 1).all()
+    if not quotes:
+        return jsonify({'error': f'No {doc_type.lower()}s for {company_name} in that period'}), 404
+    if len(quotes) > MAX_STATEMENT_QUOTES:
+        return jsonify({'error': f'At most {MAX_STATEMENT_QUOTES} documents per statement; choose a shorter period'}), 400
+
+    bg = request.args.get('bg', 'none')
+    is_dark_background = request.args.get('isDark', 'false').lower() == 'true'
+    documents = [cached_quote_pdf(quote, current_user, bg, is_dark_background, render=False) for quote in quotes]
+    missing = [i for i, document in enumerate(documents) if document is None]
+    for i in missing[:MAX_STATEMENT_RENDERS]:
+        documents[i] = cached_quote_pdf(quotes[i], current_user, bg, is_dark_background)
+    pending = len(missing) - MAX_STATEMENT_RENDERS
+    if pending > 0:
+        return jsonify({
+            'message': f'Prepared {len(quotes) - pending} of {len(quotes)} documents; try again to continue',
+            'pending': pending
+        }), 202, {'Retry-After': '1'}
+
+    company = ClientCompany.query.filter_by(user_id=current_user.id, name=company_name).first()
+    cover = render_pdf(render_template('statement_pdf.html',
+                                       user=current_user,
+                                       company_name=company_name,
+                                       company_address=(company.address if company else None) or quotes[-1].client_address,
+                                       doc_type=doc_type,
+                                       date_from=date_from or quotes[0].date,
+                                       date_to=date_to or quotes[-1].date,
+                                       quotes=quotes,
+                                       total=sum(quote.total or 0 for quote in quotes),
+                                       generated_on=date.today()),
+                       request.url_root)
+
+    # Copy the pages over as they are; nothing is re-laid out
+    writer = PdfWriter()
+    writer.append(PdfReader(io.BytesIO(cover)), outline_item='Statement')
+    for quote, document in zip(quotes, documents):
+        writer.append(PdfReader(io.BytesIO(document)),
+                      outline_item=f"{quote.doc_type} {quote.invoice_number or quote.id}")
+    output = io.BytesIO()
+    writer.write(output)
+
+    filename = f"Statement_{secure_filename(company_name) or 'client'}_{date_from or quotes[0].date}_{date_to or quotes[-1].date}.pdf"
+    return Response(
+        output.getvalue(),
+        mimetype='application/pdf',
+        headers={'Content-Disposition': f'attachment; filename="{filename}"'}
+    )
+
 if __name__ == '__main__':
+    # Development server. For production use gunicorn.conf.py (./start.sh --production)
     init_db()
-    app.run(debug=True, port=5005)
+    app.run(
+        host=os.environ.get('HOST', '127.0.0.1'),
+        port=int(os.environ.get('PORT', 5005)),
+        debug=os.environ.get('FLASK_DEBUG', '1') == '1'
+    )
@@ -0,0 +1,277 @@
+#!/usr/bin/env python3
+"""
+Online backups of the SQLite database.
+
+Snapshots are taken with SQLite's online backup API, a few pages per step
+with a short pause in between, so the app keeps serving (and writing) while a
+backup runs. Each snapshot is integrity-checked, gzip-compressed into
+instance/backups/ and skipped if its content is identical to the previous one.
+Every run is logged to instance/backups/backups.csv with its duration and
+bytes copied.
+
+Usage:
+    python backup.py backup                      # one snapshot, then apply retention
+    python backup.py schedule --interval 3600    # snapshot every hour until stopped
+    python backup.py list
+    python backup.py verify BACKUP_FILE
+    python backup.py restore BACKUP_FILE         # stop the server first
+
+Retention keeps the newest --keep-last snapshots plus the newest snapshot of
+each of the last --keep-daily days.
+"""
+
+import argparse
+import csv
+import gzip
+import hashlib
+import os
+import shutil
+import sqlite3
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+INSTANCE_DIR = os.path.join(BASE_DIR, 'instance')
+BACKUP_DIR = os.path.join(INSTANCE_DIR, 'backups')
+LOG_PATH = os.path.join(BACKUP_DIR, 'backups.csv')
+PID_PATH = os.path.join(INSTANCE_DIR, 'gunicorn.pid')
+LOG_FIELDS = ['timestamp', 'file', 'status', 'pages', 'bytes_copied', 'bytes_stored', 'seconds', 'sha256']
+TIMESTAMP_FORMAT = '%Y%m%d-%H%M%S'
+
+
+def default_db_path():
+    """The database the app uses: DATABASE_URL when it is a SQLite file, else instance/quotes.db"""
+    url = os.environ.get('DATABASE_URL', '')
+    if url.startswith('sqlite:///') and os.path.isabs(url[len('sqlite:///'):]):
+        return url[len('sqlite:///'):]
+    return os.path.join(INSTANCE_DIR, 'quotes.db')
+
+
+def online_copy(source_path, target_path, pages, pause):
+    """Copy a live database with the backup API; returns the page count"""
+    source = sqlite3.connect(f'file:{source_path}?mode=ro', uri=True)
+    target = sqlite3.connect(target_path)
+    state = {}
+
+    def progress(status, remaining, total):
+        state['pages'] = total
+        # Releases the source between steps so writers are never held up for long
+        time.sleep(pause)
+
+    try:
+        source.backup(target, pages=pages, progress=progress)
+    finally:
+        target.close()
+        source.close()
+    return state.get('pages', 0)
+
+
+def integrity_check(db_path):
+    conn = sqlite3.connect(f'file:{db_path}?mode=ro', uri=True)
+    try:
+        result = conn.execute('PRAGMA integrity_check').fetchall()
+    finally:
+        conn.close()
+    return [row[0] for row in result] == ['ok'], [row[0] for row in result]
+
+
+def file_sha256(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(1024 * 1024), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def read_log():
+    if not os.path.exists(LOG_PATH):
+        return []
+    with open(LOG_PATH, newline='') as f:
+        return list(csv.DictReader(f))
+
+
+def append_log(entry):
+    new_file = not os.path.exists(LOG_PATH)
+    with open(LOG_PATH, 'a', newline='') as f:
+        writer = csv.DictWriter(f, fieldnames=LOG_FIELDS)
+        if new_file:
+            writer.writeheader()
+        writer.writerow(entry)
+
+
+def list_snapshots():
+    """Snapshot files, newest first, as (datetime, path)"""
+    snapshots = []
+    for filename in os.listdir(BACKUP_DIR) if os.path.isdir(BACKUP_DIR) else []:
+        if filename.startswith('quotes-') and filename.endswith('.db.gz'):
+            try:
+                taken = datetime.strptime(filename[len('quotes-'):-len('.db.gz')], TIMESTAMP_FORMAT)
+            except ValueError:
+                continue
+            snapshots.append((taken, os.path.join(BACKUP_DIR, filename)))
+    return sorted(snapshots, reverse=True)
+
+
+def apply_retention(keep_last, keep_daily):
+    snapshots = list_snapshots()
+    keep = {path for _, path in snapshots[:keep_last]}
+    cutoff = datetime.now() - timedelta(days=keep_daily)
+    seen_days = set()
+    for taken, path in snapshots:
+        if taken >= cutoff and taken.date() not in seen_days:
+            seen_days.add(taken.date())
+            keep.add(path)
+    removed = [path for _, path in snapshots if path not in keep]
+    for path in removed:
+        os.remove(path)
+    return removed
+
+
+def backup(args):
+    """Take one snapshot; returns the path stored, or None if unchanged"""
+    if not os.path.exists(args.db):
+        sys.exit(f"Database not found at {args.db}")
+    os.makedirs(BACKUP_DIR, exist_ok=True)
+
+    now = datetime.now()
+    start = time.perf_counter()
+    entry = {'timestamp': now.isoformat(timespec='seconds'), 'file': '', 'bytes_stored': 0}
+    with tempfile.TemporaryDirectory(dir=BACKUP_DIR) as tmp:
+        copy_path = os.path.join(tmp, 'snapshot.db')
+        entry['pages'] = online_copy(args.db, copy_path, args.pages, args.pause)
+        entry['bytes_copied'] = os.path.getsize(copy_path)
+        entry['sha256'] = file_sha256(copy_path)
+
+        ok, messages = integrity_check(copy_path)
+        previous = next((row for row in reversed(read_log()) if row['status'] == 'ok'), None)
+        if not ok:
+            entry['status'] = 'failed'
+            print(f"Integrity check failed: {'; '.join(messages[:5])}")
+        elif previous and previous['sha256'] == entry['sha256'] and os.path.exists(
+                os.path.join(BACKUP_DIR, previous['file'])):
+            entry['status'] = 'unchanged'
+        else:
+            entry['status'] = 'ok'
+            entry['file'] = f"quotes-{now.strftime(TIMESTAMP_FORMAT)}.db.gz"
+            target = os.path.join(BACKUP_DIR, entry['file'])
+            with open(copy_path, 'rb') as src, gzip.open(target + '.tmp', 'wb', compresslevel=args.level) as dst:
+                shutil.copyfileobj(src, dst, 1024 * 1024)
+            os.replace(target + '.tmp', target)
+            entry['bytes_stored'] = os.path.getsize(target)
+
+    entry['seconds'] = f'{time.perf_counter() - start:.3f}'
+    append_log(entry)
+
+    if entry['status'] == 'ok':
+        print(f"Backed up {entry['bytes_copied']:,} bytes ({entry['pages']} pages) to {entry['file']} "
+              f"({entry['bytes_stored']:,} bytes) in {entry['seconds']}s")
+        for path in apply_retention(args.keep_last, args.keep_daily):
+            print(f"  Removed old snapshot {os.path.basename(path)}")
+        return os.path.join(BACKUP_DIR, entry['file'])
+    if entry['status'] == 'unchanged':
+        print(f"No changes since {previous['file']}, nothing stored ({entry['seconds']}s)")
+        return None
+    sys.exit(1)
+
+
+def schedule(args):
+    print(f"Taking a snapshot of {args.db} every {args.interval}s (Ctrl+C to stop)")
+    while True:
+        started = time.monotonic()
+        try:
+            backup(args)
+        except SystemExit as e:
+            print(f"Backup failed: {e}")
+        time.sleep(max(0, args.interval - (time.monotonic() - started)))
+
+
+def extract(snapshot, target_dir):
+    path = os.path.join(target_dir, 'restore.db')
+    with gzip.open(snapshot, 'rb') as src, open(path, 'wb') as dst:
+        shutil.copyfileobj(src, dst, 1024 * 1024)
+    return path
+
+
+def verify(args):
+    with tempfile.TemporaryDirectory() as tmp:
+        ok, messages = integrity_check(extract(args.snapshot, tmp))
+    print(f"{os.path.basename(args.snapshot)}: {'ok' if ok else '; '.join(messages[:5])}")
+    if not ok:
+        sys.exit(1)
+
+
+def restore(args):
+    if os.path.exists(PID_PATH) and not args.force:
+        sys.exit(f"The server looks like it is running ({PID_PATH} exists). Stop it first or pass --force.")
+
+    with tempfile.TemporaryDirectory() as tmp:
+        restored = extract(args.snapshot, tmp)
+        ok, messages = integrity_check(restored)
+        if not ok:
+            sys.exit(f"Refusing to restore, integrity check failed: {'; '.join(messages[:5])}")
+
+        if os.path.exists(args.db):
+            print("Taking a snapshot of the current database first...")
+            backup(args)
+
+        # The backup API writes the whole file under one lock, so any open
+        # connection sees either the old or the restored database
+        source = sqlite3.connect(restored)
+        target = sqlite3.connect(args.db)
+        try:
+            source.backup(target)
+        finally:
+            target.close()
+            source.close()
+    print(f"Restored {os.path.basename(args.snapshot)} into {args.db}")
+
+
+def show(args):
+    snapshots = {os.path.basename(path) for _, path in list_snapshots()}
+    rows = read_log()
+    if not rows:
+        print("No backups yet")
+        return
+    print(f"{'timestamp':<21}{'status':<11}{'copied':>14}{'stored':>14}{'seconds':>9}  file")
+    for row in rows[-args.limit:]:
+        kept = row['file'] if row['file'] in snapshots else (f"({row['file']} pruned)" if row['file'] else '')
+        print(f"{row['timestamp']:<21}{row['status']:<11}{int(row['bytes_copied'] or 0):>14,}"
+              f"{int(row['bytes_stored'] or 0):>14,}{row['seconds']:>9}  {kept}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Online SQLite backups')
+    parser.add_argument('--db', default=default_db_path(), help='database file (default: %(default)s)')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_backup_options(sub):
+        sub.add_argument('--pages', type=int, default=256, help='pages copied per step')
+        sub.add_argument('--pause', type=float, default=0.01, help='seconds between steps')
+        sub.add_argument('--level', type=int, default=6, help='gzip level')
+        sub.add_argument('--keep-last', type=int, default=24)
+        sub.add_argument('--keep-daily', type=int, default=30)
+
+    add_backup_options(subparsers.add_parser('backup', help='take one snapshot'))
+    sched = subparsers.add_parser('schedule', help='take snapshots at a fixed interval')
+    sched.add_argument('--interval', type=int, default=3600, help='seconds')
+    add_backup_options(sched)
+
+    listing = subparsers.add_parser('list', help='show recent backup runs')
+    listing.add_argument('--limit', type=int, default=30)
+
+    check = subparsers.add_parser('verify', help='integrity-check a snapshot')
+    check.add_argument('snapshot')
+
+    rest = subparsers.add_parser('restore', help='replace the database with a snapshot')
+    rest.add_argument('snapshot')
+    rest.add_argument('--force', action='store_true', help='restore even if the server seems to be running')
+    add_backup_options(rest)
+
+    args = parser.parse_args()
+    {'backup': backup, 'schedule': schedule, 'list': show, 'verify': verify, 'restore': restore}[args.command](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,113 @@
+#!/usr/bin/env python3
+"""
+Startup-time benchmark for the Quote Generator.
+
+Measures how long `import app` takes and the time from launching the server
+until it answers its first request (time-to-first-request). Each run uses a
+fresh temporary database, so the real instance/quotes.db is never touched.
+
+Usage:
+    python bench_startup.py                  # 5 runs against the dev server
+    python bench_startup.py --runs 10
+    python bench_startup.py --production     # gunicorn with gunicorn.conf.py
+    python bench_startup.py --record         # also append results to instance/startup_bench.csv
+"""
+
+import argparse
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import urllib.error
+import urllib.request
+from datetime import datetime
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+RECORD_PATH = os.path.join(BASE_DIR, 'instance', 'startup_bench.csv')
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def bench_import(env):
+    """Time a bare `import app` in a fresh interpreter"""
+    code = 'import time; t = time.perf_counter(); import app; print(time.perf_counter() - t)'
+    output = subprocess.check_output([sys.executable, '-c', code], cwd=BASE_DIR, env=env)
+    return float(output.decode().strip().splitlines()[-1])
+
+
+def bench_first_request(env, production, timeout=60):
+    """Launch the server and poll /login until it answers"""
+    port = free_port()
+    env = dict(env, PORT=str(port), HOST='127.0.0.1')
+    if production:
+        command = [os.path.join(os.path.dirname(sys.executable), 'gunicorn'), '-c', 'gunicorn.conf.py', 'app:app']
+    else:
+        command = [sys.executable, 'app.py']
+
+    start = time.perf_counter()
+    proc = subprocess.Popen(command, cwd=BASE_DIR, env=env,
+                            stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while time.perf_counter() - start < timeout:
+            if proc.poll() is not None:
+                raise RuntimeError(f'Server exited with code {proc.returncode}')
+            try:
+                with urllib.request.urlopen(f'http://127.0.0.1:{port}/login', timeout=1) as response:
+                    if response.status == 200:
+                        return time.perf_counter() - start
+            except (urllib.error.URLError, ConnectionError, socket.timeout):
+                time.sleep(0.01)
+        raise RuntimeError(f'No response within {timeout}s')
+    finally:
+        proc.terminate()
+        proc.wait()
+
+
+def summarize(label, samples):
+    print(f"  {label:<22} min {min(samples) * 1000:8.1f} ms   "
+          f"median {statistics.median(samples) * 1000:8.1f} ms   "
+          f"max {max(samples) * 1000:8.1f} ms")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure app import time and time-to-first-request')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--production', action='store_true', help='benchmark the gunicorn server')
+    parser.add_argument('--record', action='store_true', help=f'append results to {RECORD_PATH}')
+    args = parser.parse_args()
+
+    import_times = []
+    first_request_times = []
+    with tempfile.TemporaryDirectory() as tmp:
+        for run in range(args.runs):
+            env = dict(os.environ, FLASK_DEBUG='0',
+                       DATABASE_URL=f"sqlite:///{os.path.join(tmp, f'bench_{run}.db')}")
+            import_times.append(bench_import(env))
+            first_request_times.append(bench_first_request(env, args.production))
+
+    mode = 'production' if args.production else 'development'
+    print(f"Startup benchmark ({mode}, {args.runs} runs)")
+    summarize('import app', import_times)
+    summarize('time-to-first-request', first_request_times)
+
+    if args.record:
+        os.makedirs(os.path.dirname(RECORD_PATH), exist_ok=True)
+        new_file = not os.path.exists(RECORD_PATH)
+        with open(RECORD_PATH, 'a') as f:
+            if new_file:
+                f.write('timestamp,mode,runs,import_median_ms,first_request_median_ms\n')
+            f.write(f"{datetime.now().isoformat(timespec='seconds')},{mode},{args.runs},"
+                    f"{statistics.median(import_times) * 1000:.1f},"
+                    f"{statistics.median(first_request_times) * 1000:.1f}\n")
+        print(f"Recorded to {RECORD_PATH}")
+
+
+if __name__ == '__main__':
+    main()
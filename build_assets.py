@@ -0,0 +1,115 @@
+#!/usr/bin/env python3
+"""
+Static asset build step.
+
+Minifies the app's JS and CSS, names each file by a hash of its content and
+writes gzip (and, if the `brotli` package is installed, brotli) copies next
+to it in static/dist/. The mapping from source path to built file goes to
+static/dist/manifest.json, which the `asset_url()` template helper reads.
+
+Run after changing anything in static/js or static/css:
+    python build_assets.py
+
+Minification uses `rjsmin` / `rcssmin` when installed and otherwise falls
+back to a conservative built-in pass (comments and whitespace only).
+"""
+
+import gzip
+import hashlib
+import json
+import os
+import re
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+try:
+    from rjsmin import jsmin
+except ImportError:
+    jsmin = None
+
+try:
+    from rcssmin import cssmin
+except ImportError:
+    cssmin = None
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+STATIC_DIR = os.path.join(BASE_DIR, 'static')
+DIST_DIR = os.path.join(STATIC_DIR, 'dist')
+MANIFEST_PATH = os.path.join(DIST_DIR, 'manifest.json')
+
+# Source paths relative to static/, as referenced by asset_url() in templates
+ASSETS = [
+    'css/style.css',
+    'css/history.css',
+    'js/app.js',
+    'js/history.js',
+]
+
+
+def minify_css(source):
+    if cssmin is not None:
+        return cssmin(source)
+    source = re.sub(r'/\*.*?\*/', '', source, flags=re.S)
+    source = re.sub(r'\s+', ' ', source)
+    source = re.sub(r'\s*([{};,])\s*', r'\1', source)
+    return source.replace(';}', '}').strip() + '\n'
+
+
+def minify_js(source):
+    if jsmin is not None:
+        return jsmin(source)
+    # Only drop indentation, blank lines and whole-line // comments; anything
+    # more needs a real tokenizer (regex literals, template strings)
+    lines = (line.strip() for line in source.splitlines())
+    return '\n'.join(line for line in lines if line and not line.startswith('//')) + '\n'
+
+
+def build_asset(path):
+    """Minify, fingerprint and precompress one asset; returns the built filename"""
+    with open(os.path.join(STATIC_DIR, path), encoding='utf-8') as f:
+        source = f.read()
+
+    stem, ext = os.path.splitext(os.path.basename(path))
+    content = (minify_css(source) if ext == '.css' else minify_js(source)).encode('utf-8')
+    digest = hashlib.sha256(content).hexdigest()[:12]
+    filename = f'{stem}.{digest}.min{ext}'
+    target = os.path.join(DIST_DIR, filename)
+
+    with open(target, 'wb') as f:
+        f.write(content)
+    with open(target + '.gz', 'wb') as f:
+        # mtime=0 keeps the gzip output byte-identical between builds
+        f.write(gzip.compress(content, compresslevel=9, mtime=0))
+    if brotli is not None:
+        with open(target + '.br', 'wb') as f:
+            f.write(brotli.compress(content, quality=11))
+
+    print(f"  {path:<18} {len(source):>8} -> {len(content):>8} bytes  {filename}")
+    return filename
+
+
+def build():
+    os.makedirs(DIST_DIR, exist_ok=True)
+    print(f"Building {len(ASSETS)} assets into {DIST_DIR}")
+    manifest = {path: build_asset(path) for path in ASSETS}
+
+    # Remove builds left over from earlier versions
+    keep = {'manifest.json'}
+    for filename in manifest.values():
+        keep.update({filename, filename + '.gz', filename + '.br'})
+    for filename in os.listdir(DIST_DIR):
+        if filename not in keep:
+            os.remove(os.path.join(DIST_DIR, filename))
+
+    with open(MANIFEST_PATH, 'w') as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+    if brotli is None:
+        print("Note: install 'brotli' to also produce .br files")
+    print("Done.")
+
+
+if __name__ == '__main__':
+    build()
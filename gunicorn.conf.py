@@ -0,0 +1,68 @@
+"""
+Gunicorn configuration for running the Quote Generator in production.
+
+Start with:
+    gunicorn -c gunicorn.conf.py app:app
+or:
+    ./start.sh --production
+
+Settings come from environment variables:
+    HOST, PORT            Address to bind (default 0.0.0.0:5005)
+    WEB_CONCURRENCY       Worker processes (default: 2 x CPU cores + 1)
+    THREADS               Threads per worker (default 4)
+    TIMEOUT               Seconds before a silent worker is restarted (default 120)
+    GRACEFUL_TIMEOUT      Seconds workers get to finish requests on restart (default 30)
+    MAX_REQUESTS          Recycle a worker after this many requests (default 1000, 0 = never)
+
+Graceful restart: `kill -HUP $(cat instance/gunicorn.pid)` starts fresh workers
+and lets the old ones finish their in-flight requests. Because the app is
+preloaded, deploying new code needs a full restart (or USR2 + WINCH + QUIT).
+"""
+
+import multiprocessing
+import os
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+
+bind = f"{os.environ.get('HOST', '0.0.0.0')}:{os.environ.get('PORT', '5005')}"
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+threads = int(os.environ.get('THREADS', 4))
+worker_class = 'gthread'
+
+# Import the app once in the master so workers fork with it already loaded
+preload_app = True
+
+timeout = int(os.environ.get('TIMEOUT', 120))  # PDF renders can be slow
+graceful_timeout = int(os.environ.get('GRACEFUL_TIMEOUT', 30))
+keepalive = 5
+max_requests = int(os.environ.get('MAX_REQUESTS', 1000))
+max_requests_jitter = max_requests // 10
+
+pidfile = os.path.join(BASE_DIR, 'instance', 'gunicorn.pid')
+accesslog = '-'
+errorlog = '-'
+
+
+def on_starting(server):
+    """Create tables and the default admin once, in the master process"""
+    from app import app, db, init_db
+
+    os.makedirs(os.path.dirname(pidfile), exist_ok=True)
+    init_db()
+    # Don't let workers inherit the master's SQLite connections
+    with app.app_context():
+        db.engine.dispose()
+
+
+def post_fork(server, worker):
+    from app import app, db
+
+    with app.app_context():
+        db.engine.dispose(close=False)
+
+
+def worker_exit(server, worker):
+    """Save the exiting worker's final request counts for /metrics"""
+    from app import flush_metrics
+
+    flush_metrics()
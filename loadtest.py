@@ -0,0 +1,363 @@
+#!/usr/bin/env python3
+"""
+Local load-testing harness for the Quote Generator.
+
+1. Generate a large fixture database (users, companies, quotes, line items):
+    python loadtest.py generate --db instance/loadtest.db --users 100 --quotes 5000 --line-items 30
+
+2. Start the app against it, e.g. in production mode:
+    DATABASE_URL=sqlite:///$PWD/instance/loadtest.db ./start.sh --production
+
+3. Replay scripted traffic and report throughput and latency percentiles:
+    python loadtest.py run --url http://127.0.0.1:5005 --concurrency 20 --duration 60
+
+Generated users are named loadtest_0001, loadtest_0002, ... and all share the
+password given by --password (default: loadtest123). Everything runs locally
+with the standard library plus the app's own dependencies.
+"""
+
+import argparse
+import gzip
+import http.client
+import json
+import os
+import random
+import sqlite3
+import statistics
+import sys
+import threading
+import time
+from datetime import date, datetime, timedelta
+from urllib.parse import urlencode, urlparse
+
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DEFAULT_PASSWORD = 'loadtest123'
+BATCH_SIZE = 10000
+
+COMPANY_WORDS = ['Acme', 'Bright', 'Cedar', 'Delta', 'Echo', 'Falcon', 'Global', 'Harbor', 'Iris', 'Jade',
+                 'Kite', 'Lumen', 'Metro', 'Nova', 'Orbit', 'Pulse', 'Quartz', 'Ridge', 'Summit', 'Titan']
+COMPANY_SUFFIXES = ['Events', 'Productions', 'Media', 'Live', 'Studios', 'Group', 'Entertainment', 'AV']
+VENUES = ['Expo Centre', 'Opera House', 'Convention Hall', 'Beach Stage', 'Arena', 'Ballroom']
+SHIFTS = [('08:00', '18:00'), ('09:00', '17:00'), ('14:00', '23:30'), ('18:00', '02:00'), ('06:00', '22:30')]
+
+
+# Fixture generation
+
+def create_schema(db_path):
+    """Create the app's tables in a fresh database file"""
+    os.environ['DATABASE_URL'] = f'sqlite:///{os.path.abspath(db_path)}'
+    sys.path.insert(0, BASE_DIR)
+    from app import app, db
+
+    with app.app_context():
+        db.create_all()
+
+
+def line_item_rows(quote_id, start, count, rng):
+    rows = []
+    for day in range(count):
+        time_in, time_out = rng.choice(SHIFTS)
+        minutes = (int(time_out[:2]) * 60 + int(time_out[3:])) - (int(time_in[:2]) * 60 + int(time_in[3:]))
+        hours = (minutes + 24 * 60) % (24 * 60) / 60
+        regular = min(hours, 8)
+        overtime = max(0, hours - 8)
+        rows.append((quote_id, (start + timedelta(days=day)).isoformat(), time_in, time_out, hours, regular,
+                     overtime, 200, 220, regular * 200 + overtime * 220, 'Sound Operator', 1600, 220))
+    return rows
+
+
+def generate(args):
+    from werkzeug.security import generate_password_hash
+
+    if os.path.exists(args.db):
+        if not args.force:
+            sys.exit(f"{args.db} already exists (use --force to replace it)")
+        os.remove(args.db)
+    os.makedirs(os.path.dirname(os.path.abspath(args.db)), exist_ok=True)
+    create_schema(args.db)
+
+    rng = random.Random(args.seed)
+    password_hash = generate_password_hash(args.password)
+    now = datetime.utcnow().isoformat(sep=' ')
+    total_quotes = args.users * args.quotes
+    print(f"Generating {args.users} users x {args.quotes} quotes x {args.line_items} line items "
+          f"({total_quotes * args.line_items:,} line items) into {args.db}")
+
+    conn = sqlite3.connect(args.db)
+    conn.execute('PRAGMA journal_mode=WAL')
+    conn.execute('PRAGMA synchronous=OFF')
+    cursor = conn.cursor()
+    start_time = time.perf_counter()
+    quote_id = 0
+    quotes, items = [], []
+
+    def flush():
+        cursor.executemany(
+            'INSERT INTO quote (id, user_id, doc_type, date, invoice_number, client_company, client_address, poc, '
+            'venue, job_description, hourly_rate, date_from, date_to, billing_type, daily_rate, ot_hourly_rate, '
+            'regular_call_hours, overtime_percentage, outside_dubai, per_diem_rate, equipments_enabled, hide_labor, '
+            'tax_rate, subtotal, total, created_at, updated_at, deleted_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', quotes)
+        cursor.executemany(
+            'INSERT INTO line_item (quote_id, date, time_in, time_out, total_hours, regular_hours, overtime_hours, '
+            'rate, overtime_rate, line_total, job_description, daily_rate, ot_hourly_rate) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)', items)
+        conn.commit()
+        quotes.clear()
+        items.clear()
+
+    for user_number in range(1, args.users + 1):
+        cursor.execute(
+            'INSERT INTO user (username, email, password_hash, role, is_active, must_change_password, created_at, '
+            'business_name, full_name, address, phone, default_hourly_rate, default_job_description) '
+            'VALUES (?, ?, ?, ?, 1, 0, ?, ?, ?, ?, ?, 200, ?)',
+            (f'loadtest_{user_number:04d}', f'loadtest_{user_number:04d}@example.com', password_hash, 'user', now,
+             f'Load Test Business {user_number}', f'Load Tester {user_number}', 'PO Box 1, Dubai', '+971 50 000 0000',
+             'Sound Operator'))
+        user_id = cursor.lastrowid
+
+        names = sorted({f'{rng.choice(COMPANY_WORDS)} {rng.choice(COMPANY_SUFFIXES)}'
+                        for _ in range(args.companies)})
+        stats = {name: [0, 0, 0.0, None] for name in names}  # quotes, invoices, billed, last invoice
+
+        for n in range(args.quotes):
+            quote_id += 1
+            company = rng.choice(names)
+            doc_type = 'INVOICE' if rng.random() < 0.6 else 'QUOTE'
+            start = date(2022, 1, 1) + timedelta(days=rng.randrange(1400))
+            rows = line_item_rows(quote_id, start, args.line_items, rng)
+            total = sum(row[9] for row in rows)
+            trashed = rng.random() < 0.03
+            invoice_number = f'{n + 1:03d}-{company[:4].upper()}-{start.strftime("%b").upper()}-{start.day:02d}'
+
+            entry = stats[company]
+            entry[0 if doc_type == 'QUOTE' else 1] += 1
+            if doc_type == 'INVOICE':
+                entry[3] = invoice_number
+                if not trashed:
+                    entry[2] += total
+
+            quotes.append((quote_id, user_id, doc_type, start.isoformat(), invoice_number, company,
+                           'PO Box 00000\nDubai\nUnited Arab Emirates', 'Contact Name', rng.choice(VENUES),
+                           'Sound Operator', 200, start.isoformat(), (start + timedelta(days=args.line_items - 1)).isoformat(),
+                           'hourly', 1600, 220, 8, 10, 0, 150, 0, 0, 0, total, total, now, now, now if trashed else None))
+            items.extend(rows)
+            if len(items) >= BATCH_SIZE:
+                flush()
+
+        cursor.executemany(
+            'INSERT INTO client_company (user_id, name, address, poc, venue, last_used_at, quote_count, '
+            'invoice_count, total_billed, last_invoice_number, created_at, updated_at) '
+            'VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+            [(user_id, name, 'PO Box 00000\nDubai', 'Contact Name', rng.choice(VENUES), now, s[0], s[1], s[2], s[3],
+              now, now) for name, s in stats.items()])
+        flush()
+        elapsed = time.perf_counter() - start_time
+        print(f"  user {user_number}/{args.users}: {quote_id:,} quotes so far ({quote_id / elapsed:,.0f} quotes/s)")
+
+    conn.execute('ANALYZE')
+    conn.commit()
+    conn.execute('PRAGMA journal_mode=DELETE')
+    conn.close()
+    size_mb = os.path.getsize(args.db) / 1024 / 1024
+    print(f"Done in {time.perf_counter() - start_time:.1f}s, database is {size_mb:,.1f} MB")
+
+
+# Traffic replay
+
+class Client:
+    """Keep-alive HTTP client holding one user's session cookie"""
+
+    def __init__(self, host, port):
+        self.host = host
+        self.port = port
+        self.cookies = {}
+        self.conn = None
+
+    def request(self, method, path, body=None, content_type=None):
+        headers = {'Accept-Encoding': 'gzip'}
+        if content_type:
+            headers['Content-Type'] = content_type
+        if self.cookies:
+            headers['Cookie'] = '; '.join(f'{k}={v}' for k, v in self.cookies.items())
+
+        for attempt in range(2):
+            if self.conn is None:
+                self.conn = http.client.HTTPConnection(self.host, self.port, timeout=120)
+            try:
+                self.conn.request(method, path, body, headers)
+                response = self.conn.getresponse()
+                data = response.read()
+                break
+            except (http.client.HTTPException, ConnectionError):
+                self.conn.close()
+                self.conn = None
+                if attempt:
+                    raise
+
+        for cookie in response.headers.get_all('Set-Cookie') or []:
+            name, _, rest = cookie.partition('=')
+            self.cookies[name.strip()] = rest.split(';', 1)[0]
+        return response.status, data, response.headers
+
+
+class Recorder:
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.samples = {}  # scenario -> list of seconds
+        self.errors = {}
+
+    def record(self, name, seconds, ok):
+        with self.lock:
+            self.samples.setdefault(name, []).append(seconds)
+            if not ok:
+                self.errors[name] = self.errors.get(name, 0) + 1
+
+
+def timed(recorder, name, func, *args, **kwargs):
+    start = time.perf_counter()
+    try:
+        status, data, headers = func(*args, **kwargs)
+    except Exception:
+        recorder.record(name, time.perf_counter() - start, False)
+        return None, None
+    recorder.record(name, time.perf_counter() - start, status < 400)
+    return status, data
+
+
+def decode_json(response):
+    status, data, headers = response
+    if headers.get('Content-Encoding') == 'gzip':
+        data = gzip.decompress(data)
+    return status, json.loads(data) if data else None, headers
+
+
+def virtual_user(number, args, recorder, stop):
+    url = urlparse(args.url)
+    client = Client(url.hostname, url.port or 80)
+    rng = random.Random(number)
+    username = f'loadtest_{(number % args.users) + 1:04d}'
+
+    status, _ = timed(recorder, 'login', client.request, 'POST', '/login',
+                      urlencode({'username': username, 'password': args.password}),
+                      'application/x-www-form-urlencoded')
+    if status is None or 'session' not in client.cookies:
+        return
+
+    try:
+        _, quotes, _ = decode_json(client.request('GET', '/api/quotes?sort=date_desc'))
+        _, companies, _ = decode_json(client.request('GET', '/api/companies'))
+    except Exception:
+        return
+    quote_ids = [q['id'] for q in quotes] or [0]
+    company_names = [c['name'] for c in companies] or ['Acme']
+
+    scenarios = [
+        ('companies', 10), ('autocomplete', 10), ('list_quotes', 25), ('list_filtered', 20),
+        ('get_quote', 20), ('save_quote', 10), ('pdf', 0 if args.skip_pdf else 5),
+    ]
+    names = [name for name, weight in scenarios if weight]
+    weights = [weight for name, weight in scenarios if weight]
+
+    while not stop.is_set():
+        scenario = rng.choices(names, weights)[0]
+        if scenario == 'companies':
+            timed(recorder, scenario, client.request, 'GET', '/api/companies')
+        elif scenario == 'autocomplete':
+            prefix = rng.choice(company_names)[:rng.randint(1, 3)]
+            timed(recorder, scenario, client.request, 'GET', f'/api/companies/autocomplete?q={prefix}&limit=10')
+        elif scenario == 'list_quotes':
+            timed(recorder, scenario, client.request, 'GET', '/api/quotes?sort=date_desc')
+        elif scenario == 'list_filtered':
+            params = {'company': rng.choice(company_names), 'doc_type': rng.choice(['QUOTE', 'INVOICE']),
+                      'date_from': '2023-01-01', 'sort': rng.choice(['date_desc', 'total_desc'])}
+            timed(recorder, scenario, client.request, 'GET', f'/api/quotes?{urlencode(params)}')
+        elif scenario == 'get_quote':
+            timed(recorder, scenario, client.request, 'GET', f'/api/quotes/{rng.choice(quote_ids)}')
+        elif scenario == 'save_quote':
+            quote_id = rng.choice(quote_ids)
+            try:
+                _, quote, _ = decode_json(client.request('GET', f'/api/quotes/{quote_id}'))
+            except Exception:
+                continue
+            if not quote or 'line_items' not in quote:
+                continue
+            quote['job_description'] = f"Sound Operator {rng.randint(1, 99)}"
+            timed(recorder, scenario, client.request, 'PUT', f'/api/quotes/{quote_id}',
+                  json.dumps(quote), 'application/json')
+        elif scenario == 'pdf':
+            timed(recorder, scenario, client.request, 'GET', f'/api/quotes/{rng.choice(quote_ids)}/pdf')
+
+
+def percentile(samples, pct):
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[index]
+
+
+def run(args):
+    recorder = Recorder()
+    stop = threading.Event()
+    threads = [threading.Thread(target=virtual_user, args=(n, args, recorder, stop), daemon=True)
+               for n in range(args.concurrency)]
+
+    print(f"Running {args.concurrency} virtual users against {args.url} for {args.duration}s...")
+    start = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    time.sleep(args.duration)
+    stop.set()
+    for thread in threads:
+        thread.join(timeout=130)
+    elapsed = time.perf_counter() - start
+
+    print()
+    print(f"{'scenario':<15}{'requests':>10}{'errors':>8}{'req/s':>9}{'p50 ms':>9}{'p95 ms':>9}{'p99 ms':>9}{'max ms':>9}")
+    total = 0
+    for name, samples in sorted(recorder.samples.items()):
+        total += len(samples)
+        print(f"{name:<15}{len(samples):>10}{recorder.errors.get(name, 0):>8}{len(samples) / elapsed:>9.1f}"
+              f"{percentile(samples, 50) * 1000:>9.1f}{percentile(samples, 95) * 1000:>9.1f}"
+              f"{percentile(samples, 99) * 1000:>9.1f}{max(samples) * 1000:>9.1f}")
+    print(f"\nTotal: {total} requests in {elapsed:.1f}s ({total / elapsed:.1f} req/s)")
+
+    if args.json:
+        with open(args.json, 'w') as f:
+            json.dump({name: {'requests': len(samples), 'errors': recorder.errors.get(name, 0),
+                              'p50': statistics.median(samples), 'p95': percentile(samples, 95),
+                              'p99': percentile(samples, 99), 'max': max(samples)}
+                       for name, samples in recorder.samples.items()}, f, indent=2)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local load-testing harness')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    gen = subparsers.add_parser('generate', help='fill a SQLite database with fixture data')
+    gen.add_argument('--db', default=os.path.join(BASE_DIR, 'instance', 'loadtest.db'))
+    gen.add_argument('--users', type=int, default=10)
+    gen.add_argument('--companies', type=int, default=20, help='companies per user (before de-duplication)')
+    gen.add_argument('--quotes', type=int, default=500, help='quotes per user')
+    gen.add_argument('--line-items', type=int, default=30, help='line items per quote')
+    gen.add_argument('--password', default=DEFAULT_PASSWORD)
+    gen.add_argument('--seed', type=int, default=1)
+    gen.add_argument('--force', action='store_true', help='replace an existing database')
+
+    load = subparsers.add_parser('run', help='replay scripted traffic against a running server')
+    load.add_argument('--url', default='http://127.0.0.1:5005')
+    load.add_argument('--users', type=int, default=10, help='number of generated users to log in as')
+    load.add_argument('--concurrency', type=int, default=10)
+    load.add_argument('--duration', type=int, default=30, help='seconds')
+    load.add_argument('--password', default=DEFAULT_PASSWORD)
+    load.add_argument('--skip-pdf', action='store_true', help='leave PDF downloads out of the mix')
+    load.add_argument('--json', help='also write the summary to this file')
+
+    args = parser.parse_args()
+    if args.command == 'generate':
+        generate(args)
+    else:
+        run(args)
+
+
+if __name__ == '__main__':
+    main()
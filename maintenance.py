@@ -0,0 +1,210 @@
+#!/usr/bin/env python3
+"""
+Background maintenance of the SQLite database (and of each per-tenant shard).
+
+Each pass, per database:
+  - refreshes query planner statistics: ANALYZE the first time, PRAGMA
+    optimize afterwards (it only re-analyzes tables that need it)
+  - hands free pages back to the filesystem with incremental vacuum, a bounded
+    number of pages per step, stopping as soon as the app writes again
+  - runs PRAGMA quick_check and measures fragmentation every --check-hours
+
+Work on a database only starts once it has seen no writes for --idle seconds,
+and every step is its own short transaction, so requests are never held up
+for long. Results are written to instance/maintenance.json and shown on the
+admin page.
+
+Incremental vacuum needs auto_vacuum=INCREMENTAL. New databases are created
+with it; migrate_db.py converts existing ones, tenant shards included.
+
+Usage:
+    python maintenance.py run                        # one pass now
+    python maintenance.py schedule --interval 3600   # a pass every hour until stopped
+    python maintenance.py report
+"""
+
+import argparse
+import json
+import os
+import sqlite3
+import time
+from datetime import datetime, timedelta
+
+from app import app, maintenance_databases, sqlite_file_stats
+
+REPORT_PATH = app.config['MAINTENANCE_REPORT_PATH']
+ANALYSIS_LIMIT = 1000  # Rows sampled per index by ANALYZE / PRAGMA optimize
+
+
+def read_report():
+    if not os.path.exists(REPORT_PATH):
+        return {'databases': {}}
+    with open(REPORT_PATH) as f:
+        return json.load(f)
+
+
+def write_report(report):
+    with open(REPORT_PATH + '.tmp', 'w') as f:
+        json.dump(report, f, indent=2)
+    os.replace(REPORT_PATH + '.tmp', REPORT_PATH)
+
+
+def data_version(conn):
+    """Changes whenever another connection commits to the database"""
+    return conn.execute('PRAGMA data_version').fetchone()[0]
+
+
+def wait_for_idle(conn, idle, max_wait):
+    """Wait until no other connection has written for `idle` seconds; False if that never happens"""
+    deadline = time.monotonic() + max_wait
+    while True:
+        version = data_version(conn)
+        time.sleep(idle)
+        if data_version(conn) == version:
+            return True
+        if time.monotonic() >= deadline:
+            return False
+
+
+def refresh_statistics(conn):
+    conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+    has_stats = conn.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'sqlite_stat1'").fetchone()
+    conn.execute('PRAGMA optimize' if has_stats else 'ANALYZE')
+    return 'optimize' if has_stats else 'analyze'
+
+
+def incremental_vacuum(conn, pages_per_step, max_pages, pause):
+    """Free up to max_pages pages in steps; returns (pages freed, whether it stopped for a writer)"""
+    freed = 0
+    while freed < max_pages:
+        free_pages = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        if not free_pages:
+            break
+        version = data_version(conn)
+        step = min(pages_per_step, free_pages, max_pages - freed)
+        # The pragma frees one page per row it steps through, so read them all
+        conn.execute(f'PRAGMA incremental_vacuum({step})').fetchall()
+        freed += free_pages - conn.execute('PRAGMA freelist_count').fetchone()[0]
+        time.sleep(pause)
+        if data_version(conn) != version:
+            return freed, True
+    return freed, False
+
+
+def fragmentation_percent(conn, stats):
+    """Share of the file that holds no data: free pages plus unused space inside pages"""
+    try:
+        used, unused = conn.execute('SELECT SUM(pgsize), SUM(unused) FROM dbstat').fetchone()
+    except sqlite3.OperationalError:
+        # SQLite built without the dbstat table: count free pages only
+        return stats['free_percent']
+    if not stats['size_bytes']:
+        return 0
+    free_bytes = stats['free_pages'] * (stats['size_bytes'] // stats['page_count'])
+    return round(100 * (free_bytes + (unused or 0)) / stats['size_bytes'], 1)
+
+
+def maintain(name, path, previous, args):
+    """One maintenance pass over a database; returns its report entry"""
+    result = dict(previous)
+    conn = sqlite3.connect(path, timeout=args.busy_timeout, isolation_level=None)
+    try:
+        if not wait_for_idle(conn, args.idle, args.max_wait):
+            print(f"  {name}: busy, skipped")
+            result['status'] = 'busy'
+            return result
+
+        start = time.perf_counter()
+        result['statistics'] = refresh_statistics(conn)
+        result['analyzed_at'] = datetime.now().isoformat(timespec='seconds')
+        result['analyze_seconds'] = round(time.perf_counter() - start, 3)
+
+        stats = sqlite_file_stats(conn)
+        if stats['auto_vacuum'] == 'incremental':
+            freed, interrupted = incremental_vacuum(conn, args.pages_per_step, args.max_pages, args.pause)
+            result['vacuumed_at'] = datetime.now().isoformat(timespec='seconds')
+            result['pages_freed'] = freed
+            result['vacuum_interrupted'] = interrupted
+        else:
+            result['pages_freed'] = 0
+
+        last_check = previous.get('checked_at')
+        if not last_check or datetime.fromisoformat(last_check) < datetime.now() - timedelta(hours=args.check_hours):
+            messages = [row[0] for row in conn.execute('PRAGMA quick_check').fetchall()]
+            result['check'] = 'ok' if messages == ['ok'] else '; '.join(messages[:5])
+            result['checked_at'] = datetime.now().isoformat(timespec='seconds')
+            result['fragmentation_percent'] = fragmentation_percent(conn, sqlite_file_stats(conn))
+
+        result.update(sqlite_file_stats(conn))
+        result['status'] = 'ok' if result.get('check', 'ok') == 'ok' else 'check failed'
+        print(f"  {name}: {result['statistics']}, {result['pages_freed']} pages freed"
+              f"{' (stopped for a writer)' if result.get('vacuum_interrupted') else ''}, "
+              f"{result['size_bytes']:,} bytes, {result['free_pages']} free pages, check {result.get('check', '-')}"
+              + ('' if result['auto_vacuum'] == 'incremental' else ' (auto_vacuum off: run migrate_db.py)'))
+        return result
+    finally:
+        conn.close()
+
+
+def run(args):
+    report = read_report()
+    with app.app_context():
+        databases = maintenance_databases()
+    print(f"Maintaining {len(databases)} database(s)")
+    for name, path in databases:
+        if os.path.exists(path):
+            report['databases'][name] = maintain(name, path, report['databases'].get(name, {}), args)
+    report['last_run'] = datetime.now().isoformat(timespec='seconds')
+    write_report(report)
+
+
+def schedule(args):
+    print(f"Running maintenance every {args.interval}s (Ctrl+C to stop)")
+    while True:
+        started = time.monotonic()
+        try:
+            run(args)
+        except sqlite3.Error as e:
+            print(f"Maintenance failed: {e}")
+        time.sleep(max(0, args.interval - (time.monotonic() - started)))
+
+
+def show(args):
+    report = read_report()
+    if not report['databases']:
+        print("No maintenance runs yet")
+        return
+    print(f"Last run {report.get('last_run')}")
+    print(f"{'database':<16}{'size':>14}{'free pages':>12}{'fragm. %':>10}  {'analyzed':<21}{'checked':<21}check")
+    for name, entry in sorted(report['databases'].items()):
+        print(f"{name:<16}{entry.get('size_bytes', 0):>14,}{entry.get('free_pages', 0):>12}"
+              f"{entry.get('fragmentation_percent', '-'):>10}  {entry.get('analyzed_at', '-'):<21}"
+              f"{entry.get('checked_at', '-'):<21}{entry.get('check', '-')}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Background SQLite maintenance')
+    subparsers = parser.add_subparsers(dest='command', required=True)
+
+    def add_run_options(sub):
+        sub.add_argument('--idle', type=float, default=30, help='seconds without writes before starting')
+        sub.add_argument('--max-wait', type=float, default=600, help='give up on a busy database after this long')
+        sub.add_argument('--pages-per-step', type=int, default=200, help='pages freed per vacuum step')
+        sub.add_argument('--max-pages', type=int, default=20000, help='pages freed per database per pass')
+        sub.add_argument('--pause', type=float, default=0.05, help='seconds between vacuum steps')
+        sub.add_argument('--check-hours', type=float, default=24, help='hours between quick_check runs')
+        sub.add_argument('--busy-timeout', type=float, default=5, help='seconds to wait for a lock')
+
+    add_run_options(subparsers.add_parser('run', help='run one maintenance pass'))
+    sched = subparsers.add_parser('schedule', help='run maintenance at a fixed interval')
+    sched.add_argument('--interval', type=int, default=3600, help='seconds')
+    add_run_options(sched)
+    subparsers.add_parser('report', help='show the last results')
+
+    args = parser.parse_args()
+    {'run': run, 'schedule': schedule, 'report': show}[args.command](args)
+
+
+if __name__ == '__main__':
+    main()
@@ -1,183 +1,535 @@
 #!/usr/bin/env python3
 """
-Database migration script for adding username field to User model.
-Migrates existing email-based logins to username-based logins.
-
-Run this script ONCE after deploying the new code:
-    python migrate_db.py
+Versioned database migrations.
+
+Brings an existing database up to the schema the app expects. Each migration
+has a version number; the highest applied version is stored in the database
+(PRAGMA user_version, with a history in the schema_migration table), so
+running this again only applies what is new. Data changes run as set-based
+UPDATEs over bounded id ranges, committing after each batch and recording a
+checkpoint, so an interrupted run resumes where it stopped.
+
+Usage:
+    python migrate_db.py                        # apply all pending migrations
+    python migrate_db.py --status               # show applied and pending versions
+    python migrate_db.py --db path/to.db --batch-size 20000
+    python migrate_db.py --target 3             # stop after version 3
+
+Tenant shards (instance/tenants/user_<id>.db, or --shards DIR) are converted
+to incremental auto-vacuum along with the central database.
+
+To try migrations against a large database, generate one with
+`python loadtest.py generate` and pass it with --db.
 """
 
-import sqlite3
+import argparse
+import json
 import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
 
-DB_PATH = os.path.join(os.path.dirname(__file__), 'instance', 'quotes.db')
+BASE_DIR = os.path.dirname(os.path.abspath(__file__))
+DB_PATH = os.path.join(BASE_DIR, 'instance', 'quotes.db')
+SHARD_DIR = os.path.join(BASE_DIR, 'instance', 'tenants')
+DEFAULT_BATCH_SIZE = 5000
+PROGRESS_INTERVAL = 2  # Seconds between progress lines of a batched step
 
-def migrate():
-    """Add username column and migrate existing users"""
+MIGRATIONS = []
 
-    # Check if database exists
-    if not os.path.exists(DB_PATH):
-        print(f"Database not found at {DB_PATH}")
-        print("If this is a fresh install, just run the app and the database will be created.")
-        return
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def migration(version, name):
+    """Register a migration function; versions must be applied in increasing order"""
+    def register(func):
+        MIGRATIONS.append((version, name, func))
+        return func
+    return register
 
-    try:
-        # Check if username column already exists
-        cursor.execute("PRAGMA table_info(user)")
-        columns = [col[1] for col in cursor.fetchall()]
-
-        if 'username' in columns:
-            print("Migration already applied - username column exists")
-
-            # Check if there are users without username
-            cursor.execute("SELECT id, email FROM user WHERE username IS NULL OR username = ''")
-            users_without_username = cursor.fetchall()
-
-            if users_without_username:
-                print(f"Found {len(users_without_username)} users without username, migrating...")
-                for user_id, email in users_without_username:
-                    # Extract username from email (part before @)
-                    if email:
-                        username = email.split('@')[0].lower()
-                        # Handle potential duplicates by appending id
-                        cursor.execute("SELECT COUNT(*) FROM user WHERE username = ? AND id != ?", (username, user_id))
-                        if cursor.fetchone()[0] > 0:
-                            username = f"{username}_{user_id}"
-                        cursor.execute("UPDATE user SET username = ? WHERE id = ?", (username, user_id))
-                        print(f"  User {user_id}: {email} -> username: {username}")
-                    else:
-                        # No email, use user_<id> as username
-                        username = f"user_{user_id}"
-                        cursor.execute("UPDATE user SET username = ? WHERE id = ?", (username, user_id))
-                        print(f"  User {user_id}: (no email) -> username: {username}")
-
-                conn.commit()
-                print("Migration complete!")
-            else:
-                print("All users already have usernames")
-            return
-
-        # Add username column
-        print("Adding username column...")
-        cursor.execute("ALTER TABLE user ADD COLUMN username VARCHAR(80)")
-
-        # Migrate existing users: set username from email (part before @)
-        cursor.execute("SELECT id, email FROM user")
-        users = cursor.fetchall()
-
-        print(f"Migrating {len(users)} existing users...")
-        used_usernames = set()
-
-        for user_id, email in users:
-            if email:
-                base_username = email.split('@')[0].lower()
-                username = base_username
-                counter = 1
-                # Handle duplicates
-                while username in used_usernames:
-                    username = f"{base_username}_{counter}"
-                    counter += 1
-                used_usernames.add(username)
-            else:
-                username = f"user_{user_id}"
-                used_usernames.add(username)
-
-            cursor.execute("UPDATE user SET username = ? WHERE id = ?", (username, user_id))
-            print(f"  {email or '(no email)'} -> {username}")
 
-        conn.commit()
-        print("\nMigration complete!")
-        print("\nUsers can now log in with their username (shown above).")
-        print("Email is now a separate contact field that can be edited in profile settings.")
-
-    except Exception as e:
-        conn.rollback()
-        print(f"Migration failed: {e}")
-        raise
-    finally:
-        conn.close()
+def default_db_path():
+    url = os.environ.get('DATABASE_URL', '')
+    if url.startswith('sqlite:///') and os.path.isabs(url[len('sqlite:///'):]):
+        return url[len('sqlite:///'):]
+    return DB_PATH
 
-def migrate_equipments():
-    """Add equipment columns to quote table"""
 
-    if not os.path.exists(DB_PATH):
-        print(f"Database not found at {DB_PATH}")
-        return
+# Helpers
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
+def table_exists(conn, table):
+    return conn.execute("SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = ?", (table,)).fetchone() is not None
 
-    try:
-        # Check if columns already exist
-        cursor.execute("PRAGMA table_info(quote)")
-        columns = [col[1] for col in cursor.fetchall()]
-
-        columns_to_add = []
-        if 'equipments_enabled' not in columns:
-            columns_to_add.append(('equipments_enabled', 'BOOLEAN DEFAULT 0'))
-        if 'equipment_headers' not in columns:
-            columns_to_add.append(('equipment_headers', 'TEXT'))
-        if 'equipment_items' not in columns:
-            columns_to_add.append(('equipment_items', 'TEXT'))
-
-        if not columns_to_add:
-            print("Equipment columns already exist")
-            return
-
-        print(f"Adding {len(columns_to_add)} equipment column(s)...")
-        for col_name, col_def in columns_to_add:
-            cursor.execute(f"ALTER TABLE quote ADD COLUMN {col_name} {col_def}")
-            print(f"  Added: {col_name}")
 
+def table_columns(conn, table):
+    return [col[1] for col in conn.execute(f"PRAGMA table_info({table})")]
+
+
+def add_columns(conn, table, columns):
+    """Add any of (name, definition) missing from table. Tables the app has not
+    created yet are skipped; db.create_all() creates them complete."""
+    if not table_exists(conn, table):
+        print(f"  {table}: table not created yet, skipped")
+        return
+    existing = table_columns(conn, table)
+    for col_name, col_def in columns:
+        if col_name not in existing:
+            conn.execute(f"ALTER TABLE {table} ADD COLUMN {col_name} {col_def}")
+            print(f"  Added: {table}.{col_name}")
+    conn.commit()
+
+
+def id_batches(conn, version, step, table, batch_size):
+    """Yield (first_id, last_id) ranges covering table.
+
+    The caller processes a range; the checkpoint is then saved and committed
+    together with its changes. A restarted run continues after the last
+    committed range.
+    """
+    if not table_exists(conn, table):
+        return
+    max_id = conn.execute(f"SELECT MAX(id) FROM {table}").fetchone()[0] or 0
+    row = conn.execute("SELECT last_id FROM schema_migration_checkpoint WHERE version = ? AND step = ?",
+                       (version, step)).fetchone()
+    last = row[0] if row else 0
+    if last:
+        print(f"  {step}: resuming after id {last}")
+
+    start = reported = time.perf_counter()
+    while last < max_id:
+        upper = min(last + batch_size, max_id)
+        yield last + 1, upper
+        conn.execute("INSERT OR REPLACE INTO schema_migration_checkpoint (version, step, last_id) VALUES (?, ?, ?)",
+                     (version, step, upper))
         conn.commit()
-        print("Equipment migration complete!")
+        last = upper
+        now = time.perf_counter()
+        if now - reported >= PROGRESS_INTERVAL or last == max_id:
+            reported = now
+            print(f"  {step}: {last:,}/{max_id:,} ids ({last * 100 // max_id}%, {now - start:.1f}s)")
 
-    except Exception as e:
-        conn.rollback()
-        print(f"Equipment migration failed: {e}")
-        raise
-    finally:
-        conn.close()
+
+def run_batched(conn, version, step, table, sql, batch_size):
+    """Run an UPDATE/DELETE with :lo and :hi id bounds over the whole table in batches"""
+    changed = 0
+    for lo, hi in id_batches(conn, version, step, table, batch_size):
+        changed += conn.execute(sql, {'lo': lo, 'hi': hi}).rowcount
+    return changed
+
+
+# Migrations
+
+@migration(1, 'username logins')
+def migrate_usernames(conn, batch_size):
+    """Username column, filled from the part of the email before @"""
+    add_columns(conn, 'user', [('username', 'VARCHAR(80)')])
+    if not table_exists(conn, 'user'):
+        return
+    run_batched(conn, 1, 'usernames', 'user', """
+        UPDATE user SET username = COALESCE(
+            NULLIF(lower(CASE WHEN instr(email, '@') > 0 THEN substr(email, 1, instr(email, '@') - 1)
+                              ELSE email END), ''),
+            'user_' || id)
+        WHERE (username IS NULL OR username = '') AND id BETWEEN :lo AND :hi
+    """, batch_size)
+    # Later duplicates of a name get their id appended
+    cursor = conn.execute("""
+        UPDATE user SET username = username || '_' || id
+        WHERE EXISTS (SELECT 1 FROM user other WHERE other.username = user.username AND other.id < user.id)
+    """)
+    if cursor.rowcount:
+        print(f"  Renamed {cursor.rowcount} duplicate usernames")
+    conn.commit()
+
+
+@migration(2, 'quote and profile columns')
+def migrate_model_columns(conn, batch_size):
+    """Columns added to the models over time without a migration of their own"""
+    add_columns(conn, 'user', [
+        ('email', 'VARCHAR(120)'),
+        ('role', "VARCHAR(10) DEFAULT 'user'"),
+        ('is_active', 'BOOLEAN DEFAULT 1'),
+        ('must_change_password', 'BOOLEAN DEFAULT 0'),
+        ('created_at', 'DATETIME'),
+        ('business_name', 'VARCHAR(200)'),
+        ('full_name', 'VARCHAR(200)'),
+        ('address', 'TEXT'),
+        ('phone', 'VARCHAR(50)'),
+        ('default_hourly_rate', 'FLOAT DEFAULT 200'),
+        ('default_job_description', "VARCHAR(300) DEFAULT 'Sound Operator'"),
+        ('bank_account_holder', 'VARCHAR(200)'),
+        ('bank_name', 'VARCHAR(200)'),
+        ('bank_account_number', 'VARCHAR(50)'),
+        ('bank_iban', 'VARCHAR(50)'),
+        ('profilepic', 'VARCHAR(500)'),
+    ])
+    add_columns(conn, 'quote', [
+        ('doc_type', "VARCHAR(10) DEFAULT 'QUOTE'"),
+        ('po_number', 'VARCHAR(50)'),
+        ('job_id', 'VARCHAR(100)'),
+        ('poc_phone', 'VARCHAR(50)'),
+        ('poc_email', 'VARCHAR(100)'),
+        ('job_company', 'VARCHAR(200)'),
+        ('date_from', 'DATE'),
+        ('date_to', 'DATE'),
+        ('billing_type', "VARCHAR(10) DEFAULT 'hourly'"),
+        ('daily_rate', 'FLOAT DEFAULT 1600'),
+        ('ot_hourly_rate', 'FLOAT DEFAULT 220'),
+        ('regular_call_hours', 'INTEGER DEFAULT 8'),
+        ('overtime_percentage', 'INTEGER DEFAULT 10'),
+        ('outside_dubai', 'BOOLEAN DEFAULT 0'),
+        ('per_diem_rate', 'FLOAT DEFAULT 150'),
+        ('equipments_enabled', 'BOOLEAN DEFAULT 0'),
+        ('hide_labor', 'BOOLEAN DEFAULT 0'),
+        ('bank_account_holder', 'VARCHAR(200)'),
+        ('bank_name', 'VARCHAR(200)'),
+        ('bank_account_number', 'VARCHAR(50)'),
+        ('bank_iban', 'VARCHAR(50)'),
+        ('tax_rate', 'FLOAT DEFAULT 0'),
+        ('subtotal', 'FLOAT DEFAULT 0'),
+        ('total', 'FLOAT DEFAULT 0'),
+        ('updated_at', 'DATETIME'),
+        ('deleted_at', 'DATETIME'),
+    ])
+    add_columns(conn, 'line_item', [
+        ('overtime_rate', 'FLOAT'),
+        ('line_total', 'FLOAT'),
+        ('job_description', 'VARCHAR(300)'),
+        ('daily_rate', 'FLOAT'),
+        ('ot_hourly_rate', 'FLOAT'),
+    ])
+    add_columns(conn, 'client_company', [
+        ('poc_phone', 'VARCHAR(50)'),
+        ('poc_email', 'VARCHAR(200)'),
+        ('venue', 'VARCHAR(300)'),
+        ('updated_at', 'DATETIME'),
+    ])
+
+
+@migration(3, 'company autocomplete')
+def migrate_company_autocomplete(conn, batch_size):
+    """last_used_at (seeded from each company's latest quote) and the case-insensitive name index"""
+    add_columns(conn, 'client_company', [('last_used_at', 'DATETIME')])
+    if not table_exists(conn, 'client_company'):
+        return
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_quote_user_company ON quote (user_id, client_company)")
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_client_company_user_lower_name "
+                 "ON client_company (user_id, lower(name))")
+    conn.commit()
+    run_batched(conn, 3, 'last_used_at', 'client_company', """
+        UPDATE client_company SET last_used_at = (
+            SELECT MAX(quote.updated_at) FROM quote
+            WHERE quote.user_id = client_company.user_id AND quote.client_company = client_company.name
+        )
+        WHERE last_used_at IS NULL AND id BETWEEN :lo AND :hi
+    """, batch_size)
+
+
+@migration(4, 'company aggregates')
+def migrate_company_aggregates(conn, batch_size):
+    """Denormalized quote counts and invoice totals on client_company"""
+    add_columns(conn, 'client_company', [
+        ('quote_count', 'INTEGER DEFAULT 0'),
+        ('invoice_count', 'INTEGER DEFAULT 0'),
+        ('total_billed', 'FLOAT DEFAULT 0'),
+        ('last_invoice_number', 'VARCHAR(50)'),
+    ])
+    if not table_exists(conn, 'client_company'):
+        return
+    run_batched(conn, 4, 'aggregates', 'client_company', """
+        UPDATE client_company SET
+            quote_count = (SELECT COUNT(*) FROM quote q
+                           WHERE q.user_id = client_company.user_id AND q.client_company = client_company.name
+                             AND q.doc_type != 'INVOICE'),
+            invoice_count = (SELECT COUNT(*) FROM quote q
+                             WHERE q.user_id = client_company.user_id AND q.client_company = client_company.name
+                               AND q.doc_type = 'INVOICE'),
+            total_billed = (SELECT COALESCE(SUM(q.total), 0) FROM quote q
+                            WHERE q.user_id = client_company.user_id AND q.client_company = client_company.name
+                              AND q.doc_type = 'INVOICE' AND q.deleted_at IS NULL),
+            last_invoice_number = (SELECT q.invoice_number FROM quote q
+                                   WHERE q.user_id = client_company.user_id AND q.client_company = client_company.name
+                                     AND q.doc_type = 'INVOICE'
+                                   ORDER BY q.created_at DESC, q.id DESC LIMIT 1)
+        WHERE id BETWEEN :lo AND :hi
+    """, batch_size)
+
+
+@migration(5, 'profile picture variants')
+def migrate_profilepic_variants(conn, batch_size):
+    add_columns(conn, 'user', [
+        ('profilepic_print', 'VARCHAR(200)'),
+        ('profilepic_status', 'VARCHAR(20)'),
+    ])
+
+
+@migration(6, 'equipment items table')
+def migrate_equipment_items(conn, batch_size):
+    """Move equipment JSON from the quote table into equipment_item rows"""
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS equipment_item (
+            id INTEGER NOT NULL PRIMARY KEY,
+            quote_id INTEGER NOT NULL REFERENCES quote (id),
+            position INTEGER NOT NULL,
+            description VARCHAR(300),
+            qty VARCHAR(50),
+            price FLOAT,
+            total FLOAT
+        )
+    """)
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_equipment_item_quote_id ON equipment_item (quote_id)")
+    add_columns(conn, 'quote', [
+        ('equipment_header1', 'VARCHAR(100)'),
+        ('equipment_header2', 'VARCHAR(100)'),
+        ('equipment_header3', 'VARCHAR(100)'),
+    ])
+    if not table_exists(conn, 'quote') or 'equipment_items' not in table_columns(conn, 'quote'):
+        return
+
+    skipped = []
+    for lo, hi in id_batches(conn, 6, 'equipment_json', 'quote', batch_size):
+        batch = conn.execute("""
+            SELECT id, equipment_headers, equipment_items FROM quote
+            WHERE id BETWEEN ? AND ? AND (equipment_items IS NOT NULL OR equipment_headers IS NOT NULL)
+        """, (lo, hi)).fetchall()
+        rows = []
+        headers = []
+        for quote_id, headers_json, items_json in batch:
+            try:
+                items = json.loads(items_json) if items_json else []
+                header = json.loads(headers_json) if headers_json else {}
+                if not isinstance(header, dict):
+                    raise ValueError('equipment_headers is not an object')
+                quote_rows = []
+                for position, item in enumerate(items or []):
+                    qty = item.get('qty')
+                    quote_rows.append((quote_id, position, item.get('description'),
+                                       str(qty) if qty not in (None, '') else None,
+                                       item.get('price') or 0, item.get('total') or 0))
+            except (ValueError, TypeError, AttributeError):
+                # Left in the JSON columns so the data can still be fixed by hand
+                skipped.append(quote_id)
+                continue
+            rows += quote_rows
+            headers.append((header.get('header1'), header.get('header2'), header.get('header3'), quote_id))
+
+        conn.executemany("""
+            INSERT INTO equipment_item (quote_id, position, description, qty, price, total)
+            VALUES (?, ?, ?, ?, ?, ?)
+        """, rows)
+        conn.executemany("""
+            UPDATE quote SET equipment_header1 = ?, equipment_header2 = ?, equipment_header3 = ?,
+                             equipment_headers = NULL, equipment_items = NULL
+            WHERE id = ?
+        """, headers)
+    if skipped:
+        print(f"  Skipped {len(skipped)} quotes with unreadable equipment JSON (kept as is): "
+              f"{', '.join(map(str, skipped))}")
+
+
+@migration(7, 'quote revisions table')
+def migrate_quote_revisions(conn, batch_size):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS quote_revision (
+            id INTEGER NOT NULL PRIMARY KEY,
+            quote_id INTEGER NOT NULL REFERENCES quote (id),
+            user_id INTEGER NOT NULL REFERENCES user (id),
+            revision INTEGER NOT NULL,
+            is_snapshot BOOLEAN,
+            data BLOB NOT NULL,
+            changed_fields VARCHAR(500),
+            created_at DATETIME,
+            CONSTRAINT uq_quote_revision UNIQUE (quote_id, revision)
+        )
+    """)
+    conn.commit()
+
+
+@migration(8, 'history counts index')
+def migrate_history_counts_index(conn, batch_size):
+    """Index behind the active/trash counts and the history list"""
+    if not table_exists(conn, 'quote'):
+        return
+    conn.execute("CREATE INDEX IF NOT EXISTS ix_quote_user_deleted_date ON quote (user_id, deleted_at, date)")
+    conn.commit()
 
 
-def migrate_hide_labor():
-    """Add hide_labor column to quote table"""
+@migration(9, 'incremental auto-vacuum')
+def migrate_incremental_vacuum(conn, batch_size):
+    """Switch to auto_vacuum=INCREMENTAL so maintenance.py can free pages in small steps
 
-    if not os.path.exists(DB_PATH):
-        print(f"Database not found at {DB_PATH}")
+    The mode only changes with a full VACUUM, which rewrites the whole file once.
+    Tenant shards get the same treatment from upgrade_shards().
+    """
+    if conn.execute("PRAGMA auto_vacuum").fetchone()[0] == 2:
         return
+    conn.commit()
+    conn.execute("PRAGMA auto_vacuum = INCREMENTAL")
+    conn.execute("VACUUM")
 
-    conn = sqlite3.connect(DB_PATH)
-    cursor = conn.cursor()
 
-    try:
-        # Check if column already exists
-        cursor.execute("PRAGMA table_info(quote)")
-        columns = [col[1] for col in cursor.fetchall()]
+LATEST_VERSION = max(version for version, _, _ in MIGRATIONS)
 
-        if 'hide_labor' in columns:
-            print("hide_labor column already exists")
-            return
 
-        print("Adding hide_labor column...")
-        cursor.execute("ALTER TABLE quote ADD COLUMN hide_labor BOOLEAN DEFAULT 0")
-        print("  Added: hide_labor")
+# Engine
 
-        conn.commit()
-        print("Hide labor migration complete!")
+def prepare(conn):
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migration (
+            version INTEGER NOT NULL PRIMARY KEY,
+            name VARCHAR(100),
+            applied_at DATETIME,
+            seconds FLOAT
+        )
+    """)
+    conn.execute("""
+        CREATE TABLE IF NOT EXISTS schema_migration_checkpoint (
+            version INTEGER NOT NULL,
+            step VARCHAR(100) NOT NULL,
+            last_id INTEGER NOT NULL,
+            PRIMARY KEY (version, step)
+        )
+    """)
+    conn.commit()
+
+
+def current_version(conn):
+    return conn.execute("PRAGMA user_version").fetchone()[0]
+
+
+def stamp(conn):
+    """Mark a database the app has just created complete as being at the latest version"""
+    prepare(conn)
+    applied_at = datetime.utcnow().isoformat(sep=' ')
+    conn.executemany("INSERT OR IGNORE INTO schema_migration (version, name, applied_at, seconds) "
+                     "VALUES (?, ?, ?, 0)", [(number, name, applied_at) for number, name, _ in sorted(MIGRATIONS)])
+    conn.execute(f"PRAGMA user_version = {LATEST_VERSION}")
+    conn.commit()
 
-    except Exception as e:
-        conn.rollback()
-        print(f"Hide labor migration failed: {e}")
-        raise
+
+def upgrade(db_path, target=None, batch_size=DEFAULT_BATCH_SIZE):
+    """Apply pending migrations up to target (default: latest); returns the new version"""
+    conn = sqlite3.connect(db_path)
+    try:
+        prepare(conn)
+        version = current_version(conn)
+        pending = [m for m in sorted(MIGRATIONS) if version < m[0] <= (target or LATEST_VERSION)]
+        if not pending:
+            print(f"Database is up to date (version {version})")
+            return version
+
+        for number, name, func in pending:
+            print(f"Applying {number}: {name}...")
+            start = time.perf_counter()
+            try:
+                func(conn, batch_size)
+            except Exception as e:
+                conn.rollback()
+                print(f"Migration {number} failed: {e}")
+                print("Completed batches are kept; run again to resume.")
+                raise
+            seconds = time.perf_counter() - start
+            conn.execute("DELETE FROM schema_migration_checkpoint WHERE version = ?", (number,))
+            conn.execute("INSERT OR REPLACE INTO schema_migration (version, name, applied_at, seconds) "
+                         "VALUES (?, ?, ?, ?)", (number, name, datetime.utcnow().isoformat(sep=' '), seconds))
+            conn.execute(f"PRAGMA user_version = {number}")
+            conn.commit()
+            version = number
+            print(f"  Done in {seconds:.1f}s")
+
+        print(f"Database is at version {version}")
+        return version
     finally:
         conn.close()
 
 
+def shard_paths(shard_dir):
+    if not os.path.isdir(shard_dir):
+        return []
+    return sorted(os.path.join(shard_dir, name) for name in os.listdir(shard_dir)
+                  if name.startswith('user_') and name.endswith('.db'))
+
+
+def upgrade_shards(shard_dir):
+    """Turn on incremental auto-vacuum in tenant shards made before migration 9
+
+    The app creates each shard's tables complete, so the schema migrations
+    don't apply to shards; only this change of file format does.
+    """
+    converted = 0
+    for path in shard_paths(shard_dir):
+        conn = sqlite3.connect(path)
+        try:
+            if conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2:
+                print(f"Converting shard {os.path.basename(path)} to incremental auto-vacuum...")
+                migrate_incremental_vacuum(conn, DEFAULT_BATCH_SIZE)
+                converted += 1
+        finally:
+            conn.close()
+    if converted:
+        print(f"Converted {converted} shard(s)")
+    return converted
+
+
+def status(db_path):
+    conn = sqlite3.connect(db_path)
+    try:
+        prepare(conn)
+        version = current_version(conn)
+        applied = {row[0]: row[1:] for row in conn.execute("SELECT version, applied_at, seconds FROM schema_migration")}
+        checkpoints = conn.execute("SELECT version, step, last_id FROM schema_migration_checkpoint").fetchall()
+    finally:
+        conn.close()
+
+    print(f"Database version {version} of {LATEST_VERSION}")
+    for number, name, _ in sorted(MIGRATIONS):
+        if number in applied:
+            applied_at, seconds = applied[number]
+            state = f"applied {applied_at} ({seconds:.1f}s)"
+        elif number <= version:
+            state = "applied"
+        else:
+            state = "pending"
+        print(f"  {number:>3}  {name:<28} {state}")
+    for number, step, last_id in checkpoints:
+        print(f"  Interrupted: migration {number}, step {step}, done up to id {last_id}")
+
+
+def shard_status(shard_dir):
+    paths = shard_paths(shard_dir)
+    if not paths:
+        return
+    pending = 0
+    for path in paths:
+        conn = sqlite3.connect(path)
+        try:
+            pending += conn.execute("PRAGMA auto_vacuum").fetchone()[0] != 2
+        finally:
+            conn.close()
+    print(f"Tenant shards: {len(paths)}, {pending} without incremental auto-vacuum")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Apply database migrations')
+    parser.add_argument('--db', default=default_db_path(), help='database file (default: %(default)s)')
+    parser.add_argument('--target', type=int, help='stop after this version')
+    parser.add_argument('--batch-size', type=int, default=DEFAULT_BATCH_SIZE, help='rows per transaction')
+    parser.add_argument('--shards', default=SHARD_DIR, help='tenant shard directory (default: %(default)s)')
+    parser.add_argument('--status', action='store_true', help='show migration state and exit')
+    args = parser.parse_args()
+
+    if not os.path.exists(args.db):
+        print(f"Database not found at {args.db}")
+        print("If this is a fresh install, just run the app and the database will be created.")
+        sys.exit(1)
+
+    if args.status:
+        status(args.db)
+        shard_status(args.shards)
+    else:
+        version = upgrade(args.db, args.target, args.batch_size)
+        if version >= 9:
+            upgrade_shards(args.shards)
+
+
 if __name__ == '__main__':
-    migrate()
-    migrate_equipments()
-    migrate_hide_labor()
+    main()
@@ -0,0 +1,89 @@
+#!/usr/bin/env python3
+"""
+Move each user's quotes, line items, companies, equipment and revisions from
+the central database into their own per-tenant database file.
+
+Run once before starting the app with TENANT_SHARDING=1 (stop the server
+first):
+    python split_tenants.py              # copy into instance/tenants/user_<id>.db
+    python split_tenants.py --delete     # copy, then remove the rows from the central database
+
+Users whose shard already holds quotes are skipped unless --force is given,
+so the script can be re-run after an interruption.
+"""
+
+import argparse
+import sqlite3
+
+from app import app, db, TENANT_TABLES, tenant_db_path, tenant_engine
+
+# Copy order and the rows belonging to one user, by table
+TENANT_ROWS = [
+    ('client_company', 'user_id = :user_id'),
+    ('quote', 'user_id = :user_id'),
+    ('line_item', 'quote_id IN (SELECT id FROM main.quote WHERE user_id = :user_id)'),
+    ('equipment_item', 'quote_id IN (SELECT id FROM main.quote WHERE user_id = :user_id)'),
+    ('quote_revision', 'user_id = :user_id'),
+]
+assert {table for table, _ in TENANT_ROWS} == TENANT_TABLES
+
+
+def columns(conn, schema, table):
+    return [row[1] for row in conn.execute(f"PRAGMA {schema}.table_info({table})")]
+
+
+def split(args):
+    with app.app_context():
+        central_path = db.engine.url.database
+
+    conn = sqlite3.connect(central_path)
+    user_ids = [row[0] for row in conn.execute("SELECT id FROM user ORDER BY id")]
+    print(f"Splitting {len(user_ids)} users out of {central_path}")
+
+    for user_id in user_ids:
+        tenant_engine(user_id)  # Creates the shard file with its tables
+        conn.execute("ATTACH DATABASE ? AS shard", (tenant_db_path(user_id),))
+        try:
+            if conn.execute("SELECT COUNT(*) FROM shard.quote").fetchone()[0] and not args.force:
+                print(f"  user {user_id}: shard already has quotes, skipped")
+                continue
+
+            copied = {}
+            for table, where in TENANT_ROWS:
+                source_columns = columns(conn, 'main', table)
+                if not source_columns:
+                    continue
+                shared = [c for c in columns(conn, 'shard', table) if c in source_columns]
+                column_list = ', '.join(shared)
+                if args.force:
+                    conn.execute(f"DELETE FROM shard.{table}")
+                copied[table] = conn.execute(
+                    f"INSERT INTO shard.{table} ({column_list}) SELECT {column_list} FROM main.{table} WHERE {where}",
+                    {'user_id': user_id}).rowcount
+
+            if args.delete:
+                # Reverse order, so the quote ids are still there for line_item/equipment_item
+                for table, where in reversed(TENANT_ROWS):
+                    if columns(conn, 'main', table):
+                        conn.execute(f"DELETE FROM main.{table} WHERE {where}", {'user_id': user_id})
+            conn.commit()
+            print(f"  user {user_id}: " + ', '.join(f"{count} {table}" for table, count in copied.items()))
+        except Exception:
+            conn.rollback()
+            raise
+        finally:
+            conn.execute("DETACH DATABASE shard")
+
+    conn.close()
+    print("Done. Start the app with TENANT_SHARDING=1 to use the shards.")
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Split per-user data into per-tenant databases')
+    parser.add_argument('--delete', action='store_true', help='remove copied rows from the central database')
+    parser.add_argument('--force', action='store_true', help='overwrite shards that already hold data')
+    split(parser.parse_args())
+
+
+if __name__ == '__main__':
+    main()
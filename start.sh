@@ -1,11 +1,19 @@
 #!/bin/bash
 
 # Hemant's Quote Generator - One-Click Start Script
-# Run with: ./start.sh
+# Run with: ./start.sh                 (development server)
+#      or:  ./start.sh --production    (gunicorn, multiple workers)
+# HOST and PORT environment variables override the default address.
 
 SCRIPT_DIR="$(cd "$(dirname "${BASH_SOURCE[0]}")" && pwd)"
 cd "$SCRIPT_DIR"
 
+MODE="development"
+if [ "$1" == "--production" ]; then
+    MODE="production"
+fi
+PORT="${PORT:-5005}"
+
 echo "=========================================="
 echo "  Hemant's Quote Generator"
 echo "=========================================="
@@ -28,16 +36,29 @@ fi
 echo "[2/3] Activating virtual environment..."
 source venv/bin/activate
 
-# Always install/upgrade dependencies
-echo "[3/3] Installing dependencies..."
-./venv/bin/pip install -r requirements.txt
+# Install dependencies only when requirements.txt changed since the last install
+REQ_HASH=$(./venv/bin/python -c "import hashlib; print(hashlib.sha256(open('requirements.txt', 'rb').read()).hexdigest())")
+HASH_FILE="venv/.requirements.sha256"
+if [ -f "$HASH_FILE" ] && [ "$(cat "$HASH_FILE")" == "$REQ_HASH" ]; then
+    echo "[3/3] Dependencies up to date"
+else
+    echo "[3/3] Installing dependencies..."
+    ./venv/bin/pip install -r requirements.txt && echo "$REQ_HASH" > "$HASH_FILE"
+fi
 
 echo ""
 echo "=========================================="
-echo "  Starting server on http://localhost:5005"
+echo "  Starting $MODE server on http://localhost:$PORT"
 echo "  Press Ctrl+C to stop"
 echo "=========================================="
 echo ""
 
-# Run the Flask app
-./venv/bin/python app.py
+if [ "$MODE" == "production" ]; then
+    # Minified, fingerprinted JS/CSS into static/dist
+    ./venv/bin/python build_assets.py || exit 1
+    # Multi-worker WSGI server; settings in gunicorn.conf.py
+    PORT="$PORT" exec ./venv/bin/gunicorn -c gunicorn.conf.py app:app
+else
+    # Run the Flask development server
+    PORT="$PORT" ./venv/bin/python app.py
+fi
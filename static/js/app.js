@@ -3,7 +3,8 @@ let lineItems = [];
 let hourlyRate = 200;
 let currentQuoteId = null;
 let userProfile = null;  // Loaded from /api/profile
-let savedCompanies = [];  // User's saved companies
+let companySuggestions = [];  // Latest autocomplete matches: [{id, name}]
+let companySearchTimer = null;
 let equipmentItems = [];  // Equipment/materials items
 
 // Invoice Number Generation
@@ -70,59 +71,75 @@ document.addEventListener('DOMContentLoaded', initTheme);
 
 // Load and manage companies
 async function loadCompanies() {
+    // Start with the most recently used companies
+    await searchCompanies();
+}
+
+// Debounce typing in the company field before hitting the autocomplete endpoint
+function onCompanyInput() {
+    clearTimeout(companySearchTimer);
+    companySearchTimer = setTimeout(searchCompanies, 150);
+}
+
+async function searchCompanies() {
+    const query = document.getElementById('clientCompany').value.trim();
     try {
-        const response = await fetch('/api/companies');
-        if (response.ok) {
-            savedCompanies = await response.json();
-            populateCompanyDropdown();
+        const response = await fetch(`/api/companies/autocomplete?q=${encodeURIComponent(query)}&limit=10`);
+        // Drop results for a prefix the user has already typed past
+        if (response.ok && query === document.getElementById('clientCompany').value.trim()) {
+            companySuggestions = await response.json();
+            renderCompanySuggestions();
         }
     } catch (error) {
         console.error('Error loading companies:', error);
     }
 }
 
-function populateCompanyDropdown(selectedName = '') {
-    const select = document.getElementById('clientCompany');
-    // Keep the first option (placeholder)
-    select.innerHTML = '<option value="">-- Select Company --</option>';
-
-    savedCompanies.forEach(company => {
+function renderCompanySuggestions() {
+    const list = document.getElementById('companySuggestions');
+    list.innerHTML = '';
+    companySuggestions.forEach(company => {
         const option = document.createElement('option');
         option.value = company.name;
-        option.textContent = company.name;
-        // Store all company details as data attributes
-        option.dataset.address = company.address || '';
-        option.dataset.poc = company.poc || '';
-        option.dataset.pocPhone = company.poc_phone || '';
-        option.dataset.pocEmail = company.poc_email || '';
-        option.dataset.venue = company.venue || '';
-        if (company.name === selectedName) {
-            option.selected = true;
-        }
-        select.appendChild(option);
+        list.appendChild(option);
     });
 }
 
-function onCompanySelect() {
-    const select = document.getElementById('clientCompany');
-    const selectedOption = select.options[select.selectedIndex];
+async function onCompanySelect() {
+    const name = document.getElementById('clientCompany').value.trim().toLowerCase();
+    let match = companySuggestions.find(c => c.name.toLowerCase() === name);
+    if (!match && name) {
+        // A fast pick or a paste can beat the debounced search: look the name up now
+        clearTimeout(companySearchTimer);
+        await searchCompanies();
+        match = companySuggestions.find(c => c.name.toLowerCase() === name);
+    }
 
-    if (selectedOption && selectedOption.value) {
-        // Auto-fill all saved company details
-        if (selectedOption.dataset.address) {
-            document.getElementById('clientAddress').value = selectedOption.dataset.address;
-        }
-        if (selectedOption.dataset.poc) {
-            document.getElementById('poc').value = selectedOption.dataset.poc;
-        }
-        if (selectedOption.dataset.pocPhone) {
-            document.getElementById('pocPhone').value = selectedOption.dataset.pocPhone;
-        }
-        if (selectedOption.dataset.pocEmail) {
-            document.getElementById('pocEmail').value = selectedOption.dataset.pocEmail;
-        }
-        if (selectedOption.dataset.venue) {
-            document.getElementById('venue').value = selectedOption.dataset.venue;
+    if (match) {
+        // Contact details are only fetched once a company is picked
+        try {
+            const response = await fetch(`/api/companies/${match.id}`);
+            if (response.ok) {
+                const company = await response.json();
+                document.getElementById('clientCompany').value = company.name;
+                if (company.address) {
+                    document.getElementById('clientAddress').value = company.address;
+                }
+                if (company.poc) {
+                    document.getElementById('poc').value = company.poc;
+                }
+                if (company.poc_phone) {
+                    document.getElementById('pocPhone').value = company.poc_phone;
+                }
+                if (company.poc_email) {
+                    document.getElementById('pocEmail').value = company.poc_email;
+                }
+                if (company.venue) {
+                    document.getElementById('venue').value = company.venue;
+                }
+            }
+        } catch (error) {
+            console.error('Error loading company details:', error);
         }
     }
 
@@ -201,8 +218,8 @@ async function saveNewCompany() {
 
         if (response.ok) {
             const company = await response.json();
-            savedCompanies.push(company);
-            populateCompanyDropdown(company.name);
+            document.getElementById('clientCompany').value = company.name;
+            searchCompanies();
 
             // Auto-fill address
             if (address) {
@@ -597,10 +614,67 @@ function formatMinutesToTime(minutes) {
     return `${h.toString().padStart(2, '0')}:${m.toString().padStart(2, '0')}`;
 }
 
-// Calculate hours and overtime for a line item
+// ============================================
+// RECALCULATION ENGINE
+// ============================================
+// Rate settings are read from the form once per change (refreshCalcSettings)
+// instead of once per row. Each line item's result is memoized by its times
+// and the settings version, so only rows whose inputs changed are recomputed.
+
+let calcSettings = null;
+let calcSettingsVersion = 0;
+const lineCalcCache = new Map();  // item.id -> { key, version, result }
+
+function readCalcSettings() {
+    const rate = parseFloat(document.getElementById('hourlyRate').value) || 200;
+    const overtimePercentage = parseInt(document.getElementById('overtimePercentage').value) || 10;
+    return {
+        isDaily: document.getElementById('billingType').checked,
+        regularCallHours: parseInt(document.getElementById('regularCallHours').value) || 8,
+        rate,
+        overtimePercentage,
+        overtimeRate: rate * (1 + overtimePercentage / 100),
+        dailyRate: parseFloat(document.getElementById('dailyRate').value) || 1600,
+        otHourlyRate: parseFloat(document.getElementById('otHourlyRate').value) || 220,
+        perDiemEnabled: document.getElementById('perDiemEnabled').checked,
+        perDiemRate: parseFloat(document.getElementById('perDiemRate').value) || 150,
+        hideLabor: document.getElementById('hideLabor')?.checked || false,
+        equipmentsEnabled: document.getElementById('equipmentsEnabled').checked,
+        additionalExpense: document.getElementById('additionalExpenseEnabled')?.checked
+            ? (parseFloat(document.getElementById('additionalExpenseAmount').value) || 0) : 0,
+        taxRate: parseFloat(document.getElementById('taxRate').value) || 0
+    };
+}
+
+// Re-read settings from the form; cached line results stay valid unless something changed
+function refreshCalcSettings() {
+    const next = readCalcSettings();
+    if (!calcSettings || Object.keys(next).some(key => next[key] !== calcSettings[key])) {
+        calcSettings = next;
+        calcSettingsVersion++;
+    }
+    return calcSettings;
+}
+
+function getCalcSettings() {
+    return calcSettings || refreshCalcSettings();
+}
+
+// Calculate hours and overtime for a line item (memoized)
 function calculateLineItem(item) {
-    const isDaily = document.getElementById('billingType').checked;
-    const regularCallHours = parseInt(document.getElementById('regularCallHours').value) || 8;
+    const settings = getCalcSettings();
+    const key = `${item.timeIn}|${item.timeOut}`;
+    const cached = lineCalcCache.get(item.id);
+    if (cached && cached.key === key && cached.version === calcSettingsVersion) {
+        return cached.result;
+    }
+    const result = computeLineItem(item, settings);
+    lineCalcCache.set(item.id, { key, version: calcSettingsVersion, result });
+    return result;
+}
+
+function computeLineItem(item, settings) {
+    const regularCallHours = settings.regularCallHours;
 
     // Calculate hours from time in/out
     const timeIn = parseTimeToMinutes(item.timeIn);
@@ -613,10 +687,10 @@ function calculateLineItem(item) {
     const regularHours = Math.min(totalHours, regularCallHours);
     const overtimeHours = Math.max(0, totalHours - regularCallHours);
 
-    if (isDaily) {
+    if (settings.isDaily) {
         // Daily billing mode
-        const dailyRate = parseFloat(document.getElementById('dailyRate').value) || 1600;
-        const otHourlyRate = parseFloat(document.getElementById('otHourlyRate').value) || 220;
+        const dailyRate = settings.dailyRate;
+        const otHourlyRate = settings.otHourlyRate;
         const overtimePay = overtimeHours * otHourlyRate;
         const lineTotal = dailyRate + overtimePay;
 
@@ -632,9 +706,8 @@ function calculateLineItem(item) {
         };
     } else {
         // Hourly billing mode (original logic)
-        const rate = parseFloat(document.getElementById('hourlyRate').value) || 200;
-        const overtimePercentage = parseInt(document.getElementById('overtimePercentage').value) || 10;
-        const overtimeRate = rate * (1 + overtimePercentage / 100);
+        const rate = settings.rate;
+        const overtimeRate = settings.overtimeRate;
 
         const regularPay = regularHours * rate;
         const overtimePay = overtimeHours * overtimeRate;
@@ -660,6 +733,48 @@ function calculateLineItem(item) {
     }
 }
 
+// Labor, equipment and grand totals from the memoized line results
+function calculateTotals() {
+    const settings = getCalcSettings();
+    const enabledItems = lineItems.filter(item => item.enabled !== false);
+
+    let laborTotal = 0;
+    enabledItems.forEach(item => {
+        laborTotal += calculateLineItem(item).lineTotal;
+    });
+    // Add per diem (only for enabled days)
+    if (settings.perDiemEnabled) {
+        laborTotal += enabledItems.length * settings.perDiemRate;
+    }
+
+    let subtotal = settings.hideLabor ? 0 : laborTotal;
+    if (settings.equipmentsEnabled) {
+        subtotal += calculateEquipmentTotal();
+    }
+    subtotal += settings.additionalExpense;
+
+    return {
+        enabledItems,
+        laborTotal,
+        subtotal,
+        total: subtotal + (subtotal * settings.taxRate / 100)
+    };
+}
+
+// Preview updates requested while handling one event are applied together
+// in the next animation frame
+let previewFrame = null;
+
+function updatePreview() {
+    if (previewFrame === null) {
+        previewFrame = requestAnimationFrame(() => {
+            previewFrame = null;
+            refreshCalcSettings();
+            renderPreview();
+        });
+    }
+}
+
 // Initialize on page load
 document.addEventListener('DOMContentLoaded', async function() {
     // Set today's date
@@ -779,6 +894,45 @@ function generateDays() {
     updatePreview();
 }
 
+// Fill the days from a CSV of clock-in/clock-out times (saved quotes only)
+async function importTimesheet(input) {
+    const file = input.files[0];
+    input.value = '';
+    if (!file) return;
+
+    if (!currentQuoteId) {
+        alert('Please save the quote before importing a timesheet');
+        return;
+    }
+
+    const formData = new FormData();
+    formData.append('file', file);
+
+    try {
+        const response = await fetch(`/api/quotes/${currentQuoteId}/timesheet`, {
+            method: 'POST',
+            body: formData
+        });
+        const result = await response.json();
+        const rejectedLines = (result.rejected || []).map(r => `Line ${r.line}: ${r.error}`).join('\n');
+
+        if (!response.ok) {
+            alert((result.error || 'Error importing timesheet') + (rejectedLines ? '\n\n' + rejectedLines : ''));
+            return;
+        }
+
+        await loadQuote(currentQuoteId);
+        let message = `Imported ${result.days} day(s): ${result.created} added, ${result.updated} updated`;
+        if (result.rejected_count) {
+            message += `\n\n${result.rejected_count} row(s) skipped:\n${rejectedLines}`;
+        }
+        alert(message);
+    } catch (error) {
+        console.error('Error importing timesheet:', error);
+        alert('Error importing timesheet');
+    }
+}
+
 // Render line items (time in/out per day)
 function renderLineItems() {
     const container = document.getElementById('lineItemsContainer');
@@ -788,49 +942,61 @@ function renderLineItems() {
         return;
     }
 
-    container.innerHTML = '';
-    hourlyRate = parseFloat(document.getElementById('hourlyRate').value) || 200;
+    refreshCalcSettings();
+    hourlyRate = calcSettings.rate;
 
     const defaultJob = document.getElementById('jobDescription').value || 'Sound Operator';
+    container.innerHTML = lineItems.map(item => lineItemHtml(item, defaultJob)).join('');
+}
 
-    lineItems.forEach((item, index) => {
-        const calc = calculateLineItem(item);
-        const dateStr = formatDateDisplay(item.date);
-        const isEnabled = item.enabled !== false;
-        const jobDesc = item.jobDescription || defaultJob;
-        const isCustomJob = jobDesc !== defaultJob;
-
-        // Format hours display - compact version
-        const hoursDisplay = calc.overtimeHours > 0
-            ? `${calc.totalHours.toFixed(1)}h (${calc.regularHours}+${calc.overtimeHours.toFixed(1)} OT)`
-            : `${calc.totalHours.toFixed(1)}h`;
-
-        const dayHtml = `
-            <div class="day-item ${isEnabled ? '' : 'day-disabled'}" data-id="${item.id}">
-                <div class="day-header">
-                    <label class="day-toggle" title="${isEnabled ? 'Click to mark as holiday' : 'Click to enable'}">
-                        <input type="checkbox" ${isEnabled ? 'checked' : ''} onchange="toggleDay(${item.id}, this.checked)">
-                        <span class="day-date">${dateStr}</span>
-                    </label>
-                    <div class="day-header-right">
-                        <span class="day-total">${isEnabled ? formatDayTotal(calc) : 'OFF'}</span>
-                        ${isEnabled ? `<button class="day-menu-btn" onclick="editDayJob(${item.id})" title="Edit job description">⋮</button>` : ''}
-                    </div>
-                </div>
-                ${isEnabled ? `
-                ${isCustomJob ? `<span class="day-custom-job">${jobDesc}</span>` : ''}
-                <div class="time-inputs">
-                    <label>In:</label>
-                    <input type="time" value="${item.timeIn}" onchange="updateTimeIn(${item.id}, this.value)">
-                    <label>Out:</label>
-                    <input type="time" value="${item.timeOut}" onchange="updateTimeOut(${item.id}, this.value)">
+// Re-render a single day after its own inputs changed
+function renderLineItemRow(id) {
+    const item = lineItems.find(i => i.id === id);
+    const row = document.querySelector(`#lineItemsContainer .day-item[data-id="${id}"]`);
+    if (!item || !row) {
+        renderLineItems();
+        return;
+    }
+    const defaultJob = document.getElementById('jobDescription').value || 'Sound Operator';
+    row.outerHTML = lineItemHtml(item, defaultJob);
+}
+
+function lineItemHtml(item, defaultJob) {
+    const calc = calculateLineItem(item);
+    const dateStr = formatDateDisplay(item.date);
+    const isEnabled = item.enabled !== false;
+    const jobDesc = item.jobDescription || defaultJob;
+    const isCustomJob = jobDesc !== defaultJob;
+
+    // Format hours display - compact version
+    const hoursDisplay = calc.overtimeHours > 0
+        ? `${calc.totalHours.toFixed(1)}h (${calc.regularHours}+${calc.overtimeHours.toFixed(1)} OT)`
+        : `${calc.totalHours.toFixed(1)}h`;
+
+    return `
+        <div class="day-item ${isEnabled ? '' : 'day-disabled'}" data-id="${item.id}">
+            <div class="day-header">
+                <label class="day-toggle" title="${isEnabled ? 'Click to mark as holiday' : 'Click to enable'}">
+                    <input type="checkbox" ${isEnabled ? 'checked' : ''} onchange="toggleDay(${item.id}, this.checked)">
+                    <span class="day-date">${dateStr}</span>
+                </label>
+                <div class="day-header-right">
+                    <span class="day-total">${isEnabled ? formatDayTotal(calc) : 'OFF'}</span>
+                    ${isEnabled ? `<button class="day-menu-btn" onclick="editDayJob(${item.id})" title="Edit job description">⋮</button>` : ''}
                 </div>
-                <span class="day-hours">${hoursDisplay}</span>
-                ` : `<span class="day-off-label">Holiday / Day Off</span>`}
             </div>
-        `;
-        container.innerHTML += dayHtml;
-    });
+            ${isEnabled ? `
+            ${isCustomJob ? `<span class="day-custom-job">${jobDesc}</span>` : ''}
+            <div class="time-inputs">
+                <label>In:</label>
+                <input type="time" value="${item.timeIn}" onchange="updateTimeIn(${item.id}, this.value)">
+                <label>Out:</label>
+                <input type="time" value="${item.timeOut}" onchange="updateTimeOut(${item.id}, this.value)">
+            </div>
+            <span class="day-hours">${hoursDisplay}</span>
+            ` : `<span class="day-off-label">Holiday / Day Off</span>`}
+        </div>
+    `;
 }
 
 // Update time in for a specific day
@@ -839,7 +1005,7 @@ function updateTimeIn(id, time) {
     if (item) {
         item.timeIn = time;
     }
-    renderLineItems();
+    renderLineItemRow(id);
     updatePreview();
 }
 
@@ -849,7 +1015,7 @@ function updateTimeOut(id, time) {
     if (item) {
         item.timeOut = time;
     }
-    renderLineItems();
+    renderLineItemRow(id);
     updatePreview();
 }
 
@@ -859,7 +1025,7 @@ function toggleDay(id, enabled) {
     if (item) {
         item.enabled = enabled;
     }
-    renderLineItems();
+    renderLineItemRow(id);
     updatePreview();
 }
 
@@ -897,7 +1063,7 @@ function saveJobModal() {
     item.jobDescription = newJob || defaultJob;
 
     closeJobModal();
-    renderLineItems();
+    renderLineItemRow(item.id);
     updatePreview();
 }
 
@@ -958,17 +1124,7 @@ async function loadQuote(quoteId) {
         document.getElementById('invoiceNumber').value = quote.invoice_number || '01';
         document.getElementById('poNumber').value = quote.po_number || 'PO000000';
         document.getElementById('jobId').value = quote.job_id || 'EVS 00-00000';
-        // Select company in dropdown (handles companies that might not be in the list)
-        const savedCompany = quote.client_company || '';
-        if (savedCompany && !savedCompanies.find(c => c.name === savedCompany)) {
-            // Add the company name as a temporary option if not in list
-            const select = document.getElementById('clientCompany');
-            const option = document.createElement('option');
-            option.value = savedCompany;
-            option.textContent = savedCompany;
-            select.appendChild(option);
-        }
-        document.getElementById('clientCompany').value = savedCompany;
+        document.getElementById('clientCompany').value = quote.client_company || '';
         document.getElementById('clientAddress').value = quote.client_address || 'PO Box 00000\nLocation - City\nUnited Arab Emirates';
         document.getElementById('poc').value = quote.poc || 'Contact Name';
         document.getElementById('pocPhone').value = quote.poc_phone || '+971 50 000 0000';
@@ -1064,7 +1220,7 @@ function clearForm() {
     document.getElementById('invoiceNumber').value = 'Auto';
     document.getElementById('poNumber').value = 'PO000000';
     document.getElementById('jobId').value = 'EVS 00-00000';
-    document.getElementById('clientCompany').value = '';  // Reset to placeholder
+    document.getElementById('clientCompany').value = '';
     document.getElementById('clientAddress').value = 'PO Box 00000\nLocation - City\nUnited Arab Emirates';
     document.getElementById('poc').value = 'Contact Name';
     document.getElementById('pocPhone').value = '+971 50 000 0000';
@@ -1149,6 +1305,7 @@ async function saveQuote() {
 }
 
 async function performSaveQuote() {
+    refreshCalcSettings();
     const regularCallHours = parseInt(document.getElementById('regularCallHours').value) || 8;
     const overtimePercentage = parseInt(document.getElementById('overtimePercentage').value) || 10;
     const rate = parseFloat(document.getElementById('hourlyRate').value) || 200;
@@ -1294,71 +1451,20 @@ async function deleteCurrentQuote() {
 
 // Calculation functions
 function calculateSubtotal() {
-    const hideLabor = document.getElementById('hideLabor')?.checked || false;
-    let subtotal = 0;
-
-    // Only include labor costs if not hidden
-    if (!hideLabor) {
-        // Only count enabled days
-        const enabledItems = lineItems.filter(item => item.enabled !== false);
-
-        subtotal = enabledItems.reduce((sum, item) => {
-            const calc = calculateLineItem(item);
-            return sum + calc.lineTotal;
-        }, 0);
-
-        // Add per diem (only for enabled days)
-        const perDiemEnabled = document.getElementById('perDiemEnabled').checked;
-        if (perDiemEnabled) {
-            const perDiemRate = parseFloat(document.getElementById('perDiemRate').value) || 150;
-            subtotal += enabledItems.length * perDiemRate;
-        }
-    }
-
-    // Add equipment total if enabled
-    const equipmentsEnabled = document.getElementById('equipmentsEnabled').checked;
-    if (equipmentsEnabled) {
-        subtotal += calculateEquipmentTotal();
-    }
-
-    // Add additional expenses if enabled
-    const additionalExpenseEnabled = document.getElementById('additionalExpenseEnabled')?.checked || false;
-    if (additionalExpenseEnabled) {
-        const additionalExpense = parseFloat(document.getElementById('additionalExpenseAmount').value) || 0;
-        subtotal += additionalExpense;
-    }
-
-    return subtotal;
+    return calculateTotals().subtotal;
 }
 
 function calculateTotal() {
-    const subtotal = calculateSubtotal();
-    const taxRate = parseFloat(document.getElementById('taxRate').value) || 0;
-    return subtotal + (subtotal * taxRate / 100);
+    return calculateTotals().total;
 }
 
 // Calculate labor-only total (line items + per diem, excluding equipment)
 function calculateLaborTotal() {
-    // Only count enabled days
-    const enabledItems = lineItems.filter(item => item.enabled !== false);
-
-    let laborTotal = enabledItems.reduce((sum, item) => {
-        const calc = calculateLineItem(item);
-        return sum + calc.lineTotal;
-    }, 0);
-
-    // Add per diem (only for enabled days)
-    const perDiemEnabled = document.getElementById('perDiemEnabled').checked;
-    if (perDiemEnabled) {
-        const perDiemRate = parseFloat(document.getElementById('perDiemRate').value) || 150;
-        laborTotal += enabledItems.length * perDiemRate;
-    }
-
-    return laborTotal;
+    return calculateTotals().laborTotal;
 }
 
 // Update labor total display (shown when equipment is also enabled)
-function updateLaborTotalDisplay() {
+function updateLaborTotalDisplay(laborTotal = calculateLaborTotal()) {
     const equipmentsEnabled = document.getElementById('equipmentsEnabled').checked;
     const hideLabor = document.getElementById('hideLabor')?.checked || false;
     const laborTotalRow = document.getElementById('laborTotalRow');
@@ -1367,7 +1473,6 @@ function updateLaborTotalDisplay() {
     if (laborTotalRow) {
         if (equipmentsEnabled && !hideLabor) {
             laborTotalRow.style.display = 'flex';
-            const laborTotal = calculateLaborTotal();
             document.getElementById('laborTotalDisplay').textContent = formatCurrency(laborTotal);
         } else {
             laborTotalRow.style.display = 'none';
@@ -1410,9 +1515,9 @@ function updateInvoicePreview() {
     if (!previewEl) return;
 
     // Get company code (first 4 letters, uppercase)
-    const companySelect = document.getElementById('clientCompany');
-    const company = companySelect ? companySelect.options[companySelect.selectedIndex]?.text : '';
-    const companyCode = company && company !== '-- Select Company --'
+    const companyInput = document.getElementById('clientCompany');
+    const company = companyInput ? companyInput.value.trim() : '';
+    const companyCode = company
         ? company.replace(/[^a-zA-Z]/g, '').substring(0, 4).toUpperCase()
         : 'NONE';
 
@@ -1430,8 +1535,8 @@ function updateInvoicePreview() {
     previewEl.textContent = suffix;
 }
 
-// Update preview
-function updatePreview() {
+// Render the invoice preview (use updatePreview() to schedule it)
+function renderPreview() {
     // Update document type
     const isInvoice = document.getElementById('docType').checked;
     const label = isInvoice ? 'INVOICE' : 'QUOTE';
@@ -1478,15 +1583,13 @@ function updatePreview() {
     if (tosOtRateEl) tosOtRateEl.textContent = overtimePercentage;
 
     // Update items table with time in/out columns (only enabled days)
-    const tbody = document.getElementById('itemsTableBody');
-    tbody.innerHTML = '';
-
+    const totals = calculateTotals();
+    const enabledItems = totals.enabledItems;
     const defaultJob = document.getElementById('jobDescription').value || 'Sound Operator';
-    const enabledItems = lineItems.filter(item => item.enabled !== false);
-    enabledItems.forEach(item => {
+    document.getElementById('itemsTableBody').innerHTML = enabledItems.map(item => {
         const calc = calculateLineItem(item);
         const jobDesc = item.jobDescription || defaultJob;
-        const row = `
+        return `
             <tr>
                 <td>${formatDateDisplay(item.date)}</td>
                 <td>${jobDesc}</td>
@@ -1498,12 +1601,11 @@ function updatePreview() {
                 <td>${formatCurrency(calc.lineTotal)}</td>
             </tr>
         `;
-        tbody.innerHTML += row;
-    });
+    }).join('');
 
     // Handle per diem row (only count enabled days)
-    const perDiemEnabled = document.getElementById('perDiemEnabled').checked;
-    const perDiemRate = parseFloat(document.getElementById('perDiemRate').value) || 150;
+    const perDiemEnabled = calcSettings.perDiemEnabled;
+    const perDiemRate = calcSettings.perDiemRate;
     const perDiemRow = document.getElementById('perDiemRow');
 
     // Update per diem rate displays
@@ -1525,17 +1627,16 @@ function updatePreview() {
     const additionalExpenseEnabled = document.getElementById('additionalExpenseEnabled')?.checked || false;
     const additionalExpenseRow = document.getElementById('additionalExpenseRow');
     if (additionalExpenseEnabled) {
-        const additionalExpense = parseFloat(document.getElementById('additionalExpenseAmount').value) || 0;
-        document.getElementById('additionalExpenseDisplay').textContent = formatCurrency(additionalExpense);
+        document.getElementById('additionalExpenseDisplay').textContent = formatCurrency(calcSettings.additionalExpense);
         additionalExpenseRow.style.display = 'flex';
     } else {
         additionalExpenseRow.style.display = 'none';
     }
 
     // Update totals
-    const subtotal = calculateSubtotal();
-    const taxRate = parseFloat(document.getElementById('taxRate').value) || 0;
-    const total = calculateTotal();
+    const subtotal = totals.subtotal;
+    const taxRate = calcSettings.taxRate;
+    const total = totals.total;
 
     document.getElementById('displaySubtotal').textContent = formatCurrency(subtotal);
     document.getElementById('displayTax').textContent = taxRate + '%';
@@ -1545,7 +1646,7 @@ function updatePreview() {
     document.getElementById('editorTotal').textContent = formatCurrency(total);
 
     // Update labor total display (when equipment is also enabled)
-    updateLaborTotalDisplay();
+    updateLaborTotalDisplay(totals.laborTotal);
 }
 
 // Download PDF - server-side generation using WeasyPrint
@@ -1612,6 +1713,7 @@ async function saveQuoteForPDF() {
         return;
     }
 
+    refreshCalcSettings();
     const regularCallHours = parseInt(document.getElementById('regularCallHours').value) || 8;
     const overtimePercentage = parseInt(document.getElementById('overtimePercentage').value) || 10;
     const rate = parseFloat(document.getElementById('hourlyRate').value) || 200;
@@ -0,0 +1,417 @@
+// State
+let isViewingTrash = false;
+let trashCount = 0;
+let facetCounts = null;
+
+// Toast Notification System
+function showToast(message, type = 'success') {
+    const container = document.getElementById('toastContainer');
+    const toast = document.createElement('div');
+    toast.className = `toast ${type}`;
+
+    const icons = { success: '✓', error: '✕', info: 'ℹ' };
+    toast.innerHTML = `
+        <span class="toast-icon">${icons[type]}</span>
+        <span>${message}</span>
+    `;
+
+    container.appendChild(toast);
+
+    // Remove toast after animation completes
+    setTimeout(() => {
+        toast.remove();
+    }, 3000);
+}
+
+// Theme Management
+function toggleTheme() {
+    const body = document.body;
+    const themeIcon = document.getElementById('themeIcon');
+    const isLightMode = body.classList.toggle('light-mode');
+    themeIcon.textContent = isLightMode ? '☀️' : '🌙';
+    localStorage.setItem('theme', isLightMode ? 'light' : 'dark');
+}
+
+function initTheme() {
+    const savedTheme = localStorage.getItem('theme');
+    const themeIcon = document.getElementById('themeIcon');
+    if (savedTheme === 'light') {
+        document.body.classList.add('light-mode');
+        if (themeIcon) themeIcon.textContent = '☀️';
+    }
+}
+
+// Mobile filter toggle
+function toggleFilters() {
+    const content = document.getElementById('filterContent');
+    const icon = document.getElementById('filterToggleIcon');
+    content.classList.toggle('show');
+    icon.textContent = content.classList.contains('show') ? '▲' : '▼';
+}
+
+// Load companies for filter dropdown
+async function loadCompanies() {
+    try {
+        const response = await fetch('/api/companies');
+        const companies = await response.json();
+        const select = document.getElementById('filterCompany');
+
+        companies.forEach(company => {
+            const option = document.createElement('option');
+            option.value = company.name;
+            option.textContent = company.name;
+            select.appendChild(option);
+        });
+        if (facetCounts) renderFacetCounts(facetCounts);
+    } catch (error) {
+        console.error('Error loading companies:', error);
+    }
+}
+
+// Format date for display
+function formatDate(dateStr) {
+    if (!dateStr) return 'N/A';
+    const date = new Date(dateStr);
+    return date.toLocaleDateString('en-GB', {
+        day: 'numeric',
+        month: 'short',
+        year: 'numeric'
+    });
+}
+
+// Format currency
+function formatCurrency(amount) {
+    return 'AED ' + (amount || 0).toLocaleString('en-US', {
+        minimumFractionDigits: 2,
+        maximumFractionDigits: 2
+    });
+}
+
+// Format invoice number to full form: 002-MICR-DEC-2025
+function formatInvoiceNumber(quote) {
+    if (!quote.invoice_number) return 'N/A';
+
+    // Pad the number to 3 digits
+    const num = String(quote.invoice_number).padStart(3, '0');
+
+    // Get company code (first 4 letters, uppercase)
+    const company = quote.client_company || 'NONE';
+    const companyCode = company.replace(/[^a-zA-Z]/g, '').substring(0, 4).toUpperCase() || 'NONE';
+
+    // Get month and year from date
+    if (quote.date) {
+        const date = new Date(quote.date);
+        const month = date.toLocaleString('en-US', { month: 'short' }).toUpperCase();
+        const year = date.getFullYear();
+        return `${num}-${companyCode}-${month}-${year}`;
+    }
+
+    return `${num}-${companyCode}`;
+}
+
+// Render quote cards
+function renderQuotes(quotes) {
+    const container = document.getElementById('quotesContainer');
+    const countEl = document.getElementById('quotesCount');
+    const headerEl = document.querySelector('.quotes-header h2');
+
+    // Update header based on view
+    if (isViewingTrash) {
+        headerEl.textContent = 'Recycle Bin';
+        countEl.innerHTML = quotes.length > 0
+            ? `${quotes.length} item${quotes.length !== 1 ? 's' : ''} in trash <button class="btn-clear-trash" onclick="clearTrash()">🗑️ Clear All</button>`
+            : '';
+    } else {
+        headerEl.textContent = 'Quote History';
+        countEl.textContent = `${quotes.length} quote${quotes.length !== 1 ? 's' : ''} found`;
+    }
+
+    if (quotes.length === 0) {
+        container.innerHTML = `
+            <div class="empty-state">
+                <div class="empty-state-icon">${isViewingTrash ? '🗑️' : '📋'}</div>
+                <h3>${isViewingTrash ? 'Recycle bin is empty' : 'No quotes found'}</h3>
+                <p>${isViewingTrash ? 'Deleted quotes will appear here.' : 'Try adjusting your filters or create a new quote.'}</p>
+            </div>
+        `;
+        return;
+    }
+
+    container.innerHTML = `
+        <div class="quote-cards-grid">
+            ${quotes.map(quote => `
+                <div class="quote-card" onclick="openQuote(${quote.id})">
+                    <div class="quote-card-actions">
+                        ${isViewingTrash
+                            ? `<button class="btn-card-action btn-restore" onclick="event.stopPropagation(); restoreQuote(${quote.id})" title="Restore">↩️</button>`
+                            : `<button class="btn-card-action btn-delete" onclick="event.stopPropagation(); trashQuote(${quote.id})" title="Delete">🗑️</button>`
+                        }
+                    </div>
+                    <div class="quote-card-header">
+                        <span class="quote-badge ${quote.doc_type.toLowerCase()}">${quote.doc_type}</span>
+                        <span class="quote-number">${formatInvoiceNumber(quote)}</span>
+                    </div>
+                    <div class="quote-company">${quote.client_company || 'No Client'}</div>
+                    <div class="quote-date">${formatDate(quote.date)}</div>
+                    <div class="quote-card-footer">
+                        <span class="quote-total">${formatCurrency(quote.total)}</span>
+                        <span class="quote-description">${quote.job_description || ''}</span>
+                    </div>
+                </div>
+            `).join('')}
+        </div>
+    `;
+}
+
+// Load quotes with filters
+async function loadQuotes() {
+    const container = document.getElementById('quotesContainer');
+    container.innerHTML = `
+        <div class="loading-state">
+            <div class="loading-spinner"></div>
+            <p>Loading ${isViewingTrash ? 'trash' : 'quotes'}...</p>
+        </div>
+    `;
+
+    try {
+        // Build query params
+        const params = new URLSearchParams();
+
+        // Add trash filter if viewing recycle bin
+        if (isViewingTrash) {
+            params.append('trash', 'true');
+        } else {
+            appendFilterParams(params);
+
+            const sort = document.getElementById('filterSort').value;
+            if (sort) params.append('sort', sort);
+        }
+
+        const url = '/api/quotes' + (params.toString() ? '?' + params.toString() : '');
+        const response = await fetch(url);
+
+        if (response.status === 401) {
+            window.location.href = '/login';
+            return;
+        }
+
+        const quotes = await response.json();
+        renderQuotes(quotes);
+    } catch (error) {
+        console.error('Error loading quotes:', error);
+        container.innerHTML = `
+            <div class="empty-state">
+                <div class="empty-state-icon">⚠️</div>
+                <h3>Error loading quotes</h3>
+                <p>Please try refreshing the page.</p>
+            </div>
+        `;
+    }
+}
+
+// Add the sidebar filters to query params
+function appendFilterParams(params) {
+    const company = document.getElementById('filterCompany').value;
+    if (company) params.append('company', company);
+
+    const docType = document.querySelector('input[name="docType"]:checked').value;
+    if (docType) params.append('doc_type', docType);
+
+    const dateFrom = document.getElementById('filterDateFrom').value;
+    if (dateFrom) params.append('date_from', dateFrom);
+
+    const dateTo = document.getElementById('filterDateTo').value;
+    if (dateTo) params.append('date_to', dateTo);
+}
+
+// Update trash count in sidebar and the filter counts (one grouped query, no quote list)
+async function updateTrashCount() {
+    try {
+        const params = new URLSearchParams();
+        appendFilterParams(params);
+        const response = await fetch('/api/quotes/counts' + (params.toString() ? '?' + params.toString() : ''));
+        facetCounts = await response.json();
+        trashCount = facetCounts.trash;
+        document.getElementById('trashCount').textContent = trashCount;
+        renderFacetCounts(facetCounts);
+    } catch (error) {
+        console.error('Error updating trash count:', error);
+    }
+}
+
+// Show counts next to the company options and document types
+function renderFacetCounts(counts) {
+    const companyCounts = new Map(counts.companies.map(facet => [facet.value, facet.count]));
+    document.querySelectorAll('#filterCompany option').forEach(option => {
+        if (!option.value) return;
+        const count = companyCounts.get(option.value);
+        option.textContent = count ? `${option.value} (${count})` : option.value;
+    });
+
+    const docTypeCounts = new Map(counts.doc_types.map(facet => [facet.value, facet.count]));
+    const allCount = counts.doc_types.reduce((sum, facet) => sum + facet.count, 0);
+    document.querySelectorAll('[data-doc-type-count]').forEach(el => {
+        const docType = el.dataset.docTypeCount;
+        el.textContent = docType ? (docTypeCounts.get(docType) || 0) : allCount;
+    });
+}
+
+// Toggle recycle bin view
+function toggleRecycleBin() {
+    isViewingTrash = !isViewingTrash;
+    const btn = document.getElementById('recycleBinBtn');
+    const label = document.getElementById('recycleBinLabel');
+    const filterContent = document.getElementById('filterContent');
+
+    if (isViewingTrash) {
+        btn.classList.add('active');
+        label.textContent = 'Back to Quotes';
+        filterContent.style.display = 'none';
+    } else {
+        btn.classList.remove('active');
+        label.textContent = 'Recycle Bin';
+        filterContent.style.display = '';
+    }
+
+    loadQuotes();
+}
+
+// Move quote to trash
+async function trashQuote(quoteId) {
+    try {
+        const response = await fetch(`/api/quotes/${quoteId}/trash`, {
+            method: 'POST'
+        });
+
+        if (response.ok) {
+            showToast('Quote moved to recycle bin', 'success');
+            loadQuotes();
+            updateTrashCount();
+        } else {
+            const data = await response.json();
+            showToast(data.error || 'Error moving to trash', 'error');
+        }
+    } catch (error) {
+        console.error('Error trashing quote:', error);
+        showToast('Error moving to trash', 'error');
+    }
+}
+
+// Restore quote from trash
+async function restoreQuote(quoteId) {
+    try {
+        const response = await fetch(`/api/quotes/${quoteId}/restore`, {
+            method: 'POST'
+        });
+
+        if (response.ok) {
+            showToast('Quote restored successfully', 'success');
+            loadQuotes();
+            updateTrashCount();
+        } else {
+            const data = await response.json();
+            showToast(data.error || 'Error restoring quote', 'error');
+        }
+    } catch (error) {
+        console.error('Error restoring quote:', error);
+        showToast('Error restoring quote', 'error');
+    }
+}
+
+// Clear all trash
+async function clearTrash() {
+    if (!confirm('Are you sure you want to permanently delete all items in the recycle bin? This cannot be undone.')) {
+        return;
+    }
+
+    try {
+        const response = await fetch('/api/quotes/trash', {
+            method: 'DELETE'
+        });
+
+        if (response.ok) {
+            const data = await response.json();
+            showToast(`${data.count} quote(s) permanently deleted`, 'success');
+            loadQuotes();
+            updateTrashCount();
+        } else {
+            const data = await response.json();
+            showToast(data.error || 'Error clearing trash', 'error');
+        }
+    } catch (error) {
+        console.error('Error clearing trash:', error);
+        showToast('Error clearing trash', 'error');
+    }
+}
+
+// Apply filters (called on filter change)
+function applyFilters() {
+    loadQuotes();
+    updateTrashCount();
+}
+
+// Clear all filters
+function clearFilters() {
+    document.getElementById('filterCompany').value = '';
+    document.getElementById('filterDateFrom').value = '';
+    document.getElementById('filterDateTo').value = '';
+    document.getElementById('filterSort').value = 'date_desc';
+    document.querySelector('input[name="docType"][value=""]').checked = true;
+    loadQuotes();
+    updateTrashCount();
+}
+
+// Download a statement (summary + each invoice) for the filtered company and period
+async function downloadStatement() {
+    const params = new URLSearchParams();
+    appendFilterParams(params);
+    if (!params.get('company')) {
+        showToast('Choose a company to build a statement', 'info');
+        return;
+    }
+    if (!params.get('doc_type')) params.append('doc_type', 'INVOICE');
+
+    try {
+        // The server renders a few missing invoices per request (202) until all are cached
+        let response = await fetch('/api/statements/pdf?' + params.toString());
+        while (response.status === 202) {
+            const data = await response.json();
+            showToast(data.message, 'info');
+            const delay = parseInt(response.headers.get('Retry-After') || '1', 10) * 1000;
+            await new Promise(resolve => setTimeout(resolve, delay));
+            response = await fetch('/api/statements/pdf?' + params.toString());
+        }
+        if (!response.ok) {
+            const data = await response.json();
+            showToast(data.error || 'Error building statement', 'error');
+            return;
+        }
+
+        const disposition = response.headers.get('Content-Disposition') || '';
+        const match = disposition.match(/filename="([^"]+)"/);
+        const url = URL.createObjectURL(await response.blob());
+        const link = document.createElement('a');
+        link.href = url;
+        link.download = match ? match[1] : 'Statement.pdf';
+        document.body.appendChild(link);
+        link.click();
+        link.remove();
+        setTimeout(() => URL.revokeObjectURL(url), 1000);
+    } catch (error) {
+        console.error('Error building statement:', error);
+        showToast('Error building statement', 'error');
+    }
+}
+
+// Open quote for editing
+function openQuote(quoteId) {
+    window.location.href = '/?quote=' + quoteId;
+}
+
+// Initialize
+document.addEventListener('DOMContentLoaded', () => {
+    initTheme();
+    loadCompanies();
+    loadQuotes();
+    updateTrashCount();
+});